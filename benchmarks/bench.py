@@ -0,0 +1,121 @@
+from __future__ import annotations
+import os, sys, gc, json, time, argparse, platform, tempfile, subprocess, tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bootattestor.tcg import parse_tpm2_eventlog
+from bootattestor.pcr import compute_pcrs
+from bootattestor.attestor import Finding, create_baseline, diff_attestation, export_sbom, load_policy, save_baseline
+from bootattestor.report import render_text, render_json, render_sarif, render_junit
+from bootattestor.synth import write_eventlog, write_efivars_tree
+
+# times the hot paths over synthetic logs and writes machine-readable results;
+# --compare flags stages that got slower than a previous run
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+# cold start of a fresh interpreter, best of --repeat, for the commands boot hooks and provisioning
+# scripts call; `attest` runs against a 200 event log so the figure is dominated by imports
+STARTUP_BUDGET_MS = {'version': 100, 'attest': 250}
+
+def _measure(fn: Callable[[], Any], repeat: int)->Dict[str, float]:
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best, 'peak_bytes': peak}
+
+def _commit()->str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(sizes: List[int], repeat: int, workdir: str)->Dict[str, Any]:
+    efi = write_efivars_tree(os.path.join(workdir, 'efivars'))
+    policy = load_policy(None)
+    results: List[Dict[str, Any]] = []
+    for n in sizes:
+        log = write_eventlog(os.path.join(workdir, f'log{n}.bin'), n)
+        blob = open(log, 'rb').read()
+        algs, events = parse_tpm2_eventlog(blob)
+        bl = create_baseline(log, efi)
+        finds = [Finding('event-changed', f'PCR7.sha256#{i}', 'high', f'event #{i} changed') for i in range(n)]
+        stages: Dict[str, Callable[[], Any]] = {
+            'parse_tpm2_eventlog': lambda: parse_tpm2_eventlog(blob),
+            'compute_pcrs': lambda: compute_pcrs(algs, events),
+            'diff_attestation': lambda: diff_attestation(bl, blob, efi, policy),
+            'export_sbom': lambda: export_sbom(log, efi, os.path.join(workdir, 'sbom.json')),
+            'render_text': lambda: render_text(finds),
+            'render_json': lambda: render_json(finds),
+            'render_sarif': lambda: render_sarif(finds),
+            'render_junit': lambda: render_junit(finds, 'medium'),
+        }
+        for name, fn in stages.items():
+            m = _measure(fn, repeat)
+            results.append({'stage': name, 'events': n, 'log_bytes': len(blob), **m, 'events_per_sec': n / m['seconds'] if m['seconds'] else None, 'mb_per_sec': len(blob) / m['seconds'] / 1e6 if m['seconds'] else None})
+            print(f'{name:22s} {n:>9d} events {m["seconds"]*1e3:10.2f} ms {m["peak_bytes"]/1e6:9.2f} MB peak', file=sys.stderr)
+        os.unlink(log)
+    return {'version': 1, 'meta': {'commit': _commit(), 'python': platform.python_version(), 'platform': platform.platform(), 'created_at': int(time.time()), 'repeat': repeat}, 'results': results}
+
+def startup(repeat: int, workdir: str)->List[Dict[str, Any]]:
+    log = write_eventlog(os.path.join(workdir, 'startup.bin'), 200)
+    efi = os.path.join(workdir, 'efivars')
+    bl = os.path.join(workdir, 'startup.json')
+    save_baseline(create_baseline(log, efi), bl)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cmds = {'version': ['version'], 'attest': ['attest', '--event-log', log, '--efivars', efi, '--baseline', bl]}
+    out = []
+    for name, args in cmds.items():
+        best = float('inf')
+        for _ in range(max(repeat, 5)):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'import sys; from bootattestor.cli import main; sys.exit(main())', *args], cwd=root, stdout=subprocess.DEVNULL, check=True)
+            best = min(best, time.perf_counter() - t0)
+        out.append({'stage': f'startup_{name}', 'events': 200 if name == 'attest' else 0, 'seconds': best, 'budget_seconds': STARTUP_BUDGET_MS[name] / 1e3})
+        print(f'{"startup_" + name:22s} {best*1e3:10.2f} ms (budget {STARTUP_BUDGET_MS[name]} ms)', file=sys.stderr)
+    return out
+
+def over_budget(res: Dict[str, Any])->List[str]:
+    return [f'{r["stage"]}: {r["seconds"]*1e3:.2f} ms > {r["budget_seconds"]*1e3:.0f} ms' for r in res['results'] if r.get('budget_seconds') and r['seconds'] > r['budget_seconds']]
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], tolerance: float)->List[str]:
+    prev = {(r['stage'], r['events']): r for r in old.get('results', [])}
+    out = []
+    for r in new['results']:
+        o = prev.get((r['stage'], r['events']))
+        if o and r['seconds'] > o['seconds'] * (1 + tolerance):
+            out.append(f'{r["stage"]} @ {r["events"]} events: {o["seconds"]*1e3:.2f} ms -> {r["seconds"]*1e3:.2f} ms')
+    return out
+
+def main(argv: List[str] | None = None)->int:
+    p = argparse.ArgumentParser(prog='bench')
+    p.add_argument('--sizes', type=lambda s: [int(x) for x in s.split(',')], default=DEFAULT_SIZES, help='comma separated event counts')
+    p.add_argument('--repeat', type=int, default=3, help='timed runs per stage; the fastest is kept')
+    p.add_argument('-o', '--output', help='write results json here (default: stdout)')
+    p.add_argument('--compare', help='previous results json; exit 1 if any stage regressed')
+    p.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown before --compare fails')
+    args = p.parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix='bootattest-bench-') as d:
+        res = run(args.sizes, args.repeat, d)
+        res['results'] += startup(args.repeat, d)
+    data = json.dumps(res, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f: f.write(data)
+    else:
+        print(data)
+    failed = over_budget(res)
+    for line in failed: print(f'OVER BUDGET {line}', file=sys.stderr)
+    if args.compare:
+        regressions = compare(json.load(open(args.compare, 'r', encoding='utf-8')), res, args.tolerance)
+        for line in regressions: print(f'REGRESSION {line}', file=sys.stderr)
+        failed += regressions
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,10 @@
-from .attestor import run_attest, create_baseline, export_sbom, load_event_log, load_efivars, load_policy
 from .version import get_version
 __all__=['run_attest','create_baseline','export_sbom','load_event_log','load_efivars','load_policy','__version__']
 __version__=get_version()
+
+def __getattr__(name: str):
+    # the attestor pulls in most of the package; `bootattest version` and other light commands never need it
+    if name in __all__:
+        from . import attestor
+        return getattr(attestor, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import os, zlib, sqlite3, hashlib
+from array import array
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .tcg import parse_tpm2_header, iter_tpm2_events
+from .errors import AttestorError
+
+# content-addressed fleet archive. Event logs are cut at event record boundaries and each record,
+# like each efivarfs file, is stored once under its sha256 (zlib compressed when that helps).
+# A host is an ordered list of record ids plus its variable files, so rebuilding is concatenation.
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS blobs(id INTEGER PRIMARY KEY, digest BLOB UNIQUE NOT NULL, size INTEGER NOT NULL, zlib INTEGER NOT NULL, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS hosts(id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, log_size INTEGER NOT NULL, log_sha256 TEXT NOT NULL, chunks BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS host_vars(host_id INTEGER NOT NULL REFERENCES hosts(id) ON DELETE CASCADE, name TEXT NOT NULL, blob_id INTEGER NOT NULL REFERENCES blobs(id), PRIMARY KEY(host_id, name));
+'''
+
+def split_records(buf)->List[memoryview]:
+    # SpecID header, then one chunk per event record; anything unparsable stays as a single tail chunk
+    mv = memoryview(buf)
+    try:
+        algs, off = parse_tpm2_header(mv)
+    except AttestorError:
+        return [mv] if len(mv) else []
+    out, start = [mv[:off]], off
+    try:
+        for ev in iter_tpm2_events(mv, algs, off):
+            out.append(mv[start:ev.end]); start = ev.end
+    except AttestorError:
+        pass
+    if start < len(mv): out.append(mv[start:])
+    return out
+
+class Archive:
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(_SCHEMA)
+
+    def close(self)->None:
+        self.db.close()
+
+    def __enter__(self)->'Archive':
+        return self
+
+    def __exit__(self, *exc)->None:
+        self.close()
+
+    def _put(self, data)->int:
+        d = hashlib.sha256(data).digest()
+        row = self.db.execute('SELECT id FROM blobs WHERE digest=?', (d,)).fetchone()
+        if row: return row[0]
+        raw = bytes(data)
+        z = zlib.compress(raw, 9)
+        packed, flag = (z, 1) if len(z) < len(raw) else (raw, 0)
+        return self.db.execute('INSERT INTO blobs(digest, size, zlib, data) VALUES (?,?,?,?)', (d, len(raw), flag, packed)).lastrowid
+
+    def _get(self, blob_id: int)->bytes:
+        row = self.db.execute('SELECT zlib, data FROM blobs WHERE id=?', (blob_id,)).fetchone()
+        if row is None: raise AttestorError(f'archive {self.path} is missing blob {blob_id}')
+        return zlib.decompress(row[1]) if row[0] else row[1]
+
+    def _host_id(self, name: str)->Tuple[int, int, str, bytes]:
+        row = self.db.execute('SELECT id, log_size, log_sha256, chunks FROM hosts WHERE name=?', (name,)).fetchone()
+        if row is None: raise AttestorError(f'host {name} not in archive {self.path}')
+        return row
+
+    def add(self, name: str, log, var_items: Iterable[Tuple[str, bytes]], replace: bool = False)->None:
+        with self.db:
+            if self.db.execute('SELECT 1 FROM hosts WHERE name=?', (name,)).fetchone():
+                if not replace: raise AttestorError(f'host {name} already in archive')
+                self.db.execute('DELETE FROM hosts WHERE name=?', (name,))
+                self._gc()
+            ids = array('Q', (self._put(c) for c in split_records(log)))
+            hid = self.db.execute('INSERT INTO hosts(name, log_size, log_sha256, chunks) VALUES (?,?,?,?)',
+                                  (name, len(log), hashlib.sha256(log).hexdigest(), zlib.compress(ids.tobytes()))).lastrowid
+            self.db.executemany('INSERT INTO host_vars VALUES (?,?,?)', [(hid, fn, self._put(raw)) for fn, raw in var_items])
+
+    def remove(self, name: str)->None:
+        with self.db:
+            if not self.db.execute('DELETE FROM hosts WHERE name=?', (name,)).rowcount:
+                raise AttestorError(f'host {name} not in archive')
+            self._gc()
+
+    def _gc(self)->None:
+        # record ids live inside the compressed manifests, so reachability is worked out here
+        live = set(r[0] for r in self.db.execute('SELECT blob_id FROM host_vars'))
+        for (chunks,) in self.db.execute('SELECT chunks FROM hosts'):
+            live.update(array('Q', zlib.decompress(chunks)))
+        dead = [(i,) for (i,) in self.db.execute('SELECT id FROM blobs') if i not in live]
+        self.db.executemany('DELETE FROM blobs WHERE id=?', dead)
+
+    def hosts(self)->List[Tuple[str, int, int]]:
+        return self.db.execute('SELECT h.name, h.log_size, count(v.name) FROM hosts h LEFT JOIN host_vars v ON v.host_id=h.id GROUP BY h.id ORDER BY h.name').fetchall()
+
+    def read_log(self, name: str)->bytes:
+        _, size, sha, chunks = self._host_id(name)
+        ids = array('Q', zlib.decompress(chunks))
+        log = b''.join(self._get(i) for i in ids)
+        if len(log) != size or hashlib.sha256(log).hexdigest() != sha: raise AttestorError(f'archive {self.path}: host {name} does not rebuild to its recorded log')
+        return log
+
+    def read_vars(self, name: str)->List[Tuple[str, bytes]]:
+        hid = self._host_id(name)[0]
+        return [(fn, self._get(b)) for fn, b in self.db.execute('SELECT name, blob_id FROM host_vars WHERE host_id=? ORDER BY name', (hid,)).fetchall()]
+
+    def stats(self)->Dict[str, Any]:
+        hosts, logs = self.db.execute('SELECT count(*), coalesce(sum(log_size), 0) FROM hosts').fetchone()
+        var_bytes = self.db.execute('SELECT coalesce(sum(b.size), 0) FROM host_vars v JOIN blobs b ON b.id=v.blob_id').fetchone()[0]
+        blobs, stored = self.db.execute('SELECT count(*), coalesce(sum(length(data)), 0) FROM blobs').fetchone()
+        manifests = self.db.execute('SELECT coalesce(sum(length(chunks)), 0) FROM hosts').fetchone()[0]
+        return {'hosts': hosts, 'blobs': blobs, 'input_bytes': logs + var_bytes, 'stored_bytes': stored + manifests}
+
+def read_var_dir(efivars_dir: str | None)->List[Tuple[str, bytes]]:
+    if not efivars_dir or not os.path.isdir(efivars_dir): return []
+    out = []
+    for fn in sorted(os.listdir(efivars_dir)):
+        p = os.path.join(efivars_dir, fn)
+        if os.path.isfile(p):
+            with open(p, 'rb') as f: out.append((fn, f.read()))
+    return out
+
+def add_hosts(archive_path: str, source: str, replace: bool = False)->List[str]:
+    # source is a fleet directory or manifest, as taken by attest-fleet
+    from .fleet import discover_hosts
+    names = []
+    with Archive(archive_path) as a:
+        for host, log, efi in discover_hosts(source):
+            with open(log, 'rb') as f: a.add(host, f.read(), read_var_dir(efi), replace)
+            names.append(host)
+    return names
+
+def extract_host(archive_path: str, host: str, out_dir: str)->str:
+    # same layout as a fleet bundle: <out>/binary_bios_measurements and <out>/efivars/
+    with Archive(archive_path) as a:
+        log, var_items = a.read_log(host), a.read_vars(host)
+    os.makedirs(os.path.join(out_dir, 'efivars'), exist_ok=True)
+    with open(os.path.join(out_dir, 'binary_bios_measurements'), 'wb') as f: f.write(log)
+    for fn, raw in var_items:
+        with open(os.path.join(out_dir, 'efivars', fn), 'wb') as f: f.write(raw)
+    return out_dir
+
+def load_host(archive_path: str, host: str)->Tuple[bytes, List[Tuple[str, bytes]]]:
+    with Archive(archive_path) as a:
+        return a.read_log(host), a.read_vars(host)
@@ -1,15 +1,20 @@
 from __future__ import annotations
-import os, sys, json, hashlib, re
+import os, sys, json, hashlib, re, mmap
 from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Tuple
-from importlib import resources
-from jsonschema import validate as jsonschema_validate, ValidationError
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Set, Tuple
+from functools import lru_cache
 
-from .tcg import parse_tpm2_eventlog, EV_EFI_BOOT_SERVICES_APPLICATION, EV_EFI_BOOT_SERVICES_DRIVER, EV_EFI_RUNTIME_SERVICES_DRIVER
-from .pcr import compute_pcrs
-from .efivars import load_efivars, load_efivars_meta
+from .tcg import (parse_tpm2_header, iter_tpm2_events, event_type_name, VARIABLE_EVENTS, EV_EFI_BOOT_SERVICES_APPLICATION, EV_EFI_BOOT_SERVICES_DRIVER,
+                  EV_EFI_RUNTIME_SERVICES_DRIVER, EV_EFI_GPT_EVENT, EV_EFI_PLATFORM_FIRMWARE_BLOB, EV_EFI_PLATFORM_FIRMWARE_BLOB2)
+from .pcr import ALG_ID_TO_NAME, compute_pcrs, replay_incremental, load_checkpoint, save_checkpoint
+from .uefi import decode_image_load, decode_variable_data, decode_gpt_event, decode_firmware_blob
+from .efivars import load_efivars_meta, efivar_meta_from_blobs, hash_efivars, hash_efivar_blobs, _split_key
+from .eventdiff import EventRef, tee_event_refs, align_digests
 from .errors import AttestorError
-from .report import render_text, render_json, render_sarif, render_junit
+from .policy import CompiledPolicy, as_policy, variable_pcr, load_policy as _load_policy
+from .trace import stage, count, active as trace_active
+from . import logcache
+from .report import RANK, open_writer, render_text, render_json, render_sarif, render_junit
 
 @dataclass
 class Baseline:
@@ -18,6 +23,7 @@ class Baseline:
     digests: Dict[str, Dict[int, str]]
     variables: Dict[str, str]
     created_at: int
+    events: Dict[str, Dict[int, List[EventRef]]] | None = None
 
 @dataclass
 class Finding:
@@ -25,6 +31,7 @@ class Finding:
     id: str
     severity: str
     message: str
+    event: Dict[str, Any] | None = None
 
 def _auto_eventlog_path()->str | None:
     for p in ['/sys/kernel/security/tpm0/binary_bios_measurements','/sys/kernel/security/tpm1/binary_bios_measurements','/sys/firmware/tpm/tpm0/binary_bios_measurements','/sys/firmware/tpm/tpm1/binary_bios_measurements']:
@@ -36,105 +43,369 @@ def load_event_log(path: str | None = None)->bytes:
     if not p or not os.path.exists(p): raise AttestorError('event log not found; pass --event-log')
     return open(p,'rb').read()
 
-def load_efivars(path: str | None = None):
+def map_event_log(path: str | None = None)->memoryview:
+    p = path or _auto_eventlog_path()
+    if not p or not os.path.exists(p): raise AttestorError('event log not found; pass --event-log')
+    with stage('load_event_log'), open(p,'rb') as f:
+        try:
+            mv = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (ValueError, OSError):
+            # securityfs logs report size 0 and cannot be mapped
+            mv = memoryview(f.read())
+        count('bytes_read', len(mv))
+        return mv
+
+def load_efivars(path: str | None = None, include: Collection[str] | None = None, exclude: Collection[str] | None = None):
     from .efivars import load_efivars as _lf
-    return _lf(path)
+    return _lf(path, include, exclude)
+
+@lru_cache(maxsize=None)
+def _schema_validator(name: str):
+    # jsonschema takes longer to import than the rest of the package, so it is only loaded when
+    # the fast path below rejects a document and the error needs explaining
+    from importlib.resources import files
+    from jsonschema import Draft202012Validator
+    return Draft202012Validator(json.loads(files('bootattestor.schemas').joinpath(name).read_text(encoding='utf-8')))
+
+_PCR_KEY = re.compile('^[0-9]+$')
+_DIGEST = re.compile('^[0-9a-f]{40,128}$')
+_SHA256 = re.compile('^[0-9a-f]{64}$')
+_BASELINE_KEYS = frozenset(('$schema', 'schema_version', 'platform', 'digests', 'variables', 'created_at', 'events'))
+# sha256 of the baseline.schema.json that _baseline_ok transcribes; tests fail when the schema
+# changes without this being updated, which is the cue to bring _baseline_ok in line first
+_BASELINE_SCHEMA_SHA256 = 'f27b94bbc2d70b53076d22380d3756214553a806867733a902d42966cdcd74bf'
 
-def _hash_vars(vars: Dict[Tuple[str,str], bytes])->Dict[str,str]:
-    return { f'{name}-{guid}': hashlib.sha256(data).hexdigest() for (name,guid), data in vars.items() }
+def _uint(v: Any)->bool:
+    return type(v) is int and v >= 0
 
-def _baseline_schema()->dict:
-    return json.loads(resources.read_text('bootattestor.schemas','baseline.schema.json'))
+def _baseline_ok(obj: Any)->bool:
+    # baseline.schema.json written out by hand (patterns use re.search like jsonschema). True only
+    # when the schema accepts obj; anything unusual, e.g. 1.0 for 1, is left to jsonschema.
+    if type(obj) is not dict or not _BASELINE_KEYS.issuperset(obj) or not all(k in obj for k in ('schema_version', 'platform', 'digests', 'variables', 'created_at')): return False
+    if '$schema' in obj and type(obj['$schema']) is not str: return False
+    if type(obj['schema_version']) is not int or obj['schema_version'] != 1 or obj['platform'] not in ('linux', 'windows') or not _uint(obj['created_at']): return False
+    digests, variables = obj['digests'], obj['variables']
+    if type(digests) is not dict or not digests or type(variables) is not dict: return False
+    for bank in digests.values():
+        if type(bank) is not dict: return False
+        for k, v in bank.items():
+            if _PCR_KEY.search(k) and not (type(v) is str and _DIGEST.search(v)): return False
+    if not all(type(v) is str and _SHA256.search(v) for v in variables.values()): return False
+    events = obj.get('events')
+    if events is None: return 'events' not in obj
+    if type(events) is not dict or len(events) > 1: return False
+    for bank in events.values():
+        if type(bank) is not dict: return False
+        for k, evs in bank.items():
+            if not _PCR_KEY.search(k): continue
+            if type(evs) is not list: return False
+            for e in evs:
+                if type(e) is not list or len(e) != 4 or not _uint(e[0]) or not _uint(e[1]) or type(e[2]) is not str or not _DIGEST.search(e[2]) or type(e[3]) is not str: return False
+    return True
 
 def _validate_baseline_dict(obj: dict)->None:
-    try:
-        jsonschema_validate(obj, _baseline_schema())
-    except ValidationError as e:
-        raise AttestorError(f'baseline schema validation failed: {e.message}')
-
-def load_policy(policy_path: str | None)->Dict[str, List[int]]:
-    if not policy_path: return {'critical':[7], 'high':[0,2,4,5], 'medium':[], 'low':[]}
-    data = json.load(open(policy_path,'r',encoding='utf-8'))
-    if not isinstance(data, dict): raise AttestorError('policy must be a JSON object with severity arrays')
-    return data
-
-def _sev_for_pcr(idx: int, policy: Dict[str, List[int]])->str:
-    if idx in policy.get('critical',[7]): return 'critical'
-    if idx in policy.get('high',[0,2,4,5]): return 'high'
-    if idx in policy.get('medium',[]): return 'medium'
-    return 'low'
-
-def create_baseline(event_log_path: str | None, efivars_dir: str | None, platform: str | None = None)->Baseline:
-    blob = load_event_log(event_log_path)
-    algs, events = parse_tpm2_eventlog(blob)
-    pcrs = compute_pcrs(algs, events)
-    vars_raw = load_efivars(efivars_dir)
-    return Baseline(schema_version=1, platform=platform or ('windows' if sys.platform=='win32' else 'linux'), digests=pcrs, variables=_hash_vars(vars_raw), created_at=int(__import__('time').time()))
-
-def diff_attestation(baseline: Baseline, event_blob: bytes, efivars_dir: str | None, policy: Dict[str,List[int]])->List[Finding]:
-    algs, events = parse_tpm2_eventlog(event_blob)
-    pcrs_now = compute_pcrs(algs, events)
-    vars_now = _hash_vars(load_efivars(efivars_dir))
+    with stage('validate_baseline'):
+        if _baseline_ok(obj): return
+        from jsonschema.exceptions import best_match
+        err = best_match(_schema_validator('baseline.schema.json').iter_errors(obj))
+        if err is not None: raise AttestorError(f'baseline schema validation failed: {err.message}')
+
+def load_policy(policy_path: str | None)->CompiledPolicy:
+    # the compiled form is kept next to parsed logs when a cache directory is in use
+    c = logcache.active()
+    return _load_policy(policy_path, c.root if c else None)
+
+_ALG_NAME_TO_ID = {v:k for k,v in ALG_ID_TO_NAME.items()}
+
+def _event_bank(algs)->int | None:
+    # event-level baselines record a single bank; prefer sha256
+    for alg in (0x000B, 0x000C, 0x000D, 0x0004):
+        if alg in algs: return alg
+    return None
+
+def _log_events(buf)->Tuple[Dict[int,int], Iterable]:
+    # events from the parsed-log cache when one is in use, else straight off the parser
+    p = logcache.parsed(buf)
+    if p is not None: return p.algs, p.events()
+    algs, off = parse_tpm2_header(buf)
+    return algs, iter_tpm2_events(buf, algs, off)
+
+def _parse_and_replay(buf, wrap=None)->Tuple[Dict[int,int], Dict[str, Dict[int,str]]]:
+    p = logcache.parsed(buf)
+    if p is not None:
+        # replay comes from the cache; a wrapper still sees every event
+        if wrap is not None:
+            for _ in wrap(p.events(), p.algs): pass
+        return p.algs, p.pcrs
+    algs, off = parse_tpm2_header(buf)
+    events: Iterable = iter_tpm2_events(buf, algs, off)
+    if trace_active():
+        # parsing is normally fused into the replay loop; materialise it so the two are timed apart
+        with stage('parse_tpm2_eventlog'):
+            events = list(events)
+            count('events', len(events)); count('bytes_parsed', len(buf) - off)
+    if wrap is not None: events = wrap(events, algs)
+    with stage('compute_pcrs'):
+        return algs, compute_pcrs(algs, events)
+
+def _hash_efivars(efivars_dir: str | None, include: Collection[str] | None, exclude: Collection[str] | None, cache: str | None)->Dict[str,str]:
+    with stage('load_efivars'):
+        return hash_efivars(efivars_dir, include, exclude, cache)
+
+def create_baseline(event_log_path: str | None, efivars_dir: str | None, platform: str | None = None, with_events: bool = False, var_include: Collection[str] | None = None, var_exclude: Collection[str] | None = None, efivars_cache: str | None = None)->Baseline:
+    buf = map_event_log(event_log_path)
+    refs: Dict[int, List[EventRef]] = {}
+    picked: List[int] = []
+    def tee(events, algs):
+        ev_alg = _event_bank(algs)
+        if ev_alg is None: return events
+        picked.append(ev_alg)
+        return tee_event_refs(events, ev_alg, refs)
+    algs, pcrs = _parse_and_replay(buf, tee if with_events else None)
+    var_hashes = _hash_efivars(efivars_dir, var_include, var_exclude, efivars_cache)
+    ev_map = {ALG_ID_TO_NAME[picked[0]]: refs} if picked else None
+    return Baseline(schema_version=1, platform=platform or ('windows' if sys.platform=='win32' else 'linux'), digests=pcrs, variables=var_hashes, created_at=int(__import__('time').time()), events=ev_map)
+
+def replay_event_log(event_blob, checkpoint_path: str | None = None)->Dict[str, Dict[int,str]]:
+    if not checkpoint_path:
+        return _parse_and_replay(event_blob)[1]
+    with stage('replay_incremental'):
+        pcrs, cp = replay_incremental(event_blob, load_checkpoint(checkpoint_path))
+        save_checkpoint(cp, checkpoint_path)
+        count('events', cp.events)
+    return pcrs
+
+def diff_attestation(baseline: Baseline, event_blob, efivars_dir: str | None, policy: CompiledPolicy | Dict[str, Any], checkpoint_path: str | None = None, pcrs_now: Dict[str, Dict[int,str]] | None = None, efivars_cache: str | None = None, vars_now: Dict[str,str] | None = None, verify_digests: bool = False)->List[Finding]:
+    # every finding goes through the compiled policy once, as it is produced
+    pol = as_policy(policy)
+    if pcrs_now is None: pcrs_now = replay_event_log(event_blob, checkpoint_path)
+    if vars_now is None: vars_now = _hash_efivars(efivars_dir, baseline.variables.keys(), None, efivars_cache)
     finds: List[Finding] = []
+    def emit(f: Finding, pcr: int | None = None)->None:
+        if not pol.suppressed(f.kind, f.id, pcr): finds.append(f)
+    bad: Set[int] = set()
     for bank in baseline.digests.keys():
         if bank not in pcrs_now:
-            finds.append(Finding('bank-missing', bank, 'high', f'bank {bank} not present in event log'))
+            emit(Finding('bank-missing', bank, 'high', f'bank {bank} not present in event log'))
     for bank, pmap in baseline.digests.items():
         cur_bank = pcrs_now.get(bank, {})
         for idx_s, exp_hex in pmap.items():
             idx = int(idx_s)
             got_hex = cur_bank.get(idx)
             if got_hex is None or got_hex.lower() != exp_hex.lower():
-                finds.append(Finding('pcr-mismatch', f'PCR{idx}.{bank}', _sev_for_pcr(idx, policy), f'expected {exp_hex}, got {got_hex or 'missing'}'))
+                if pol.pcr_allowed(idx, got_hex): continue
+                emit(Finding('pcr-mismatch', f'PCR{idx}.{bank}', pol.sev_for_pcr(idx), f'expected {exp_hex}, got {got_hex or "missing"}'), idx)
+                bad.add(idx)
     for k, exp in baseline.variables.items():
         got = vars_now.get(k)
         if got is None or got.lower() != exp.lower():
-            finds.append(Finding('var-mismatch', k, 'high', f'variable changed: expected {exp}, got {got or 'missing'}'))
+            name = (_split_key(k) or (k,))[0]
+            emit(Finding('var-mismatch', k, pol.sev_for_variable(name, 'high'), f'variable changed: expected {exp}, got {got or "missing"}'), variable_pcr(name))
+    if baseline.events and bad:
+        for f, pcr in _event_findings(baseline, event_blob, bad, pol): emit(f, pcr)
+    if verify_digests:
+        for f, pcr in digest_findings(event_blob): emit(f, pcr)
     return finds
 
-def save_baseline(bl: Baseline, path: str)->None:
+def _ev_info(ref: EventRef)->Dict[str, Any]:
+    return {'index':ref[0],'type':event_type_name(ref[1]),'description':ref[3]}
+
+def _event_findings(baseline: Baseline, event_blob, pcrs: Set[int], pol: CompiledPolicy)->Iterator[Tuple[Finding, int]]:
+    bank, expected = next(iter(baseline.events.items()))
+    alg = _ALG_NAME_TO_ID.get(bank)
+    algs, events = _log_events(event_blob)
+    if alg not in algs: return
+    current: Dict[int, List[EventRef]] = {}
+    for _ in tee_event_refs(events, alg, current, pcrs): pass
+    for pcr in sorted(pcrs):
+        exp, cur = expected.get(pcr, []), current.get(pcr, [])
+        first = True
+        for op, i, j in align_digests([e[2] for e in exp], [e[2] for e in cur]):
+            if op == 'equal': continue
+            ref = cur[j] if j is not None else exp[i]
+            # an allowed digest showing up (new or replacing another) is an expected update
+            if op != 'removed' and pol.event_allowed(pcr, ref[2]): continue
+            info = _ev_info(ref)
+            sev = pol.sev_for_event(pcr, ref[1], ref[3] if ref[1] in VARIABLE_EVENTS else None)
+            where = f'{info["type"]} "{info["description"]}"'
+            if first:
+                yield Finding('event-divergence', f'PCR{pcr}.{bank}', sev, f'first diverging event #{ref[0]}: {where}', info), pcr
+                first = False
+            if op == 'changed':
+                msg = f'event #{ref[0]} {where}: expected {exp[i][2]} ({event_type_name(exp[i][1])} "{exp[i][3]}"), got {ref[2]}'
+            elif op == 'removed':
+                msg = f'baseline event #{ref[0]} {where} missing from log'
+            else:
+                msg = f'event #{ref[0]} {where} not in baseline'
+            yield Finding(f'event-{op}', f'PCR{pcr}.{bank}#{ref[0]}', sev, msg, info), pcr
+
+def digest_findings(event_blob, workers: int | None = None)->Iterator[Tuple[Finding, int]]:
+    # a logged digest that does not match its own event data means the log cannot be trusted to
+    # explain the PCRs, whatever the replay says
+    from .verify import verify_event_digests
+    for i, pcr, ev_type, alg, logged, computed, desc in verify_event_digests(event_blob, workers):
+        bank = ALG_ID_TO_NAME.get(alg, f'alg{alg}')
+        info = _ev_info((i, ev_type, logged, desc))
+        yield Finding('event-digest-mismatch', f'PCR{pcr}.{bank}#{i}', 'critical', f'event #{i} {info["type"]} "{desc}": logged digest {logged} does not match its data ({computed})', info), pcr
+
+def baseline_to_dict(bl: Baseline)->dict:
     obj = asdict(bl); obj['$schema'] = 'schema://bootattestor/baseline.json'
+    obj['digests'] = {bank:{str(i):v for i,v in pmap.items()} for bank,pmap in obj['digests'].items()}
+    if obj['events'] is None: del obj['events']
+    else: obj['events'] = {bank:{str(i):[list(r) for r in refs] for i,refs in pmap.items()} for bank,pmap in obj['events'].items()}
+    return obj
+
+def save_baseline(bl: Baseline, path: str)->None:
+    obj = baseline_to_dict(bl)
     _validate_baseline_dict(obj)
     with open(path,'w',encoding='utf-8') as f: json.dump(obj, f, indent=2)
 
-def run_attest(event_log_path: str | None, baseline_path: str, efivars_dir: str | None, fmt: str, out_file: str | None, fail_on: str, policy_path: str | None = None)->int:
-    base_obj = json.load(open(baseline_path,'r',encoding='utf-8'))
-    _validate_baseline_dict(base_obj)
-    bl = Baseline(schema_version=base_obj['schema_version'], platform=base_obj['platform'], digests={k:{int(i):v for i,v in d.items()} for k,d in base_obj['digests'].items()}, variables=base_obj['variables'], created_at=base_obj['created_at'])
+def load_baseline(path: str)->Baseline:
+    with stage('load_baseline'):
+        base_obj = json.load(open(path,'r',encoding='utf-8'))
+        _validate_baseline_dict(base_obj)
+        return baseline_from_dict(base_obj)
+
+def baseline_from_dict(base_obj: dict)->Baseline:
+    return Baseline(schema_version=base_obj['schema_version'], platform=base_obj['platform'], digests={k:{int(i):v for i,v in d.items()} for k,d in base_obj['digests'].items()}, variables=base_obj['variables'], created_at=base_obj['created_at'], events={k:{int(i):[tuple(r) for r in refs] for i,refs in d.items()} for k,d in base_obj['events'].items()} if 'events' in base_obj else None)
+
+def render_findings(finds: List[Finding], fmt: str, fail_on: str)->str:
+    if fmt == 'text': return render_text(finds)
+    if fmt == 'json': return render_json(finds)
+    if fmt == 'sarif': return render_sarif(finds)
+    if fmt == 'junit': return render_junit(finds, fail_on)
+    raise AttestorError('bad format')
+
+def write_reports(finds: Iterable[Finding], outputs: List[Tuple[str, str | None]], fail_on: str)->int:
+    # one pass over finds feeds every (format, path) writer; a None path means stdout
+    handles: List[Any] = []
+    worst = 0
+    try:
+        writers = []
+        for fmt, out_file in outputs:
+            if out_file:
+                os.makedirs(os.path.dirname(out_file) or '.', exist_ok=True)
+                fh = open(out_file,'w',encoding='utf-8'); handles.append(fh)
+            else:
+                fh = sys.stdout
+            writers.append(open_writer(fmt, fh, fail_on))
+        with stage('render'):
+            for f in finds:
+                worst = max(worst, RANK.get(f.severity,1))
+                for w in writers: w.add(f)
+            for w in writers: w.close()
+    finally:
+        for fh in handles: fh.close()
+    return 1 if worst >= RANK.get(fail_on, 3) else 0
+
+def exit_status(finds: List[Finding], fail_on: str)->int:
+    worst = max([RANK.get(f.severity,1) for f in finds], default=0)
+    return 1 if worst >= RANK.get(fail_on, 3) else 0
+
+def run_attest(event_log_path: str | None, baseline_path: str | None, efivars_dir: str | None, fmt: str, out_file: str | None, fail_on: str, policy_path: str | None = None, checkpoint_path: str | None = None, baseline_store: str | None = None, efivars_cache: str | None = None, outputs: List[Tuple[str, str | None]] | None = None, verify_digests: bool = False, archive: str | None = None, host: str | None = None)->int:
     policy = load_policy(policy_path)
-    blob = load_event_log(event_log_path)
-    finds = diff_attestation(bl, blob, efivars_dir, policy)
-    if fmt == 'text': content = render_text(finds)
-    elif fmt == 'json': content = render_json(finds)
-    elif fmt == 'sarif': content = render_sarif(finds)
-    elif fmt == 'junit': content = render_junit(finds, fail_on)
-    else: raise AttestorError('bad format')
-    if out_file:
-        os.makedirs(os.path.dirname(out_file) or '.', exist_ok=True)
-        with open(out_file,'w',encoding='utf-8') as f: f.write(content)
+    var_items = None
+    if archive:
+        from .archive import load_host
+        with stage('archive_load'):
+            blob, var_items = load_host(archive, host)
+    else:
+        blob = map_event_log(event_log_path)
+    def vars_for(bl: Baseline)->Dict[str,str] | None:
+        return hash_efivar_blobs(var_items, bl.variables.keys()) if var_items is not None else None
+    if baseline_store:
+        from .store import BaselineStore, select_baseline
+        pcrs = replay_event_log(blob, checkpoint_path)
+        with BaselineStore(baseline_store) as st: bl, selected = select_baseline(st, pcrs)
+        finds = [selected] + diff_attestation(bl, blob, efivars_dir, policy, pcrs_now=pcrs, efivars_cache=efivars_cache, vars_now=vars_for(bl), verify_digests=verify_digests)
+    elif baseline_path:
+        bl = load_baseline(baseline_path)
+        finds = diff_attestation(bl, blob, efivars_dir, policy, checkpoint_path, efivars_cache=efivars_cache, vars_now=vars_for(bl), verify_digests=verify_digests)
+    else:
+        raise AttestorError('pass --baseline or --baseline-store')
+    return write_reports(finds, outputs or [(fmt, out_file)], fail_on)
+
+IMAGE_EVENTS = (EV_EFI_BOOT_SERVICES_APPLICATION, EV_EFI_BOOT_SERVICES_DRIVER, EV_EFI_RUNTIME_SERVICES_DRIVER)
+
+def _image_path(data)->str:
+    # fallback for image events whose body is not a UEFI_IMAGE_LOAD_EVENT; some firmware logs plain ASCII
+    raw = bytes(data)
+    for s in (raw.decode('utf-16-le', errors='ignore'), raw.decode('utf-8', errors='ignore')):
+        for marker in ('\\EFI\\','/EFI/'):
+            start = s.upper().find(marker)
+            if start == -1: continue
+            end = s.lower().find('.efi', start)
+            if end != -1: return s[start:end+4]
+    return ''
+
+def _event_component(ev)->Dict[str, Any] | None:
+    # one SBOM component per measured image, variable, partition table or firmware blob
+    t = ev.event_type
+    if t in IMAGE_EVENTS:
+        img = decode_image_load(ev.data)
+        c: Dict[str, Any] = {'type':'efi_image','pcr':ev.pcr_index}
+        if img is None: c['path'] = _image_path(ev.data)
+        else: c.update(path=img.file_path, device_path=img.device_path, image_size=img.length)
+    elif t in VARIABLE_EVENTS:
+        var = decode_variable_data(ev.data)
+        if var is None: return None
+        c = {'type':'measured_variable','pcr':ev.pcr_index,'event_type':event_type_name(t),'name':var.name,'guid':var.guid,'size':len(var.data)}
+    elif t == EV_EFI_GPT_EVENT:
+        gpt = decode_gpt_event(ev.data)
+        if gpt is None: return None
+        c = {'type':'gpt','pcr':ev.pcr_index,'disk_guid':gpt.disk_guid,'partitions':[{'name':p.name,'type_guid':p.type_guid,'guid':p.guid,'first_lba':p.first_lba,'last_lba':p.last_lba} for p in gpt.partitions]}
+    elif t in (EV_EFI_PLATFORM_FIRMWARE_BLOB, EV_EFI_PLATFORM_FIRMWARE_BLOB2):
+        blob = decode_firmware_blob(ev.data, t == EV_EFI_PLATFORM_FIRMWARE_BLOB2)
+        if blob is None: return None
+        c = {'type':'firmware_blob','pcr':ev.pcr_index,'base':blob.base,'length':blob.length}
+        if blob.description is not None: c['description'] = blob.description
+    else:
+        return None
+    c['digests'] = {f'alg{alg}':dig.hex() for alg,dig in ev.digests.items()}
+    return c
+
+def _esp_match(comps: List[Dict[str, Any]], esp_dir: str, cache_path: str | None)->None:
+    # marks each image component with the Authenticode digests of the file now on the ESP and
+    # whether they equal what was measured in every bank both sides have
+    from .authenticode import resolve_esp_path, hash_esp_images
+    files = {i: resolve_esp_path(esp_dir, c['path']) if c['path'] else None for i, c in enumerate(comps)}
+    with stage('esp_hash'):
+        digests = hash_esp_images([f for f in files.values() if f], cache_path)
+    for i, c in enumerate(comps):
+        f = files[i]
+        if f is None:
+            c['esp'] = {'status':'missing'}; c['match'] = False; continue
+        got = digests[f]
+        rel = os.path.relpath(f, esp_dir)
+        if isinstance(got, str):
+            c['esp'] = {'file':rel,'status':'invalid','error':got}; c['match'] = False; continue
+        measured = {ALG_ID_TO_NAME.get(int(k[3:]), k): v for k, v in c['digests'].items()}
+        common = [a for a in got if a in measured]
+        c['match'] = bool(common) and all(measured[a] == got[a] for a in common)
+        c['esp'] = {'file':rel,'status':'match' if c['match'] else 'mismatch','authenticode':got}
+
+def export_sbom(event_log_path: str | None, efivars_dir: str | None, out_file: str, esp_dir: str | None = None, esp_cache: str | None = None, archive: str | None = None, host: str | None = None)->None:
+    var_items = None
+    if archive:
+        from .archive import load_host
+        with stage('archive_load'):
+            buf, var_items = load_host(archive, host)
     else:
-        print(content)
-    rank = {'info':1,'low':2,'medium':3,'high':4,'critical':5}
-    thr = rank.get(fail_on, 3)
-    worst = max([rank.get(f.severity,1) for f in finds], default=0)
-    return 1 if worst >= thr else 0
-
-def export_sbom(event_log_path: str | None, efivars_dir: str | None, out_file: str)->None:
-    blob = load_event_log(event_log_path)
-    algs, events = parse_tpm2_eventlog(blob)
+        buf = map_event_log(event_log_path)
+    algs, events = _log_events(buf)
     comps: List[Dict[str, Any]] = []
-    for ev in events:
-        if ev.event_type in (EV_EFI_BOOT_SERVICES_APPLICATION, EV_EFI_BOOT_SERVICES_DRIVER, EV_EFI_RUNTIME_SERVICES_DRIVER):
-            s = ev.data.decode('utf-8', errors='ignore')
-            path = ''
-            for marker in ('\\EFI\\','/EFI/'):
-                if marker in s:
-                    start = s.find(marker)
-                    end = s.find('.efi', start)
-                    if end != -1:
-                        path = s[start:end+4]; break
-            comps.append({'type':'efi_image','pcr':ev.pcr_index,'path':path,'digests':{f'alg{alg}':dig.hex() for alg,dig in ev.digests.items()}})
-    vars_meta = load_efivars_meta(efivars_dir)
+    with stage('sbom_events'):
+        n = 0
+        for ev in events:
+            n += 1
+            c = _event_component(ev)
+            if c is not None: comps.append(c)
+        count('events', n)
+    if esp_dir:
+        if not os.path.isdir(esp_dir): raise AttestorError(f'ESP not found: {esp_dir}')
+        _esp_match([c for c in comps if c['type'] == 'efi_image'], esp_dir, esp_cache)
+    with stage('load_efivars'):
+        vars_meta = efivar_meta_from_blobs(var_items) if var_items is not None else load_efivars_meta(efivars_dir)
     for (name,guid), meta in vars_meta.items():
         comps.append({'type':'uefi_variable','name':name,'guid':guid,'sha256':hashlib.sha256(meta['data']).hexdigest(),'size':len(meta['data']),'attrs':meta['attrs']})
     sbom = {'schema_version':1,'generator':{'name':'bootattestor','version':'0.2.0'},'generated_at':int(__import__('time').time()),'components':comps}
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import os, mmap, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from .errors import AttestorError
+from .trace import count
+from .statcache import load_stat_cache, save_stat_cache
+
+# PE/COFF Authenticode image digests, computed the way firmware measures a loaded image
+# (EDK2 DxeTpm2MeasureBootLib): headers minus the checksum and certificate directory entry,
+# sections in file order, then any trailing data up to the attribute certificate table
+
+DEFAULT_ALGS = ('sha1', 'sha256')
+
+def _u16(mv: memoryview, off: int)->int: return int.from_bytes(mv[off:off+2], 'little')
+def _u32(mv: memoryview, off: int)->int: return int.from_bytes(mv[off:off+4], 'little')
+
+def _hash_ranges(mv: memoryview)->List[Tuple[int, int]]:
+    n = len(mv)
+    if n < 0x40 or mv[:2] != b'MZ': raise AttestorError('not a PE image (no MZ header)')
+    pe = _u32(mv, 0x3C)
+    if pe + 24 > n or mv[pe:pe+4] != b'PE\x00\x00': raise AttestorError('not a PE image (no PE signature)')
+    nsect, opt_size = _u16(mv, pe+6), _u16(mv, pe+20)
+    opt = pe + 24
+    if opt + opt_size > n or opt_size < 2: raise AttestorError('PE optional header truncated')
+    magic = _u16(mv, opt)
+    if magic == 0x10B: dd, nrva = opt + 96, _u32(mv, opt + 92)
+    elif magic == 0x20B: dd, nrva = opt + 112, _u32(mv, opt + 108)
+    else: raise AttestorError(f'unknown PE optional header magic 0x{magic:x}')
+    size_of_headers = _u32(mv, opt + 60)
+    checksum = opt + 64
+    cert_entry = dd + 4*8
+    cert_off, cert_size = (_u32(mv, cert_entry), _u32(mv, cert_entry + 4)) if nrva > 4 else (0, 0)
+    if size_of_headers > n or (nrva > 4 and cert_entry + 8 > size_of_headers): raise AttestorError('PE headers truncated')
+    if nrva > 4:
+        ranges = [(0, checksum), (checksum + 4, cert_entry), (cert_entry + 8, size_of_headers)]
+    else:
+        ranges = [(0, checksum), (checksum + 4, size_of_headers)]
+    sect = opt + opt_size
+    if sect + 40*nsect > n: raise AttestorError('PE section table truncated')
+    raw = sorted((_u32(mv, s + 20), _u32(mv, s + 16)) for s in range(sect, sect + 40*nsect, 40))
+    hashed = size_of_headers
+    for ptr, size in raw:
+        if not size: continue
+        if ptr + size > n: raise AttestorError('PE section extends past end of file')
+        ranges.append((ptr, ptr + size)); hashed += size
+    tail_end = n - cert_size if cert_size and cert_off + cert_size <= n else n
+    if hashed < tail_end: ranges.append((hashed, tail_end))
+    return ranges
+
+def authenticode_digests(path: str, algs: Iterable[str] = DEFAULT_ALGS)->Dict[str, str]:
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size: raise AttestorError(f'{path}: empty file')
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        hs = {a: hashlib.new(a) for a in algs}
+        # every view is released before close(), which refuses while buffers are exported
+        with memoryview(mm) as mv:
+            for lo, hi in _hash_ranges(mv):
+                with mv[lo:hi] as chunk:
+                    for h in hs.values(): h.update(chunk)
+        return {a: h.hexdigest() for a, h in hs.items()}
+    finally:
+        mm.close()
+
+def resolve_esp_path(esp_root: str, path: str)->str | None:
+    # device paths use backslashes and FAT is case-insensitive; try the literal path, then walk
+    # the tree matching each component without case
+    # the path comes from the event log, which is untrusted: nothing may resolve outside the ESP,
+    # whether through '..' components or a symlink on the mounted partition
+    parts = [p for p in path.replace('\\', '/').split('/') if p not in ('', '.')]
+    if '..' in parts: return None
+    direct = os.path.join(esp_root, *parts)
+    if os.path.isfile(direct): return _inside(esp_root, direct)
+    cur = esp_root
+    for p in parts:
+        try:
+            names = {n.lower(): n for n in os.listdir(cur)}
+        except OSError:
+            return None
+        if p.lower() not in names: return None
+        cur = os.path.join(cur, names[p.lower()])
+    return _inside(esp_root, cur) if os.path.isfile(cur) else None
+
+def _inside(root: str, path: str)->str | None:
+    root = os.path.realpath(root)
+    return path if os.path.commonpath([root, os.path.realpath(path)]) == root else None
+
+def hash_esp_images(files: Iterable[str], cache_path: str | None = None, workers: int | None = None, algs: Iterable[str] = DEFAULT_ALGS)->Dict[str, Dict[str, str] | str]:
+    # file -> {alg: hex}, or an error string for unreadable or non-PE files; with cache_path,
+    # files whose (inode, size, mtime) are unchanged since the last run are not rehashed
+    algs = tuple(algs)
+    cache = load_stat_cache(cache_path)
+    out: Dict[str, Dict[str, str] | str] = {}
+    todo: Dict[str, list] = {}
+    for p in dict.fromkeys(files):
+        st = os.stat(p)
+        sig = [st.st_ino, st.st_size, st.st_mtime_ns]
+        hit = cache.get(p)
+        if hit and hit[:3] == sig and all(a in hit[3] for a in algs):
+            out[p] = hit[3]; count('cache_hits')
+        else:
+            todo[p] = sig
+    def one(p: str)->Dict[str, str] | str:
+        try:
+            return authenticode_digests(p, algs)
+        except (AttestorError, OSError, ValueError) as e:
+            return str(e)
+    if todo:
+        # hashlib releases the GIL on the large mapped ranges, so files hash in parallel
+        with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as ex:
+            for p, res in zip(todo, ex.map(one, todo)): out[p] = res
+        count('bytes_read', sum(sig[1] for sig in todo.values())); count('hashes', len(todo)*len(algs))
+    if cache_path:
+        fresh = {p: cache[p] for p in cache if p not in todo and os.path.exists(p)}
+        fresh.update({p: sig + [out[p]] for p, sig in todo.items() if isinstance(out[p], dict)})
+        save_stat_cache(cache_path, fresh)
+    return out
@@ -1,9 +1,21 @@
 from __future__ import annotations
-import argparse, sys
+import argparse, os, sys
+from contextlib import ExitStack
 from .version import get_version
-from .attestor import run_attest, create_baseline, save_baseline, export_sbom
 from .errors import AttestorError
 
+def _trace_args(p: argparse.ArgumentParser)->None:
+    p.add_argument('--timings', action='store_true', help='print per-stage timings to stderr')
+    p.add_argument('--profile-out', help='write per-stage timings and counters as json')
+
+def _cache_args(p: argparse.ArgumentParser)->None:
+    p.add_argument('--cache-dir', default=os.environ.get('BOOTATTEST_CACHE_DIR'), help='parsed event log cache; repeated runs on the same log skip parsing and replay (default: $BOOTATTEST_CACHE_DIR)')
+    p.add_argument('--cache-max-mb', type=int, default=256, help='evict least recently used cache entries above this size')
+
+def _archive_src_args(p: argparse.ArgumentParser)->None:
+    p.add_argument('--archive', help='read the event log and efivars of --host from this archive instead of --event-log/--efivars')
+    p.add_argument('--host', help='host name in --archive')
+
 def _parser()->argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog='bootattest')
     sub = p.add_subparsers(dest='cmd', required=True)
@@ -11,11 +23,56 @@ def _parser()->argparse.ArgumentParser:
     att = sub.add_parser('attest', help='run attestation')
     att.add_argument('--event-log', help='path to TCG event log')
     att.add_argument('--efivars', help='path to efivars directory')
-    att.add_argument('--baseline', required=True, help='baseline json path')
-    att.add_argument('--policy', help='policy json with PCR severities')
-    att.add_argument('--format', choices=['text','json','sarif','junit'], default='text')
-    att.add_argument('--output', help='write report to file')
+    att_bl = att.add_mutually_exclusive_group(required=True)
+    att_bl.add_argument('--baseline', help='baseline json path')
+    att_bl.add_argument('--baseline-store', help='baseline store to pick the matching baseline from')
+    att.add_argument('--policy', help='policy json: severities by PCR, event type and variable, allowed digests, suppressions')
+    att.add_argument('--format', choices=['text','json','sarif','junit'], action='append', help='report format; repeat with --output to write several reports from one run')
+    att.add_argument('--output', action='append', help='write report to file; pairs with the --format at the same position')
     att.add_argument('--fail-on', choices=['none','low','medium','high','critical'], default='medium')
+    att.add_argument('--checkpoint', help='replay checkpoint file; only events appended since it are replayed')
+    att.add_argument('--efivars-cache', help='stat cache file; unchanged variables are not re-read')
+    att.add_argument('--verify-digests', action='store_true', help='recompute event digests from event data where the spec defines them')
+    _archive_src_args(att)
+    _trace_args(att)
+    _cache_args(att)
+
+    fl = sub.add_parser('attest-fleet', help='attest many hosts in parallel against one baseline')
+    fl.add_argument('--hosts', required=True, help='directory of per-host bundles or JSON manifest')
+    fl.add_argument('--baseline', required=True, help='baseline json path')
+    fl.add_argument('--policy', help='policy json: severities by PCR, event type and variable, allowed digests, suppressions')
+    fl.add_argument('--format', choices=['text','json','sarif','junit'], action='append', help='report format; repeat with --output to write several reports from one run')
+    fl.add_argument('--output', action='append', help='write aggregated report to file; pairs with the --format at the same position')
+    fl.add_argument('--status-output', help='write per-host exit status json to file')
+    fl.add_argument('--fail-on', choices=['none','low','medium','high','critical'], default='medium')
+    fl.add_argument('--jobs', type=int, help='worker processes (default: cpu count)')
+
+    sv = sub.add_parser('serve', help='serve attestations over a local HTTP API')
+    sv_bl = sv.add_mutually_exclusive_group(required=True)
+    sv_bl.add_argument('--baseline', help='baseline json path')
+    sv_bl.add_argument('--baseline-store', help='baseline store to pick the matching baseline from')
+    sv.add_argument('--policy', help='policy json: severities by PCR, event type and variable, allowed digests, suppressions')
+    sv.add_argument('--host', default='127.0.0.1')
+    sv.add_argument('--port', type=int, default=8455)
+    sv.add_argument('--unix-socket', help='listen on a Unix socket instead of TCP')
+    sv.add_argument('--jobs', type=int, help='worker processes (default: cpu count)')
+    sv.add_argument('--max-body', type=int, default=64 << 20, help='largest accepted upload, and largest unpacked bundle, in bytes')
+
+    wt = sub.add_parser('watch', help='re-attest whenever the event log or efivars change')
+    wt.add_argument('--event-log', help='path to TCG event log')
+    wt.add_argument('--efivars', help='path to efivars directory')
+    wt.add_argument('--baseline', required=True, help='baseline json path')
+    wt.add_argument('--policy', help='policy json: severities by PCR, event type and variable, allowed digests, suppressions')
+    wt.add_argument('--format', choices=['text','json','sarif','junit'], action='append', help='report format, written whenever the findings change; repeat with --output')
+    wt.add_argument('--output', action='append', help='write report to file; pairs with the --format at the same position')
+    wt.add_argument('--fail-on', choices=['none','low','medium','high','critical'], default='medium')
+    wt.add_argument('--efivars-cache', help='stat cache file; unchanged variables are not re-read')
+    wt.add_argument('--interval', type=float, default=5.0, help='seconds between change checks')
+    wt.add_argument('--no-inotify', action='store_true', help='only poll, even where inotify is available')
+    wt.add_argument('--metrics-file', help='write Prometheus metrics here after every check (textfile collector)')
+    wt.add_argument('--metrics-port', type=int, help='serve Prometheus metrics on /metrics at this port')
+    wt.add_argument('--metrics-host', default='127.0.0.1')
+    wt.add_argument('--once', action='store_true', help='check once, write reports and metrics, and exit with the attest status')
 
     bl = sub.add_parser('baseline', help='baseline operations')
     bl_sub = bl.add_subparsers(dest='bcmd', required=True)
@@ -23,29 +80,174 @@ def _parser()->argparse.ArgumentParser:
     blc.add_argument('--event-log', help='path to TCG event log')
     blc.add_argument('--efivars', help='path to efivars directory')
     blc.add_argument('-o','--output', required=True)
+    blc.add_argument('--events', action='store_true', help='also record per-PCR event digests for divergence localization')
+    blc.add_argument('--var-include', action='append', help='only record this variable (name, guid or name-guid); repeatable')
+    blc.add_argument('--var-exclude', action='append', help='skip this variable (name, guid or name-guid); repeatable')
+    blc.add_argument('--efivars-cache', help='stat cache file; unchanged variables are not re-read')
+    _trace_args(blc)
+    _cache_args(blc)
+    bla = bl_sub.add_parser('add', help='add baseline json files to a store')
+    bla.add_argument('--store', required=True, help='baseline store path')
+    bla.add_argument('--name', help='entry name (default: file name; single file only)')
+    bla.add_argument('--replace', action='store_true', help='overwrite an existing entry of the same name')
+    bla.add_argument('baselines', nargs='+')
+    bll = bl_sub.add_parser('list', help='list baselines in a store')
+    bll.add_argument('--store', required=True, help='baseline store path')
+    blr = bl_sub.add_parser('remove', help='remove baselines from a store')
+    blr.add_argument('--store', required=True, help='baseline store path')
+    blr.add_argument('names', nargs='+')
 
     sb = sub.add_parser('sbom', help='export boot SBOM')
     sb.add_argument('--event-log', help='path to TCG event log')
     sb.add_argument('--efivars', help='path to efivars directory')
     sb.add_argument('-o','--output', required=True)
+    sb.add_argument('--esp', help='mounted EFI System Partition; marks each image as matching its measured Authenticode digest or not')
+    sb.add_argument('--esp-cache', help='digest cache file; unchanged ESP binaries are not rehashed')
+    _archive_src_args(sb)
+    _trace_args(sb)
+    _cache_args(sb)
+
+    ar = sub.add_parser('archive', help='deduplicated, compressed store of many hosts\' event logs and efivars')
+    ar_sub = ar.add_subparsers(dest='acmd', required=True)
+    ara = ar_sub.add_parser('add', help='add hosts to an archive')
+    ara.add_argument('--archive', required=True, help='archive path')
+    ara_src = ara.add_mutually_exclusive_group(required=True)
+    ara_src.add_argument('--hosts', help='directory of <host>/ bundles or a JSON manifest, as for attest-fleet')
+    ara_src.add_argument('--event-log', help='event log of the single host named by --host')
+    ara.add_argument('--efivars', help='efivars directory of the single host')
+    ara.add_argument('--host', help='host name for --event-log')
+    ara.add_argument('--replace', action='store_true', help='overwrite hosts already in the archive')
+    arl = ar_sub.add_parser('list', help='list hosts in an archive')
+    arl.add_argument('--archive', required=True, help='archive path')
+    ars = ar_sub.add_parser('stats', help='show host, blob and byte counts')
+    ars.add_argument('--archive', required=True, help='archive path')
+    are = ar_sub.add_parser('extract', help='rebuild a host\'s original event log and efivars files')
+    are.add_argument('--archive', required=True, help='archive path')
+    are.add_argument('--host', required=True)
+    are.add_argument('-o','--output', required=True, help='directory to write <output>/binary_bios_measurements and <output>/efivars/ into')
+    arr = ar_sub.add_parser('remove', help='remove hosts and any records only they used')
+    arr.add_argument('--archive', required=True, help='archive path')
+    arr.add_argument('names', nargs='+')
+
+    ca = sub.add_parser('cache', help='parsed event log cache maintenance')
+    ca_sub = ca.add_subparsers(dest='ccmd', required=True)
+    for name, hlp in (('stats', 'show entries, size and hit rate'), ('clear', 'remove every entry')):
+        c = ca_sub.add_parser(name, help=hlp)
+        c.add_argument('--cache-dir', default=os.environ.get('BOOTATTEST_CACHE_DIR'), help='cache directory (default: $BOOTATTEST_CACHE_DIR)')
 
     sub.add_parser('version', help='print version')
     return p
 
+def _outputs(formats: list[str] | None, outputs: list[str] | None)->list[tuple[str, str | None]]:
+    formats, outputs = formats or ['text'], outputs or []
+    if len(outputs) > len(formats) or len(formats) - len(outputs) > 1:
+        raise AttestorError('give one --output per --format (at most one format may go to stdout)')
+    return list(zip(formats, outputs + [None]*(len(formats) - len(outputs))))
+
+def _archive_host(args: argparse.Namespace)->None:
+    if args.archive and not args.host: raise AttestorError('--archive needs --host')
+    if args.archive and (args.event_log or args.efivars): raise AttestorError('--archive replaces --event-log and --efivars')
+
 def main(argv: list[str] | None = None)->int:
     args = _parser().parse_args(argv)
+    tr = None
+    with ExitStack() as stack:
+        if getattr(args, 'timings', False) or getattr(args, 'profile_out', None):
+            from .trace import tracing
+            tr = stack.enter_context(tracing())
+        if getattr(args, 'cache_dir', None) and args.cmd != 'cache':
+            from .logcache import use_cache
+            try:
+                stack.enter_context(use_cache(args.cache_dir, args.cache_max_mb << 20))
+            except AttestorError as e:
+                print(f'error: {e}', file=sys.stderr); return 2
+        rc = _run(args)
+    if tr is not None:
+        from .trace import write_trace
+        if args.timings: print(tr.summary(), file=sys.stderr)
+        if args.profile_out: write_trace(tr, args.profile_out)
+    return rc
+
+def _run(args: argparse.Namespace)->int:
+    # subcommands import what they use, so light ones like `version` start fast
     try:
         if args.cmd == 'attest':
-            return run_attest(args.event_log, args.baseline, args.efivars, args.format, args.output, args.fail_on, args.policy)
+            from .attestor import run_attest
+            outs = _outputs(args.format, args.output)
+            _archive_host(args)
+            return run_attest(args.event_log, args.baseline, args.efivars, outs[0][0], outs[0][1], args.fail_on, args.policy, args.checkpoint, args.baseline_store, args.efivars_cache, outs, args.verify_digests, args.archive, args.host)
+        if args.cmd == 'attest-fleet':
+            from .fleet import run_attest_fleet
+            outs = _outputs(args.format, args.output)
+            return run_attest_fleet(args.hosts, args.baseline, outs[0][0], outs[0][1], args.fail_on, args.policy, args.jobs, args.status_output, outs)
+        if args.cmd == 'serve':
+            from .serve import run_serve
+            return run_serve(args.baseline, args.baseline_store, args.policy, args.host, args.port, args.unix_socket, args.jobs, args.max_body)
+        if args.cmd == 'watch':
+            from .watch import run_watch
+            return run_watch(args.event_log, args.baseline, args.efivars, _outputs(args.format, args.output), args.fail_on, args.policy, args.efivars_cache,
+                             args.interval, args.metrics_file, args.metrics_host, args.metrics_port, not args.no_inotify, args.once)
         if args.cmd == 'baseline' and args.bcmd == 'create':
-            bl = create_baseline(args.event_log, args.efivars, None)
+            from .attestor import create_baseline, save_baseline
+            bl = create_baseline(args.event_log, args.efivars, None, args.events, args.var_include, args.var_exclude, args.efivars_cache)
             save_baseline(bl, args.output)
             print(f'Wrote baseline to {args.output}')
             return 0
+        if args.cmd == 'baseline' and args.bcmd == 'add':
+            from .store import add_baseline_file
+            if args.name and len(args.baselines) > 1: raise AttestorError('--name needs a single baseline file')
+            for path in args.baselines:
+                print(f'Added {add_baseline_file(args.store, path, args.name, args.replace)} to {args.store}')
+            return 0
+        if args.cmd == 'baseline' and args.bcmd == 'list':
+            from .store import BaselineStore
+            with BaselineStore(args.store) as st:
+                for name, platform, created_at, banks in st.list(): print(f'{name}\t{platform}\t{created_at}\t{",".join(banks)}')
+            return 0
+        if args.cmd == 'baseline' and args.bcmd == 'remove':
+            from .store import BaselineStore
+            with BaselineStore(args.store) as st:
+                for name in args.names: st.remove(name)
+            return 0
         if args.cmd == 'sbom':
-            export_sbom(args.event_log, args.efivars, args.output)
+            from .attestor import export_sbom
+            _archive_host(args)
+            export_sbom(args.event_log, args.efivars, args.output, args.esp, args.esp_cache, args.archive, args.host)
             print(f'Wrote SBOM to {args.output}')
             return 0
+        if args.cmd == 'archive':
+            from . import archive
+            if args.acmd == 'add':
+                if args.hosts:
+                    names = archive.add_hosts(args.archive, args.hosts, args.replace)
+                else:
+                    if not args.host: raise AttestorError('--event-log needs --host')
+                    with open(args.event_log, 'rb') as f, archive.Archive(args.archive) as a: a.add(args.host, f.read(), archive.read_var_dir(args.efivars), args.replace)
+                    names = [args.host]
+                print(f'Added {len(names)} hosts to {args.archive}'); return 0
+            if args.acmd == 'extract':
+                print(f'Wrote {args.host} to {archive.extract_host(args.archive, args.host, args.output)}'); return 0
+            with archive.Archive(args.archive) as a:
+                if args.acmd == 'list':
+                    for name, log_size, nvars in a.hosts(): print(f'{name}\t{log_size}\t{nvars}')
+                elif args.acmd == 'remove':
+                    for name in args.names: a.remove(name)
+                else:
+                    st = a.stats()
+                    print(f'{args.archive}: {st["hosts"]} hosts, {st["blobs"]} blobs; {st["input_bytes"]} bytes in, {st["stored_bytes"]} stored'
+                          + (f' ({st["input_bytes"]/st["stored_bytes"]:.1f}x)' if st['stored_bytes'] else ''))
+            return 0
+        if args.cmd == 'cache':
+            from .logcache import LogCache
+            if not args.cache_dir: raise AttestorError('pass --cache-dir or set BOOTATTEST_CACHE_DIR')
+            c = LogCache(args.cache_dir)
+            if args.ccmd == 'clear':
+                print(f'Removed {c.clear()} entries from {args.cache_dir}'); return 0
+            st = c.stats()
+            looked = st['hits'] + st['misses']
+            print(f'{st["path"]}: {st["entries"]} entries, {st["bytes"]} bytes; {st["hits"]} hits / {st["misses"]} misses'
+                  + (f' ({100*st["hits"]/looked:.0f}% hit rate)' if looked else '') + f'; parser v{st["parser_version"]}')
+            return 0
         if args.cmd == 'version':
             print(get_version()); return 0
         return 2
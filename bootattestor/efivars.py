@@ -1,29 +1,58 @@
 from __future__ import annotations
-import os, sys, uuid, ctypes
-from typing import Dict, Tuple, Any
+import os, sys, uuid, hashlib
+from typing import Any, Collection, Dict, Iterable, Iterator, Tuple
 from .errors import AttestorError
+from .trace import count
+from .statcache import load_stat_cache, save_stat_cache
 
 EFI_GLOBAL = uuid.UUID('8BE4DF61-93CA-11d2-AA0D-00E098032B8C')
 
-def _linux_read_efivars(root: str = '/sys/firmware/efi/efivars')->Dict[Tuple[str,str], Dict[str,Any]]:
-    out: Dict[Tuple[str,str], Dict[str,Any]] = {}
+LINUX_EFIVARS = '/sys/firmware/efi/efivars'
+
+def _selected(name: str, guid: str, include: Collection[str] | None, exclude: Collection[str] | None)->bool:
+    # filters match a bare name, a bare guid or the full name-guid key
+    keys = (name, guid, f'{name}-{guid}')
+    if include is not None and not any(k in include for k in keys): return False
+    if exclude and any(k in exclude for k in keys): return False
+    return True
+
+def _split_key(key: str)->Tuple[str, str] | None:
+    # efivarfs names are <Name>-<36 char guid>; the name itself may contain dashes
+    if len(key) < 38 or key[-37] != '-': return None
+    try:
+        return key[:-37], str(uuid.UUID(key[-36:]))
+    except ValueError:
+        return None
+
+def _linux_efivar_paths(root: str, include: Collection[str] | None = None, exclude: Collection[str] | None = None)->Iterator[Tuple[str, str, str]]:
     if not os.path.isdir(root):
-        return out
+        return
+    full = [_split_key(k) for k in include] if include is not None else None
+    if full is not None and all(full):
+        # every requested variable is a full key: address the files directly instead of listing the directory
+        for name, g in sorted(set(full)):
+            if _selected(name, g, include, exclude): yield name, g, os.path.join(root, f'{name}-{g}')
+        return
     for fn in os.listdir(root):
-        if '-' not in fn: continue
-        name, guid = fn.rsplit('-', 1)
+        nk = _split_key(fn)
+        if nk is None: continue
+        name, g = nk
+        if _selected(name, g, include, exclude): yield name, g, os.path.join(root, fn)
+
+def _linux_read_efivars(root: str = LINUX_EFIVARS, include: Collection[str] | None = None, exclude: Collection[str] | None = None)->Dict[Tuple[str,str], Dict[str,Any]]:
+    out: Dict[Tuple[str,str], Dict[str,Any]] = {}
+    for name, g, p in _linux_efivar_paths(root, include, exclude):
         try:
-            g = str(uuid.UUID(guid))
-        except Exception:
+            with open(p, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
             continue
-        p = os.path.join(root, fn)
-        with open(p, 'rb') as f:
-            data = f.read()
         attrs = int.from_bytes(data[:4], 'little')
         out[(name, g)] = {'data': data[4:], 'attrs': attrs}
     return out
 
 def _win_read_efivar(name: str, guid: uuid.UUID)->Dict[str,Any] | None:
+    import ctypes
     k32 = ctypes.windll.kernel32
     GetFirmwareEnvironmentVariableExW = k32.GetFirmwareEnvironmentVariableExW
     GetFirmwareEnvironmentVariableExW.argtypes = [ctypes.c_wchar_p, ctypes.c_wchar_p, ctypes.c_void_p, ctypes.c_uint32, ctypes.POINTER(ctypes.c_uint32)]
@@ -38,27 +67,74 @@ def _win_read_efivar(name: str, guid: uuid.UUID)->Dict[str,Any] | None:
         raise AttestorError(f'GetFirmwareEnvironmentVariableExW failed name={name} err={err}')
     return {'data': buf.raw[:r], 'attrs': int(attrs.value)}
 
-def _windows_read_efivars()->Dict[Tuple[str,str], Dict[str,Any]]:
+def _windows_read_efivars(include: Collection[str] | None = None, exclude: Collection[str] | None = None)->Dict[Tuple[str,str], Dict[str,Any]]:
     out: Dict[Tuple[str,str], Dict[str,Any]] = {}
-    names = ['SecureBoot','PK','KEK','db','dbx','BootOrder']
+    g = str(EFI_GLOBAL)
+    names = ['SecureBoot','PK','KEK','db','dbx','BootOrder'] + [f'Boot{num:04X}' for num in range(0, 0x1000)]
     for n in names:
+        if not _selected(n, g, include, exclude): continue
         res = _win_read_efivar(n, EFI_GLOBAL)
-        if res: out[(n, str(EFI_GLOBAL))] = res
-    for num in range(0, 0x1000):
-        n = f'Boot{num:04X}'
-        res = _win_read_efivar(n, EFI_GLOBAL)
-        if res: out[(n, str(EFI_GLOBAL))] = res
+        if res: out[(n, g)] = res
     return out
 
-def load_efivars_meta(override_dir: str | None = None)->Dict[Tuple[str,str], Dict[str,Any]]:
+def load_efivars_meta(override_dir: str | None = None, include: Collection[str] | None = None, exclude: Collection[str] | None = None)->Dict[Tuple[str,str], Dict[str,Any]]:
     if override_dir:
-        return _linux_read_efivars(override_dir)
+        return _linux_read_efivars(override_dir, include, exclude)
     if sys.platform.startswith('linux'):
-        return _linux_read_efivars()
+        return _linux_read_efivars(LINUX_EFIVARS, include, exclude)
     if sys.platform == 'win32':
-        return _windows_read_efivars()
+        return _windows_read_efivars(include, exclude)
     return {}
 
-def load_efivars(override_dir: str | None = None)->Dict[Tuple[str,str], bytes]:
-    meta = load_efivars_meta(override_dir)
+def load_efivars(override_dir: str | None = None, include: Collection[str] | None = None, exclude: Collection[str] | None = None)->Dict[Tuple[str,str], bytes]:
+    meta = load_efivars_meta(override_dir, include, exclude)
     return {k: v['data'] for k,v in meta.items()}
+
+def hash_efivar_blobs(items: Iterable[Tuple[str, bytes]], include: Collection[str] | None = None, exclude: Collection[str] | None = None)->Dict[str,str]:
+    # same digests as hash_efivars for (efivarfs file name, raw file content) pairs held in memory
+    out: Dict[str,str] = {}
+    for fn, raw in items:
+        nk = _split_key(fn)
+        if nk is None or not _selected(nk[0], nk[1], include, exclude): continue
+        out[f'{nk[0]}-{nk[1]}'] = hashlib.sha256(memoryview(raw)[4:]).hexdigest()
+    return out
+
+def efivar_meta_from_blobs(items: Iterable[Tuple[str, bytes]], include: Collection[str] | None = None, exclude: Collection[str] | None = None)->Dict[Tuple[str,str], Dict[str,Any]]:
+    # load_efivars_meta for (efivarfs file name, raw file content) pairs held in memory
+    out: Dict[Tuple[str,str], Dict[str,Any]] = {}
+    for fn, raw in items:
+        nk = _split_key(fn)
+        if nk is None or not _selected(nk[0], nk[1], include, exclude): continue
+        out[nk] = {'data': raw[4:], 'attrs': int.from_bytes(raw[:4], 'little')}
+    return out
+
+def hash_efivars(override_dir: str | None = None, include: Collection[str] | None = None, exclude: Collection[str] | None = None, cache_path: str | None = None)->Dict[str,str]:
+    # sha256 of each variable's data keyed name-guid; with cache_path, files whose
+    # (inode, size, mtime) are unchanged since the last run are not re-read
+    root = override_dir or (LINUX_EFIVARS if sys.platform.startswith('linux') else None)
+    if root is None:
+        return {f'{n}-{g}': hashlib.sha256(d).hexdigest() for (n,g), d in load_efivars(None, include, exclude).items()}
+    cache = load_stat_cache(cache_path)
+    fresh: Dict[str, list] = {}
+    out: Dict[str,str] = {}
+    for name, g, p in _linux_efivar_paths(root, include, exclude):
+        try:
+            st = os.stat(p)
+            key = f'{name}-{g}'
+            sig = [st.st_ino, st.st_size, st.st_mtime_ns]
+            hit = cache.get(key)
+            if hit and hit[:3] == sig:
+                digest = hit[3]
+                count('cache_hits')
+            else:
+                with open(p, 'rb') as f: data = f.read()
+                digest = hashlib.sha256(memoryview(data)[4:]).hexdigest()
+                count('bytes_read', len(data)); count('hashes')
+        except FileNotFoundError:
+            continue
+        out[key] = digest
+        fresh[key] = sig + [digest]
+    if cache_path and fresh != {k: cache.get(k) for k in fresh}:
+        cache.update(fresh)
+        save_stat_cache(cache_path, cache)
+    return out
@@ -0,0 +1,76 @@
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from .tcg import describe_event
+
+# (index in log, event type, digest hex, description)
+EventRef = Tuple[int, int, str, str]
+# (op, index into expected, index into actual); op is equal/changed/removed/inserted
+AlignOp = Tuple[str, int | None, int | None]
+
+def tee_event_refs(events: Iterable, alg: int, sink: Dict[int, List[EventRef]], pcrs: Set[int] | None = None)->Iterator:
+    # passes events through unchanged while recording per-PCR refs for one bank
+    for i, ev in enumerate(events):
+        if pcrs is None or ev.pcr_index in pcrs:
+            d = ev.digests.get(alg)
+            if d is not None:
+                sink.setdefault(ev.pcr_index, []).append((i, ev.event_type, d.hex(), describe_event(ev.data, ev.event_type)))
+        yield ev
+
+def _unique_anchors(a: Sequence[str], b: Sequence[str], alo: int, ahi: int, blo: int, bhi: int)->List[Tuple[int,int]]:
+    # patience anchors: digests that occur exactly once on both sides, longest run in common order
+    seen_a: Dict[str, int] = {}
+    for i in range(alo, ahi):
+        seen_a[a[i]] = -1 if a[i] in seen_a else i
+    seen_b: Dict[str, int] = {}
+    for j in range(blo, bhi):
+        k = b[j]
+        if seen_a.get(k, -1) >= 0: seen_b[k] = -1 if k in seen_b else j
+    pairs = sorted((seen_a[k], j) for k, j in seen_b.items() if j >= 0)
+    if not pairs: return []
+    tails: List[int] = []
+    tail_idx: List[int] = []
+    prev = [-1]*len(pairs)
+    for n, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails): tails.append(j); tail_idx.append(n)
+        else: tails[pos] = j; tail_idx[pos] = n
+        prev[n] = tail_idx[pos-1] if pos else -1
+    out: List[Tuple[int,int]] = []
+    n = tail_idx[-1]
+    while n >= 0:
+        out.append(pairs[n]); n = prev[n]
+    out.reverse()
+    return out
+
+def align_digests(a: Sequence[str], b: Sequence[str])->List[AlignOp]:
+    ops: List[AlignOp] = []
+    stack: List[Tuple] = [('range', 0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if item[0] != 'range':
+            ops.append(item); continue
+        _, alo, ahi, blo, bhi = item
+        head: List[Tuple] = []
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            head.append(('equal', alo, blo)); alo += 1; blo += 1
+        tail: List[Tuple] = []
+        while alo < ahi and blo < bhi and a[ahi-1] == b[bhi-1]:
+            ahi -= 1; bhi -= 1; tail.append(('equal', ahi, bhi))
+        tail.reverse()
+        mid: List[Tuple] = []
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi) if alo < ahi and blo < bhi else []
+        if anchors:
+            i0, j0 = alo, blo
+            for i, j in anchors:
+                mid.append(('range', i0, i, j0, j)); mid.append(('equal', i, j))
+                i0, j0 = i+1, j+1
+            mid.append(('range', i0, ahi, j0, bhi))
+        else:
+            common = min(ahi-alo, bhi-blo)
+            mid.extend(('changed', alo+k, blo+k) for k in range(common))
+            mid.extend(('removed', i, None) for i in range(alo+common, ahi))
+            mid.extend(('inserted', None, j) for j in range(blo+common, bhi))
+        stack.extend(reversed(head + mid + tail))
+    return ops
@@ -0,0 +1,93 @@
+from __future__ import annotations
+import os, json
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .attestor import Baseline, Finding, diff_attestation, load_baseline, load_policy, map_event_log, write_reports, exit_status
+from .errors import AttestorError
+from .policy import CompiledPolicy
+
+EVENT_LOG_NAMES = ('binary_bios_measurements', 'eventlog.bin')
+
+HostJob = Tuple[str, str, str]
+
+def _host_from_dir(root: str, host: str)->HostJob | None:
+    d = os.path.join(root, host)
+    if not os.path.isdir(d): return None
+    for n in EVENT_LOG_NAMES:
+        p = os.path.join(d, n)
+        if os.path.isfile(p): return (host, p, os.path.join(d, 'efivars'))
+    return None
+
+def discover_hosts(source: str)->List[HostJob]:
+    # directory of <host>/{binary_bios_measurements|eventlog.bin, efivars/} bundles, or a JSON manifest
+    # of {host, event_log, efivars} entries with paths relative to the manifest
+    if os.path.isdir(source):
+        jobs = [_host_from_dir(source, h) for h in sorted(os.listdir(source))]
+        return [j for j in jobs if j is not None]
+    if not os.path.isfile(source): raise AttestorError(f'fleet source not found: {source}')
+    try:
+        with open(source, 'rb') as f: data = json.loads(f.read())
+    except OSError as e:
+        raise AttestorError(f'cannot read fleet manifest {source}: {e.strerror or e}')
+    except ValueError as e:
+        raise AttestorError(f'fleet manifest {source} is not valid JSON: {e}')
+    if not isinstance(data, list): raise AttestorError(f'fleet manifest {source} must be a JSON array of hosts')
+    base = os.path.dirname(os.path.abspath(source))
+    out: List[HostJob] = []
+    for i, ent in enumerate(data):
+        if not isinstance(ent, dict) or 'host' not in ent or not isinstance(ent.get('event_log'), str):
+            raise AttestorError(f'fleet manifest {source} entry {i}: need "host" and an "event_log" path')
+        if not isinstance(ent.get('efivars') or '', str):
+            raise AttestorError(f'fleet manifest {source} entry {i}: "efivars" must be a path')
+        efi = ent.get('efivars') or os.path.join(os.path.dirname(ent['event_log']), 'efivars')
+        out.append((str(ent['host']), os.path.join(base, ent['event_log']), os.path.join(base, efi)))
+    return out
+
+_W: Dict[str, Any] = {}
+
+def _init_worker(bl: Baseline, policy: CompiledPolicy)->None:
+    _W['baseline'] = bl; _W['policy'] = policy
+
+def _attest_host(job: HostJob)->Tuple[str, List[Finding], str | None]:
+    host, log, efi = job
+    try:
+        if not os.path.isfile(log): raise AttestorError(f'event log not found: {log}')
+        return host, diff_attestation(_W['baseline'], map_event_log(log), efi, _W['policy']), None
+    except AttestorError as e:
+        return host, [], str(e)
+    except Exception as e:
+        # anything else is still one bad bundle; it must not take the rest of the fleet down
+        return host, [], f'{type(e).__name__}: {e}'
+
+def attest_fleet(jobs: List[HostJob], bl: Baseline, policy: CompiledPolicy, workers: int | None = None)->Iterator[Tuple[str, List[Finding], str | None]]:
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        _init_worker(bl, policy)
+        yield from (_attest_host(j) for j in jobs)
+        return
+    chunk = max(1, len(jobs) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(bl, policy)) as ex:
+        yield from ex.map(_attest_host, jobs, chunksize=chunk)
+
+def run_attest_fleet(source: str, baseline_path: str, fmt: str, out_file: str | None, fail_on: str, policy_path: str | None = None, workers: int | None = None, status_file: str | None = None, outputs: List[Tuple[str, str | None]] | None = None)->int:
+    bl = load_baseline(baseline_path)
+    policy = load_policy(policy_path)
+    jobs = discover_hosts(source)
+    if not jobs: raise AttestorError(f'no host bundles found in {source}')
+    status: Dict[str, int] = {}
+    def findings()->Iterator[Finding]:
+        # hosts are rendered as their results arrive, so memory stays flat with fleet size
+        for host, hfinds, err in attest_fleet(jobs, bl, policy, workers):
+            if err is not None:
+                status[host] = 2
+                yield Finding('host-error', host, 'high', err)
+                continue
+            status[host] = exit_status(hfinds, fail_on)
+            for f in hfinds: yield replace(f, id=f'{host}:{f.id}')
+    write_reports(findings(), outputs or [(fmt, out_file)], fail_on)
+    if status_file:
+        os.makedirs(os.path.dirname(status_file) or '.', exist_ok=True)
+        with open(status_file,'w',encoding='utf-8') as f: json.dump(status, f, indent=2)
+    return max(status.values())
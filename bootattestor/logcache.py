@@ -0,0 +1,182 @@
+from __future__ import annotations
+import os, json, struct, hashlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .tcg import PARSER_VERSION, TcgEvent2, parse_tpm2_header, iter_tpm2_events
+from .pcr import compute_pcrs
+from .trace import stage, count
+from .errors import AttestorError
+
+# on-disk cache of parse + replay results keyed by sha256(log) and PARSER_VERSION.
+# An entry is MAGIC, a u32-prefixed JSON header (algs, PCR banks, event count), one _REC per
+# event and then one block of digests per bank, so events are rebuilt as views of the log
+# without walking its variable-length records. Entries are evicted least recently used first.
+# A hit replaces parsing and replay outright, so the directory is trusted like the code itself:
+# it must belong to the effective user and be writable by nobody else.
+
+MAGIC = b'BAIX'
+SUFFIX = '.idx'
+DEFAULT_MAX_BYTES = 256 << 20
+_REC = struct.Struct('<IIIII')  # pcr, event type, data offset, data length, bank presence mask
+
+class ParsedLog:
+    def __init__(self, buf, algs: Dict[int, int], pcrs: Dict[str, Dict[int, str]], n: int, index: memoryview | None = None, events: List[TcgEvent2] | None = None):
+        self.buf, self.algs, self.pcrs, self.n, self._index, self._events = buf, algs, pcrs, n, index, events
+
+    def events(self)->Iterator[TcgEvent2]:
+        if self._events is not None:
+            yield from self._events; return
+        mv, idx = memoryview(self.buf), self._index
+        base = self.n * _REC.size
+        banks = []
+        for alg, sz in self.algs.items():
+            banks.append((alg, sz, idx[base:base + self.n*sz])); base += self.n*sz
+        for i, (pcr, ev_type, doff, dlen, mask) in enumerate(_REC.iter_unpack(idx[:self.n * _REC.size])):
+            digests = {alg: blk[i*sz:(i+1)*sz] for k, (alg, sz, blk) in enumerate(banks) if mask >> k & 1}
+            yield TcgEvent2(pcr, ev_type, digests, mv[doff:doff+dlen], doff + dlen)
+
+def _encode(algs: Dict[int, int], pcrs: Dict[str, Dict[int, str]], events: List[TcgEvent2], buf_len: int)->bytes | None:
+    order = list(algs)
+    recs = bytearray(len(events) * _REC.size)
+    blocks = [bytearray(len(events) * algs[a]) for a in order]
+    for i, ev in enumerate(events):
+        mask = 0
+        for k, a in enumerate(order):
+            d = ev.digests.get(a)
+            if d is None: continue
+            mask |= 1 << k; blocks[k][i*algs[a]:(i+1)*algs[a]] = d
+        # digests of banks outside the SpecID table cannot be placed in a block
+        if len(ev.digests) != bin(mask).count('1'): return None
+        doff = ev.end - len(ev.data)
+        _REC.pack_into(recs, i * _REC.size, ev.pcr_index, ev.event_type, doff, len(ev.data), mask)
+    hdr = json.dumps({'parser': PARSER_VERSION, 'log_size': buf_len, 'events': len(events), 'algs': [[a, algs[a]] for a in order],
+                      'pcrs': {b: {str(i): v for i, v in m.items()} for b, m in pcrs.items()}}).encode('utf-8')
+    return MAGIC + struct.pack('<I', len(hdr)) + hdr + bytes(recs) + b''.join(blocks)
+
+def _decode(buf, data: bytes)->ParsedLog:
+    if data[:4] != MAGIC: raise ValueError('bad magic')
+    (hlen,) = struct.unpack_from('<I', data, 4)
+    hdr = json.loads(data[8:8+hlen])
+    if hdr['parser'] != PARSER_VERSION or hdr['log_size'] != len(buf): raise ValueError('stale entry')
+    algs = {int(a): int(s) for a, s in hdr['algs']}
+    n = int(hdr['events'])
+    index = memoryview(data)[8+hlen:]
+    if len(index) != n * (_REC.size + sum(algs.values())): raise ValueError('truncated entry')
+    pcrs = {b: {int(i): v for i, v in m.items()} for b, m in hdr['pcrs'].items()}
+    return ParsedLog(buf, algs, pcrs, n, index)
+
+def _check_private(root: str)->None:
+    if not hasattr(os, 'geteuid'): return
+    st = os.stat(root)
+    if st.st_uid != os.geteuid(): raise AttestorError(f'refusing cache dir {root}: owned by uid {st.st_uid}, not {os.geteuid()}')
+    if st.st_mode & 0o022: raise AttestorError(f'refusing cache dir {root}: group or world writable (mode {st.st_mode & 0o777:o})')
+
+class LogCache:
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root, self.max_bytes = root, max_bytes
+        self._last: Tuple[Any, ParsedLog] | None = None  # one command looks at the same log several times
+        os.makedirs(root, mode=0o700, exist_ok=True)
+        _check_private(root)
+
+    @staticmethod
+    def key(buf)->str:
+        return f'{hashlib.sha256(buf).hexdigest()}-p{PARSER_VERSION}'
+
+    def _entries(self)->List[os.DirEntry]:
+        return [e for e in os.scandir(self.root) if e.name.endswith(SUFFIX) and e.is_file()]
+
+    def _bump(self, field: str)->None:
+        p = os.path.join(self.root, 'stats.json')
+        try:
+            st = json.load(open(p, 'r', encoding='utf-8'))
+        except (OSError, ValueError):
+            st = {}
+        st[field] = st.get(field, 0) + 1
+        tmp = p + f'.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(st, f)
+        os.replace(tmp, p)
+
+    def get(self, buf, key: str | None = None)->ParsedLog | None:
+        p = os.path.join(self.root, (key or self.key(buf)) + SUFFIX)
+        try:
+            with open(p, 'rb') as f: parsed = _decode(buf, f.read())
+        except FileNotFoundError:
+            self._bump('misses'); return None
+        except (ValueError, KeyError, TypeError, struct.error):
+            os.unlink(p); self._bump('misses'); return None
+        os.utime(p)  # mtime is the LRU clock; atime is often disabled
+        self._bump('hits')
+        return parsed
+
+    def put(self, buf, algs: Dict[int, int], pcrs: Dict[str, Dict[int, str]], events: List[TcgEvent2], key: str | None = None)->None:
+        data = _encode(algs, pcrs, events, len(buf))
+        if data is None or len(data) > self.max_bytes: return
+        p = os.path.join(self.root, (key or self.key(buf)) + SUFFIX)
+        tmp = p + f'.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f: f.write(data)
+        os.replace(tmp, p)
+        self.evict()
+
+    def evict(self)->int:
+        ents = sorted(self._entries(), key=lambda e: e.stat().st_mtime_ns)
+        total, gone = sum(e.stat().st_size for e in ents), 0
+        for e in ents:
+            if total <= self.max_bytes: break
+            total -= e.stat().st_size
+            os.unlink(e.path); gone += 1
+        return gone
+
+    def stats(self)->Dict[str, Any]:
+        ents = self._entries()
+        try:
+            st = json.load(open(os.path.join(self.root, 'stats.json'), 'r', encoding='utf-8'))
+        except (OSError, ValueError):
+            st = {}
+        return {'path': self.root, 'entries': len(ents), 'bytes': sum(e.stat().st_size for e in ents), 'max_bytes': self.max_bytes,
+                'hits': st.get('hits', 0), 'misses': st.get('misses', 0), 'parser_version': PARSER_VERSION}
+
+    def clear(self)->int:
+        ents = self._entries()
+        for e in ents: os.unlink(e.path)
+        try:
+            os.unlink(os.path.join(self.root, 'stats.json'))
+        except FileNotFoundError:
+            pass
+        return len(ents)
+
+_current: LogCache | None = None
+
+@contextmanager
+def use_cache(root: str, max_bytes: int = DEFAULT_MAX_BYTES)->Iterator[LogCache]:
+    global _current
+    prev, _current = _current, LogCache(root, max_bytes)
+    try:
+        yield _current
+    finally:
+        _current = prev
+
+def active()->LogCache | None:
+    return _current
+
+def parsed(buf)->ParsedLog | None:
+    # None when no cache is in use; otherwise the cached entry, parsing, replaying and storing it on a miss
+    c = _current
+    if c is None: return None
+    if c._last is not None and c._last[0] is buf: return c._last[1]
+    with stage('log_cache'):
+        key = c.key(buf)
+        hit = c.get(buf, key)
+        count('hits' if hit else 'misses')
+    if hit:
+        c._last = (buf, hit)
+        return hit
+    with stage('parse_tpm2_eventlog'):
+        algs, off = parse_tpm2_header(buf)
+        events = list(iter_tpm2_events(buf, algs, off))
+        count('events', len(events)); count('bytes_parsed', len(buf) - off)
+    with stage('compute_pcrs'):
+        pcrs = compute_pcrs(algs, events)
+    c.put(buf, algs, pcrs, events, key)
+    c._last = (buf, ParsedLog(buf, algs, pcrs, len(events), events=events))
+    return c._last[1]
@@ -1,6 +1,10 @@
 from __future__ import annotations
-import hashlib
-from typing import Dict, Iterable
+import hashlib, json, os
+from dataclasses import dataclass
+from typing import Dict, Iterable, Tuple
+from .errors import AttestorError
+from .trace import count
+from .tcg import NUM_PCRS
 
 ALG_ID_TO_NAME = {0x0004:'sha1',0x000B:'sha256',0x000C:'sha384',0x000D:'sha512',0x0012:'sm3_256'}
 
@@ -12,12 +16,17 @@ def _h(alg:int):
     if name == 'sha512': return hashlib.sha512
     return None
 
-def compute_pcrs(algs: Dict[int,int], events: Iterable)->Dict[str, Dict[int,str]]:
+def _zero_state(algs: Dict[int,int])->Dict[int, Dict[int, bytes]]:
     state: Dict[int, Dict[int, bytes]] = {}
     for alg in algs:
         hf = _h(alg)
         if hf is None: continue
-        state[alg] = {i: b'\x00'*hf().digest_size for i in range(24)}
+        state[alg] = {i: b'\x00'*hf().digest_size for i in range(NUM_PCRS)}
+    return state
+
+def extend_pcrs(state: Dict[int, Dict[int, bytes]], events: Iterable)->Tuple[int, int]:
+    # extends state in place; returns (events consumed, end offset of the last one)
+    n, end, hashes = 0, 0, 0
     for ev in events:
         for alg, dig in ev.digests.items():
             hf = _h(alg)
@@ -25,8 +34,64 @@ def compute_pcrs(algs: Dict[int,int], events: Iterable)->Dict[str, Dict[int,str]
             p = state[alg][ev.pcr_index]
             x = hf(); x.update(p); x.update(dig)
             state[alg][ev.pcr_index] = x.digest()
+            hashes += 1
+        n += 1; end = ev.end
+    count('hashes', hashes)
+    return n, end
+
+def _render(state: Dict[int, Dict[int, bytes]])->Dict[str, Dict[int,str]]:
     out: Dict[str, Dict[int,str]] = {}
     for alg, bank in state.items():
         name = ALG_ID_TO_NAME.get(alg, f'alg{alg}')
         out[name] = {i: bank[i].hex() for i in sorted(bank)}
     return out
+
+def compute_pcrs(algs: Dict[int,int], events: Iterable)->Dict[str, Dict[int,str]]:
+    state = _zero_state(algs)
+    extend_pcrs(state, events)
+    return _render(state)
+
+@dataclass
+class ReplayCheckpoint:
+    offset: int
+    events: int
+    algs: Dict[int, int]
+    banks: Dict[int, Dict[int, str]]
+    prefix_sha256: str
+
+def load_checkpoint(path: str)->ReplayCheckpoint | None:
+    if not os.path.exists(path): return None
+    try:
+        o = json.load(open(path,'r',encoding='utf-8'))
+        return ReplayCheckpoint(offset=int(o['offset']), events=int(o['events']), algs={int(a):int(s) for a,s in o['algs'].items()}, banks={int(a):{int(i):v for i,v in b.items()} for a,b in o['banks'].items()}, prefix_sha256=o['prefix_sha256'])
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise AttestorError(f'bad replay checkpoint {path}: {e}')
+
+def save_checkpoint(cp: ReplayCheckpoint, path: str)->None:
+    obj = {'version':1,'offset':cp.offset,'events':cp.events,'algs':{str(a):s for a,s in cp.algs.items()},'banks':{str(a):{str(i):v for i,v in b.items()} for a,b in cp.banks.items()},'prefix_sha256':cp.prefix_sha256}
+    tmp = path + f'.{os.getpid()}.tmp'
+    with open(tmp,'w',encoding='utf-8') as f: json.dump(obj, f)
+    os.replace(tmp, path)
+
+def replay_incremental(buf, cp: ReplayCheckpoint | None = None)->Tuple[Dict[str, Dict[int,str]], ReplayCheckpoint]:
+    # resumes from cp when buf still starts with the exact bytes cp consumed, else replays from scratch
+    from .tcg import parse_tpm2_header, iter_tpm2_events
+    mv = memoryview(buf)
+    prefix = hashlib.sha256()
+    if cp is not None and cp.offset <= len(mv):
+        prefix.update(mv[:cp.offset])
+        if prefix.hexdigest() != cp.prefix_sha256: cp = None
+    else:
+        cp = None
+    if cp is None:
+        algs, off = parse_tpm2_header(mv)
+        state, done = _zero_state(algs), 0
+        prefix = hashlib.sha256(); prefix.update(mv[:off])
+    else:
+        algs, off, done = cp.algs, cp.offset, cp.events
+        state = {alg: {i: bytes.fromhex(h) for i,h in bank.items()} for alg,bank in cp.banks.items()}
+    n, end = extend_pcrs(state, iter_tpm2_events(mv, algs, off))
+    if n:
+        prefix.update(mv[off:end]); off = end
+    new_cp = ReplayCheckpoint(offset=off, events=done+n, algs=dict(algs), banks={alg:{i:d.hex() for i,d in bank.items()} for alg,bank in state.items()}, prefix_sha256=prefix.hexdigest())
+    return _render(state), new_cp
@@ -0,0 +1,165 @@
+from __future__ import annotations
+import os, json, hashlib
+from typing import Any, Dict, FrozenSet, Tuple
+
+from .tcg import EVENT_TYPE_NAMES
+from .report import RANK
+from .errors import AttestorError
+
+# policies are compiled once into dict/set lookups, so evaluating a finding costs a handful of
+# hash probes however many rules there are. Format (every key optional):
+#
+#   {"version": 2,
+#    "pcrs": {"critical": [7], "high": [0, 2, 4, 5], "medium": [], "low": []},
+#    "default": "low",
+#    "event_types": {"EV_EFI_BOOT_SERVICES_DRIVER": "high"},
+#    "variables": [{"name": "dbx", "pcr": 7, "severity": "critical"}],
+#    "allowed_pcr_values": {"0": ["<hex>", ...]},
+#    "allowed_event_digests": {"4": ["<hex>", ...]},
+#    "suppress": [{"kind": "var-mismatch", "id": "Vendor-<guid>"}, {"kind": "event-inserted", "pcr": 14}]}
+#
+# A bare {"critical": [...], "high": [...]} object is the version 1 format and still accepted.
+
+POLICY_VERSION = 2
+DEFAULT_PCRS = {'critical': [7], 'high': [0, 2, 4, 5], 'medium': [], 'low': []}
+_TYPE_IDS = {v: k for k, v in EVENT_TYPE_NAMES.items()}
+_SUPPRESS_FIELDS = ('kind', 'id', 'pcr')
+# where firmware measures the variables a baseline records: the Secure Boot configuration into
+# PCR7 (EV_EFI_VARIABLE_DRIVER_CONFIG), boot options into PCR1 (EV_EFI_VARIABLE_BOOT)
+_VARIABLE_PCRS = {'SecureBoot': 7, 'PK': 7, 'KEK': 7, 'db': 7, 'dbx': 7, 'dbt': 7, 'dbr': 7, 'BootOrder': 1}
+
+def variable_pcr(name: str)->int | None:
+    if len(name) == 8 and name.startswith('Boot') and all(c in '0123456789ABCDEF' for c in name[4:]): return 1
+    return _VARIABLE_PCRS.get(name)
+
+def _sev(v: Any, where: str)->str:
+    if not isinstance(v, str) or v not in RANK: raise AttestorError(f'policy {where}: severity must be one of {", ".join(RANK)}')
+    return v
+
+def _pcr(v: Any, where: str)->int:
+    try:
+        i = int(v)
+    except (TypeError, ValueError):
+        raise AttestorError(f'policy {where}: bad PCR index {v!r}')
+    if not 0 <= i < 32: raise AttestorError(f'policy {where}: bad PCR index {v!r}')
+    return i
+
+def _obj(v: Any, where: str)->Dict[str, Any]:
+    if not isinstance(v, dict): raise AttestorError(f'policy {where}: expected an object')
+    return v
+
+def _arr(v: Any, where: str)->list:
+    if not isinstance(v, list): raise AttestorError(f'policy {where}: expected an array')
+    return v
+
+def _ev_type(v: Any)->int:
+    if isinstance(v, int): return v
+    if isinstance(v, str) and v in _TYPE_IDS: return _TYPE_IDS[v]
+    try:
+        return int(v, 0)
+    except (TypeError, ValueError):
+        raise AttestorError(f'policy event_types: unknown event type {v!r}')
+
+class CompiledPolicy:
+    def __init__(self, pcr_sev: Dict[int, str], default: str, type_sev: Dict[int, str], var_sev: Dict[Tuple[int | None, str], str],
+                 allowed_pcr: Dict[int, FrozenSet[str]], allowed_ev: Dict[int, FrozenSet[str]], suppress: Dict[Tuple[str, ...], FrozenSet[Tuple[Any, ...]]]):
+        self.pcr_sev, self.default, self.type_sev, self.var_sev = pcr_sev, default, type_sev, var_sev
+        self.allowed_pcr, self.allowed_ev, self.suppress = allowed_pcr, allowed_ev, suppress
+
+    def sev_for_pcr(self, pcr: int)->str:
+        return self.pcr_sev.get(pcr, self.default)
+
+    def sev_for_event(self, pcr: int, ev_type: int, var: str | None = None)->str:
+        if var is not None:
+            s = self.var_sev.get((pcr, var)) or self.var_sev.get((None, var))
+            if s: return s
+        return self.type_sev.get(ev_type) or self.pcr_sev.get(pcr, self.default)
+
+    def sev_for_variable(self, name: str, default: str)->str:
+        # a rule scoped to the PCR the variable is measured into applies to its var-mismatch too
+        pcr = variable_pcr(name)
+        return (pcr is not None and self.var_sev.get((pcr, name))) or self.var_sev.get((None, name), default)
+
+    def pcr_allowed(self, pcr: int, value: str | None)->bool:
+        s = self.allowed_pcr.get(pcr)
+        return bool(s) and value is not None and value.lower() in s
+
+    def event_allowed(self, pcr: int, digest: str)->bool:
+        s = self.allowed_ev.get(pcr)
+        return bool(s) and digest.lower() in s
+
+    def suppressed(self, kind: str, id: str, pcr: int | None = None)->bool:
+        vals = {'kind': kind, 'id': id, 'pcr': pcr}
+        return any(tuple(vals[f] for f in fields) in keys for fields, keys in self.suppress.items())
+
+    def to_dict(self)->Dict[str, Any]:
+        return {'version': POLICY_VERSION, 'compiled': True,
+                'pcr_sev': {str(k): v for k, v in self.pcr_sev.items()}, 'default': self.default,
+                'type_sev': {str(k): v for k, v in self.type_sev.items()},
+                'var_sev': [[p, n, s] for (p, n), s in self.var_sev.items()],
+                'allowed_pcr': {str(k): sorted(v) for k, v in self.allowed_pcr.items()},
+                'allowed_ev': {str(k): sorted(v) for k, v in self.allowed_ev.items()},
+                'suppress': [[list(f), [list(t) for t in keys]] for f, keys in self.suppress.items()]}
+
+    @classmethod
+    def from_dict(cls, o: Dict[str, Any])->CompiledPolicy:
+        return cls({int(k): v for k, v in o['pcr_sev'].items()}, o['default'], {int(k): v for k, v in o['type_sev'].items()},
+                   {(p, n): s for p, n, s in o['var_sev']}, {int(k): frozenset(v) for k, v in o['allowed_pcr'].items()},
+                   {int(k): frozenset(v) for k, v in o['allowed_ev'].items()}, {tuple(f): frozenset(tuple(t) for t in keys) for f, keys in o['suppress']})
+
+def compile_policy(data: Dict[str, Any])->CompiledPolicy:
+    if not isinstance(data, dict): raise AttestorError('policy must be a JSON object')
+    if 'pcrs' in data:
+        pcrs, fallback = data['pcrs'], {}
+    else:
+        # version 1: a severity left out keeps its default PCRs
+        pcrs, fallback = {k: v for k, v in data.items() if k in RANK}, DEFAULT_PCRS
+    _obj(pcrs, 'pcrs')
+    pcr_sev: Dict[int, str] = {}
+    # the highest severity listing a PCR wins
+    for sev in sorted(RANK, key=RANK.get):
+        for p in _arr(pcrs.get(sev, fallback.get(sev, [])), f'pcrs {sev}'): pcr_sev[_pcr(p, 'pcrs')] = sev
+    default = _sev(data.get('default', 'low'), 'default')
+    type_sev = {_ev_type(t): _sev(s, 'event_types') for t, s in _obj(data.get('event_types', {}), 'event_types').items()}
+    var_sev: Dict[Tuple[int | None, str], str] = {}
+    for r in _arr(data.get('variables', []), 'variables'):
+        if not isinstance(r, dict) or 'name' not in r: raise AttestorError('policy variables: each rule needs "name" and "severity"')
+        var_sev[(_pcr(r['pcr'], 'variables') if r.get('pcr') is not None else None, str(r['name']))] = _sev(r.get('severity'), 'variables')
+    allowed_pcr = {_pcr(p, 'allowed_pcr_values'): frozenset(str(h).lower() for h in _arr(hs, 'allowed_pcr_values'))
+                   for p, hs in _obj(data.get('allowed_pcr_values', {}), 'allowed_pcr_values').items()}
+    allowed_ev = {_pcr(p, 'allowed_event_digests'): frozenset(str(h).lower() for h in _arr(hs, 'allowed_event_digests'))
+                  for p, hs in _obj(data.get('allowed_event_digests', {}), 'allowed_event_digests').items()}
+    groups: Dict[Tuple[str, ...], set] = {}
+    for r in _arr(data.get('suppress', []), 'suppress'):
+        fields = tuple(f for f in _SUPPRESS_FIELDS if isinstance(r, dict) and r.get(f) is not None)
+        if not fields: raise AttestorError('policy suppress: each rule needs at least one of kind, id, pcr')
+        groups.setdefault(fields, set()).add(tuple(_pcr(r[f], 'suppress') if f == 'pcr' else str(r[f]) for f in fields))
+    return CompiledPolicy(pcr_sev, default, type_sev, var_sev, allowed_pcr, allowed_ev, {f: frozenset(k) for f, k in groups.items()})
+
+def as_policy(policy: CompiledPolicy | Dict[str, Any] | None)->CompiledPolicy:
+    if isinstance(policy, CompiledPolicy): return policy
+    return compile_policy(policy or {})
+
+def load_policy(path: str | None, cache_dir: str | None = None)->CompiledPolicy:
+    if not path: return compile_policy({})
+    try:
+        with open(path, 'rb') as f: raw = f.read()
+    except OSError as e:
+        raise AttestorError(f'cannot read policy {path}: {e.strerror or e}')
+    cached = os.path.join(cache_dir, f'policy-{hashlib.sha256(raw).hexdigest()}-v{POLICY_VERSION}.json') if cache_dir else None
+    if cached and os.path.exists(cached):
+        try:
+            return CompiledPolicy.from_dict(json.load(open(cached, 'r', encoding='utf-8')))
+        except (ValueError, KeyError, TypeError):
+            pass
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        raise AttestorError(f'bad policy {path}: {e}')
+    pol = compile_policy(data)
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = cached + f'.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(pol.to_dict(), f)
+        os.replace(tmp, cached)
+    return pol
@@ -1,38 +1,110 @@
 from __future__ import annotations
-import json, xml.etree.ElementTree as ET
-from typing import List
-from .attestor import Finding
+import io, json, shutil, tempfile
+from typing import IO, Iterable, List, TYPE_CHECKING
+from .errors import AttestorError
+if TYPE_CHECKING:
+    from .attestor import Finding
+
+# incremental writers: add() one finding at a time, close() writes the trailer;
+# nothing but per-kind SARIF rules is kept in memory
+
+RANK = {'info':1,'low':2,'medium':3,'high':4,'critical':5}
+
+class TextWriter:
+    def __init__(self, fh: IO[str]):
+        self.fh, self.total = fh, 0
+
+    def add(self, f: Finding)->None:
+        self.fh.write(f'{f.severity.upper()} {f.kind} {f.id} - {f.message}\n'); self.total += 1
+
+    def close(self)->None:
+        self.fh.write(f'Total: {self.total}\n' if self.total else 'OK: no mismatches\n')
+
+class JsonWriter:
+    def __init__(self, fh: IO[str]):
+        self.fh, self.total = fh, 0
+        fh.write('{\n  "version": 1,\n  "$schema": "schema://bootattestor/findings.json",\n  "findings": [')
+
+    def add(self, f: Finding)->None:
+        self.fh.write(('\n    ' if not self.total else ',\n    ') + json.dumps({k:v for k,v in f.__dict__.items() if v is not None}))
+        self.total += 1
+
+    def close(self)->None:
+        self.fh.write(('\n  ' if self.total else '') + f'],\n  "summary": {{\n    "total": {self.total}\n  }}\n}}\n')
+
+class SarifWriter:
+    def __init__(self, fh: IO[str]):
+        self.fh, self.total, self.rules = fh, 0, {}
+        # results go out first; the driver's rule table is only complete at the end, and JSON key order is free
+        fh.write('{\n  "version": "2.1.0",\n  "$schema": "https://json.schemastore.org/sarif-2.1.0.json",\n  "runs": [\n    {\n      "results": [')
+
+    @staticmethod
+    def _level(s: str)->str:
+        return 'error' if s in ('high','critical') else 'warning' if s=='medium' else 'note'
+
+    def add(self, f: Finding)->None:
+        rid = f.kind
+        if rid not in self.rules: self.rules[rid] = {'id':rid,'name':rid,'shortDescription':{'text':rid}}
+        res = {'ruleId':rid,'level':self._level(f.severity),'message':{'text':f'{f.id}: {f.message}'}}
+        self.fh.write(('\n        ' if not self.total else ',\n        ') + json.dumps(res))
+        self.total += 1
+
+    def close(self)->None:
+        tool = json.dumps({'driver':{'name':'bootattestor','rules':list(self.rules.values())}})
+        self.fh.write(('\n      ' if self.total else '') + f'],\n      "tool": {tool}\n    }}\n  ]\n}}\n')
+
+def escape(s: str)->str:
+    # xml.sax.saxutils.escape, without the import (it drags in urllib and http.client)
+    return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def _attr(s: str)->str:
+    return escape(s).replace('"', '&quot;').replace('\n', '&#10;').replace('\r', '&#13;').replace('\t', '&#09;')
+
+class JunitWriter:
+    def __init__(self, fh: IO[str], fail_on: str):
+        # the suite header carries the test count, so cases are spooled until close()
+        self.fh, self.total, self.thr = fh, 0, RANK.get(fail_on, 3)
+        self.body = tempfile.SpooledTemporaryFile(max_size=1 << 20, mode='w+', encoding='utf-8')
+
+    def add(self, f: Finding)->None:
+        case = f'<testcase classname="{_attr(f.kind)}" name="{_attr(f.id)}"'
+        if RANK.get(f.severity,1) >= self.thr:
+            case += f'><failure message="{_attr(f.message)}">{escape(f"{f.kind}:{f.id}:{f.severity}")}</failure></testcase>'
+        else:
+            case += ' />'
+        self.body.write(case); self.total += 1
+
+    def close(self)->None:
+        self.fh.write(f'<testsuite name="bootattestor" tests="{max(1, self.total)}">')
+        if self.total:
+            self.body.seek(0); shutil.copyfileobj(self.body, self.fh)
+        else:
+            self.fh.write('<testcase classname="attestation" name="baseline" />')
+        self.body.close()
+        self.fh.write('</testsuite>\n')
+
+def open_writer(fmt: str, fh: IO[str], fail_on: str = 'medium'):
+    if fmt == 'text': return TextWriter(fh)
+    if fmt == 'json': return JsonWriter(fh)
+    if fmt == 'sarif': return SarifWriter(fh)
+    if fmt == 'junit': return JunitWriter(fh, fail_on)
+    raise AttestorError('bad format')
+
+def _render(fmt: str, findings: Iterable[Finding], fail_on: str = 'medium')->str:
+    buf = io.StringIO()
+    w = open_writer(fmt, buf, fail_on)
+    for f in findings: w.add(f)
+    w.close()
+    return buf.getvalue().rstrip('\n')
 
 def render_text(findings: List[Finding])->str:
-    if not findings: return 'OK: no mismatches'
-    lines = [f'{f.severity.upper()} {f.kind} {f.id} - {f.message}' for f in findings]
-    lines.append(f'Total: {len(findings)}')
-    return '\n'.join(lines)
+    return _render('text', findings)
 
 def render_json(findings: List[Finding])->str:
-    data = {'version':1,'$schema':'schema://bootattestor/findings.json','findings':[f.__dict__ for f in findings],'summary':{'total':len(findings)}}
-    return json.dumps(data, indent=2)
+    return _render('json', findings)
 
 def render_sarif(findings: List[Finding])->str:
-    def lvl(s:str)->str:
-        return 'error' if s in ('high','critical') else 'warning' if s=='medium' else 'note'
-    rules, results = {}, []
-    for f in findings:
-        rid = f.kind
-        if rid not in rules: rules[rid] = {'id':rid,'name':rid,'shortDescription':{'text':rid}}
-        results.append({'ruleId':rid,'level':lvl(f.severity),'message':{'text':f'{f.id}: {f.message}'}})
-    sarif = {'version':'2.1.0','$schema':'https://json.schemastore.org/sarif-2.1.0.json','runs':[{'tool':{'driver':{'name':'bootattestor','rules':list(rules.values())}},'results':results}]}
-    return json.dumps(sarif, indent=2)
+    return _render('sarif', findings)
 
 def render_junit(findings: List[Finding], fail_on: str)->str:
-    rank = {'info':1,'low':2,'medium':3,'high':4,'critical':5}
-    thr = rank.get(fail_on, 3)
-    suite = ET.Element('testsuite', name='bootattestor', tests=str(max(1,len(findings))))
-    if not findings:
-        ET.SubElement(suite, 'testcase', classname='attestation', name='baseline')
-    else:
-        for f in findings:
-            case = ET.SubElement(suite, 'testcase', classname=f.kind, name=f.id)
-            if rank.get(f.severity,1) >= thr:
-                fail = ET.SubElement(case, 'failure', message=f.message); fail.text = f'{f.kind}:{f.id}:{f.severity}'
-    return ET.tostring(suite, encoding='unicode')
+    return _render('junit', findings, fail_on)
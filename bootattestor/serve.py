@@ -0,0 +1,143 @@
+from __future__ import annotations
+import io, zlib, asyncio, posixpath, tarfile, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from .attestor import Baseline, Finding, diff_attestation, load_baseline, load_policy, replay_event_log, render_findings, exit_status
+from .efivars import hash_efivar_blobs
+from .fleet import EVENT_LOG_NAMES
+from .errors import AttestorError
+from .policy import CompiledPolicy
+
+FORMATS = {'text':'text/plain', 'json':'application/json', 'sarif':'application/sarif+json', 'junit':'application/xml'}
+FAIL_ON = ('none','low','medium','high','critical')
+MAX_BODY = 64 << 20
+REASONS = {200:'OK', 400:'Bad Request', 404:'Not Found', 405:'Method Not Allowed', 411:'Length Required', 413:'Payload Too Large', 500:'Internal Server Error'}
+
+class BundleTooLarge(AttestorError):
+    pass
+
+def read_bundle(body: bytes, limit: int = MAX_BODY)->Tuple[bytes, List[Tuple[str, bytes]]]:
+    # a tar (optionally compressed) laid out like a fleet host bundle, or a bare event log.
+    # limit caps the unpacked size, checked from member headers before anything is read, so a
+    # small compressed upload cannot expand without bound
+    bio = io.BytesIO(body)
+    if not tarfile.is_tarfile(bio): return body, []
+    bio.seek(0)
+    log: bytes | None = None
+    var_items: List[Tuple[str, bytes]] = []
+    total = 0
+    with tarfile.open(fileobj=bio, mode='r:*') as tf:
+        for m in tf:
+            if not m.isfile(): continue
+            total += m.size
+            if total > limit: raise BundleTooLarge(f'bundle unpacks to more than {limit} bytes')
+            base, parent = posixpath.basename(m.name), posixpath.basename(posixpath.dirname(m.name))
+            if base in EVENT_LOG_NAMES and log is None: log = tf.extractfile(m).read()
+            elif parent == 'efivars': var_items.append((base, tf.extractfile(m).read()))
+    if log is None: raise AttestorError(f'bundle has no event log ({" or ".join(EVENT_LOG_NAMES)})')
+    return log, var_items
+
+_W: Dict[str, Any] = {}
+
+def _init_worker(bl: Baseline | None, store_path: str | None, policy: CompiledPolicy)->None:
+    _W['baseline'] = bl; _W['policy'] = policy; _W['store'] = None
+    if store_path:
+        from .store import BaselineStore
+        _W['store'] = BaselineStore(store_path)
+
+def _handle(body: bytes, fmt: str, fail_on: str, max_body: int = MAX_BODY)->Tuple[int, str, int]:
+    try:
+        log, var_items = read_bundle(body, max_body)
+        bl, pcrs, pre = _W['baseline'], None, []
+        if bl is None:
+            from .store import select_baseline
+            pcrs = replay_event_log(log)
+            bl, selected = select_baseline(_W['store'], pcrs)
+            pre = [selected]
+        vars_now = hash_efivar_blobs(var_items, bl.variables.keys())
+        finds: List[Finding] = pre + diff_attestation(bl, log, None, _W['policy'], pcrs_now=pcrs, vars_now=vars_now)
+        return 200, render_findings(finds, fmt, fail_on), exit_status(finds, fail_on)
+    except BundleTooLarge as e:
+        return 413, f'error: {e}\n', 2
+    except (AttestorError, tarfile.TarError, EOFError, zlib.error) as e:
+        return 400, f'error: {e}\n', 2
+    except Exception as e:
+        return 500, f'internal error: {type(e).__name__}: {e}\n', 2
+
+def make_pool(bl: Baseline | None, store_path: str | None, policy: CompiledPolicy, workers: int | None = None)->ProcessPoolExecutor:
+    # spawned, not forked: a worker forked mid-request would inherit open client sockets and hold them open
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker, initargs=(bl, store_path, policy))
+
+async def _respond(writer: asyncio.StreamWriter, code: int, body: str, ctype: str = 'text/plain', extra: Dict[str, str] | None = None)->None:
+    data = body.encode('utf-8')
+    head = [f'HTTP/1.1 {code} {REASONS.get(code, "")}', f'Content-Type: {ctype}; charset=utf-8', f'Content-Length: {len(data)}', 'Connection: close']
+    head += [f'{k}: {v}' for k, v in (extra or {}).items()]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + data)
+    await writer.drain()
+
+async def _respond_quietly(writer: asyncio.StreamWriter, code: int, body: str)->None:
+    # error responses are best effort; the client may already be gone
+    try:
+        await _respond(writer, code, body)
+    except ConnectionError:
+        pass
+
+async def _serve_conn(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, pool: ProcessPoolExecutor, max_body: int)->None:
+    try:
+        method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''): break
+            k, _, v = line.decode('latin-1').partition(':')
+            headers[k.strip().lower()] = v.strip()
+        url = urlsplit(target)
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == '/healthz':
+            await _respond(writer, 200, 'ok\n'); return
+        if url.path != '/attest':
+            await _respond(writer, 404, 'not found\n'); return
+        if method != 'POST':
+            await _respond(writer, 405, 'POST a bundle to /attest\n'); return
+        if 'content-length' not in headers:
+            await _respond(writer, 411, 'content-length required\n'); return
+        n = int(headers['content-length'])
+        if n < 0 or n > max_body:
+            await _respond(writer, 413, f'body limit is {max_body} bytes\n'); return
+        fmt, fail_on = q.get('format', 'json'), q.get('fail_on', 'medium')
+        if fmt not in FORMATS or fail_on not in FAIL_ON:
+            await _respond(writer, 400, f'format must be one of {", ".join(FORMATS)}; fail_on one of {", ".join(FAIL_ON)}\n'); return
+        body = await reader.readexactly(n)
+        code, content, status = await asyncio.get_running_loop().run_in_executor(pool, _handle, body, fmt, fail_on, max_body)
+        await _respond(writer, code, content, FORMATS[fmt] if code == 200 else 'text/plain', {'X-Bootattest-Status': str(status)})
+    except (ValueError, asyncio.IncompleteReadError):
+        await _respond_quietly(writer, 400, 'malformed request\n')
+    except ConnectionError:
+        pass
+    except Exception as e:
+        # a broken or shut down pool, or a result that failed to pickle: still answer the client
+        await _respond_quietly(writer, 500, f'internal error: {type(e).__name__}: {e}\n')
+    finally:
+        writer.close()
+
+async def start_server(pool: ProcessPoolExecutor, host: str = '127.0.0.1', port: int = 0, unix_path: str | None = None, max_body: int = MAX_BODY)->asyncio.AbstractServer:
+    handler = lambda r, w: _serve_conn(r, w, pool, max_body)
+    if unix_path: return await asyncio.start_unix_server(handler, path=unix_path)
+    return await asyncio.start_server(handler, host, port)
+
+def run_serve(baseline_path: str | None, baseline_store: str | None, policy_path: str | None, host: str, port: int, unix_path: str | None = None, workers: int | None = None, max_body: int = MAX_BODY)->int:
+    if not baseline_path and not baseline_store: raise AttestorError('pass --baseline or --baseline-store')
+    bl = load_baseline(baseline_path) if baseline_path else None
+    policy = load_policy(policy_path)
+    async def main()->None:
+        with make_pool(bl, baseline_store, policy, workers) as pool:
+            srv = await start_server(pool, host, port, unix_path, max_body)
+            print(f'listening on {unix_path or ":".join(str(x) for x in srv.sockets[0].getsockname()[:2])}', flush=True)
+            async with srv: await srv.serve_forever()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    return 0
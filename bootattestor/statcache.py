@@ -0,0 +1,20 @@
+from __future__ import annotations
+import os, json
+from typing import Any, Dict
+
+# the json stat caches behind --efivars-cache and --esp-cache: a file -> [inode, size, mtime_ns,
+# result] map, where a missing or unreadable cache just means everything is read again
+
+def load_stat_cache(path: str | None)->Dict[str, list]:
+    if not path or not os.path.exists(path): return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def save_stat_cache(path: str, cache: Dict[str, Any])->None:
+    # runs sharing a cache each replace it whole; the last writer wins
+    tmp = path + f'.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f: json.dump(cache, f)
+    os.replace(tmp, path)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+import os, json, hashlib, sqlite3
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from .attestor import Baseline, Finding, load_baseline, baseline_to_dict, baseline_from_dict
+from .errors import AttestorError
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS baselines(id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, platform TEXT NOT NULL, created_at INTEGER NOT NULL, nbanks INTEGER NOT NULL, doc TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS composites(baseline_id INTEGER NOT NULL REFERENCES baselines(id) ON DELETE CASCADE, bank TEXT NOT NULL, selection TEXT NOT NULL, digest TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS composites_lookup ON composites(bank, selection, digest);
+CREATE TABLE IF NOT EXISTS pcr_values(baseline_id INTEGER NOT NULL REFERENCES baselines(id) ON DELETE CASCADE, bank TEXT NOT NULL, pcr INTEGER NOT NULL, digest TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS pcr_values_lookup ON pcr_values(bank, pcr, digest);
+'''
+
+def pcr_composite(pmap: Dict[int, str], selection: List[int])->str:
+    # TPM-quote style composite: hash over the selected register values in index order
+    h = hashlib.sha256()
+    for i in selection: h.update(bytes.fromhex(pmap[i]))
+    return h.hexdigest()
+
+def _selection_key(selection: List[int])->str:
+    return ','.join(str(i) for i in selection)
+
+class BaselineStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(_SCHEMA)
+
+    def close(self)->None:
+        self.db.close()
+
+    def __enter__(self)->'BaselineStore':
+        return self
+
+    def __exit__(self, *exc)->None:
+        self.close()
+
+    def add(self, name: str, bl: Baseline, replace: bool = False)->None:
+        with self.db:
+            if self.db.execute('SELECT 1 FROM baselines WHERE name=?', (name,)).fetchone():
+                if not replace: raise AttestorError(f'baseline {name} already in store')
+                self.db.execute('DELETE FROM baselines WHERE name=?', (name,))
+            cur = self.db.execute('INSERT INTO baselines(name, platform, created_at, nbanks, doc) VALUES (?,?,?,?,?)', (name, bl.platform, bl.created_at, len(bl.digests), json.dumps(baseline_to_dict(bl))))
+            bid = cur.lastrowid
+            for bank, pmap in bl.digests.items():
+                sel = sorted(pmap)
+                self.db.execute('INSERT INTO composites VALUES (?,?,?,?)', (bid, bank, _selection_key(sel), pcr_composite(pmap, sel)))
+                self.db.executemany('INSERT INTO pcr_values VALUES (?,?,?,?)', [(bid, bank, i, pmap[i].lower()) for i in sel])
+
+    def remove(self, name: str)->None:
+        with self.db:
+            if not self.db.execute('DELETE FROM baselines WHERE name=?', (name,)).rowcount:
+                raise AttestorError(f'baseline {name} not in store')
+
+    def list(self)->List[Tuple[str, str, int, List[str]]]:
+        rows = self.db.execute('SELECT b.name, b.platform, b.created_at, group_concat(c.bank) FROM baselines b LEFT JOIN composites c ON c.baseline_id=b.id GROUP BY b.id ORDER BY b.name').fetchall()
+        return [(n, p, c, sorted((banks or '').split(','))) for n, p, c, banks in rows]
+
+    def get(self, name: str)->Baseline:
+        row = self.db.execute('SELECT doc FROM baselines WHERE name=?', (name,)).fetchone()
+        if row is None: raise AttestorError(f'baseline {name} not in store')
+        return baseline_from_dict(json.loads(row[0]))
+
+    def match(self, pcrs: Dict[str, Dict[int, str]])->Tuple[str, Baseline, bool]:
+        # exact: every bank composite of a baseline hits; otherwise the baseline sharing the most PCR values
+        hits: Counter = Counter()
+        for bank, sel_key in self.db.execute('SELECT DISTINCT bank, selection FROM composites').fetchall():
+            pmap = pcrs.get(bank)
+            if not pmap: continue
+            sel = [int(i) for i in sel_key.split(',')] if sel_key else []
+            if any(i not in pmap for i in sel): continue
+            for (bid,) in self.db.execute('SELECT baseline_id FROM composites WHERE bank=? AND selection=? AND digest=?', (bank, sel_key, pcr_composite(pmap, sel))):
+                hits[bid] += 1
+        for bid, n in hits.most_common():
+            name, nbanks, doc = self.db.execute('SELECT name, nbanks, doc FROM baselines WHERE id=?', (bid,)).fetchone()
+            if n == nbanks: return name, baseline_from_dict(json.loads(doc)), True
+        votes: Counter = Counter()
+        for bank, pmap in pcrs.items():
+            for i, v in pmap.items():
+                if not v.strip('0'): continue  # never-extended registers say nothing about the image
+                for (bid,) in self.db.execute('SELECT baseline_id FROM pcr_values WHERE bank=? AND pcr=? AND digest=?', (bank, i, v.lower())):
+                    votes[bid] += 1
+        if not votes: raise AttestorError(f'no baseline in {self.path} shares any PCR value with this host')
+        bid = votes.most_common(1)[0][0]
+        name, doc = self.db.execute('SELECT name, doc FROM baselines WHERE id=?', (bid,)).fetchone()
+        return name, baseline_from_dict(json.loads(doc)), False
+
+def add_baseline_file(store_path: str, baseline_path: str, name: str | None = None, replace: bool = False)->str:
+    bl = load_baseline(baseline_path)
+    name = name or os.path.splitext(os.path.basename(baseline_path))[0]
+    with BaselineStore(store_path) as st: st.add(name, bl, replace)
+    return name
+
+def select_baseline(st: BaselineStore, pcrs: Dict[str, Dict[int, str]])->Tuple[Baseline, Finding]:
+    name, bl, exact = st.match(pcrs)
+    return bl, Finding('baseline-selected', name, 'info', f'{"exact" if exact else "closest"} baseline match in {st.path}')
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import os, random, struct, uuid
+from typing import Dict, Iterable, Tuple
+
+from .tcg import (ALG_SHA1, ALG_SHA256, ALG_SIZES, EV_NO_ACTION, EV_SEPARATOR, EV_EFI_ACTION, EV_POST_CODE,
+                  EV_EFI_VARIABLE_DRIVER_CONFIG, EV_EFI_VARIABLE_BOOT, EV_EFI_BOOT_SERVICES_APPLICATION, EV_EFI_BOOT_SERVICES_DRIVER)
+from .pcr import _h
+from .efivars import EFI_GLOBAL
+
+# synthetic crypto-agile (TCG PC Client, SpecID Event03) logs and efivars trees for tests and benchmarks
+
+DEFAULT_MIX = {EV_EFI_BOOT_SERVICES_DRIVER: 4, EV_EFI_BOOT_SERVICES_APPLICATION: 1, EV_EFI_VARIABLE_DRIVER_CONFIG: 2, EV_EFI_VARIABLE_BOOT: 1, EV_EFI_ACTION: 1, EV_POST_CODE: 1}
+EFI_IMAGE_SECURITY_DB = uuid.UUID('d719b2cb-3d3a-4596-a3bc-dad00e67656f')
+EFI_SYSTEM_PARTITION_TYPE = uuid.UUID('c12a7328-f81f-11d2-ba4b-00a0c93ec93b')
+ESP_PARTITION = uuid.UUID('3e2f1c7a-0b5d-4a39-9c3e-52f1d1a6b7c0')
+
+def specid_event(banks: Iterable[int])->bytes:
+    banks = list(banks)
+    body = b'Spec ID Event03\x00' + struct.pack('<IBBBB', 0, 0, 2, 0, 2) + struct.pack('<I', len(banks))
+    body += b''.join(struct.pack('<HH', alg, ALG_SIZES[alg]) for alg in banks) + b'\x00'
+    return struct.pack('<III', 0, EV_NO_ACTION, 1) + struct.pack('<H', ALG_SHA1) + b'\x00'*20 + struct.pack('<I', len(body)) + body
+
+def event_record(pcr: int, ev_type: int, banks: Iterable[int], data: bytes, measured: bytes | None = None)->bytes:
+    # digests are over `measured` (the image for load events) or the event data itself
+    m = data if measured is None else measured
+    digs = [struct.pack('<H', alg) + _h(alg)(m).digest() for alg in banks]
+    return struct.pack('<III', pcr, ev_type, len(digs)) + b''.join(digs) + struct.pack('<I', len(data)) + data
+
+def dp_node(t: int, s: int, body: bytes)->bytes:
+    return struct.pack('<BBH', t, s, 4 + len(body)) + body
+
+def esp_device_path(part_guid: uuid.UUID = ESP_PARTITION, start_lba: int = 2048, size_lba: int = 1 << 20)->bytes:
+    # PciRoot(0x0)/Pci(0x1d,0x0)/NVMe(0x1,...)/HD(1,GPT,...): the prefix firmware puts before every ESP file
+    return (dp_node(2, 1, struct.pack('<II', 0x0A0341D0, 0)) + dp_node(1, 1, bytes([0, 0x1D])) + dp_node(3, 23, struct.pack('<I', 1) + bytes(range(8)))
+            + dp_node(4, 1, struct.pack('<IQQ', 1, start_lba, size_lba) + part_guid.bytes_le + b'\x02\x02'))
+
+def file_device_path(path: str, prefix: bytes = b'')->bytes:
+    # optional prefix nodes, a MEDIA_DEVICE_PATH / FILEPATH node, then END_ENTIRE
+    p = (path + '\x00').encode('utf-16-le')
+    return prefix + dp_node(4, 4, p) + b'\x7f\xff\x04\x00'
+
+def image_load_event(path: str, image_len: int, prefix: bytes = b'')->bytes:
+    dp = file_device_path(path, prefix)
+    return struct.pack('<QQQQ', 0x7f000000, image_len, 0, len(dp)) + dp
+
+def variable_data_event(guid: uuid.UUID, name: str, value: bytes)->bytes:
+    n = name.encode('utf-16-le')
+    return guid.bytes_le + struct.pack('<QQ', len(name), len(value)) + n + value
+
+def gpt_event(disk_guid: uuid.UUID, parts: Iterable[Tuple[str, uuid.UUID, int, int]])->bytes:
+    # UEFI_GPT_DATA for (name, partition guid, first lba, last lba) entries, all typed as ESPs
+    parts = list(parts)
+    hdr = bytearray(92)
+    hdr[:8] = b'EFI PART'
+    struct.pack_into('<II', hdr, 8, 0x10000, 92)
+    hdr[56:72] = disk_guid.bytes_le
+    struct.pack_into('<QII', hdr, 72, 2, 128, 128)
+    ents = b''.join(EFI_SYSTEM_PARTITION_TYPE.bytes_le + g.bytes_le + struct.pack('<QQQ', first, last, 0) + name.encode('utf-16-le').ljust(72, b'\x00')
+                    for name, g, first, last in parts)
+    return bytes(hdr) + struct.pack('<Q', len(parts)) + ents
+
+def pe_image(code: bytes, cert: bytes = b'')->bytes:
+    # smallest PE32+ image with one .text section; cert lands in the attribute certificate table
+    text = code + b'\x00'*(-len(code) % 0x200)
+    opt = bytearray(240)
+    struct.pack_into('<H', opt, 0, 0x20B)
+    struct.pack_into('<II', opt, 56, 0x1000 + len(text), 0x200)   # SizeOfImage, SizeOfHeaders
+    struct.pack_into('<I', opt, 108, 16)                          # NumberOfRvaAndSizes
+    if cert: struct.pack_into('<II', opt, 112 + 4*8, 0x200 + len(text), len(cert))
+    sect = b'.text\x00\x00\x00' + struct.pack('<IIII', len(code), 0x1000, len(text), 0x200) + b'\x00'*16
+    hdr = b'MZ' + b'\x00'*58 + struct.pack('<I', 0x40) + b'PE\x00\x00' + struct.pack('<HHIIIHH', 0x8664, 1, 0, 0, 0, len(opt), 0x22) + bytes(opt) + sect
+    return hdr + b'\x00'*(0x200 - len(hdr)) + text + cert
+
+_ESP_PREFIX = esp_device_path()
+
+def _body(rng: random.Random, ev_type: int, i: int, size: int)->Tuple[int, bytes, bytes | None]:
+    if ev_type in (EV_EFI_BOOT_SERVICES_DRIVER, EV_EFI_BOOT_SERVICES_APPLICATION):
+        kind = 'Drivers' if ev_type == EV_EFI_BOOT_SERVICES_DRIVER else 'Boot'
+        image = rng.randbytes(64)
+        return (2 if kind == 'Drivers' else 4), image_load_event(f'\\EFI\\Vendor\\{kind}\\image{i % 997:04d}.efi', size, _ESP_PREFIX), image
+    if ev_type == EV_EFI_VARIABLE_DRIVER_CONFIG:
+        name = ('SecureBoot', 'PK', 'KEK', 'db', 'dbx')[i % 5]
+        guid = EFI_IMAGE_SECURITY_DB if name in ('db', 'dbx') else EFI_GLOBAL
+        return 7, variable_data_event(guid, name, rng.randbytes(max(1, size))), None
+    if ev_type == EV_EFI_VARIABLE_BOOT:
+        value = rng.randbytes(max(1, size))
+        return 1, variable_data_event(EFI_GLOBAL, f'Boot{i % 16:04X}', value), value
+    if ev_type == EV_EFI_ACTION:
+        return 4, b'Calling EFI Application from Boot Option', None
+    if ev_type == EV_SEPARATOR:
+        return i % 8, b'\x00'*4, None
+    return 0, rng.randbytes(max(1, size)), None
+
+def generate_eventlog(events: int, banks: Iterable[int] = (ALG_SHA1, ALG_SHA256), event_size: Tuple[int, int] = (16, 256), mix: Dict[int, int] | None = None, seed: int = 0)->bytes:
+    rng = random.Random(seed)
+    banks = list(banks)
+    mix = mix or DEFAULT_MIX
+    types, weights = list(mix), list(mix.values())
+    out = [specid_event(banks)]
+    body_events = max(0, events - 8)
+    for i, ev_type in enumerate(rng.choices(types, weights, k=body_events)):
+        pcr, data, measured = _body(rng, ev_type, i, rng.randint(*event_size))
+        out.append(event_record(pcr, ev_type, banks, data, measured))
+    # firmware closes PCR0-7 with separators
+    out.extend(event_record(pcr, EV_SEPARATOR, banks, b'\x00'*4) for pcr in range(min(8, events)))
+    return b''.join(out)
+
+def write_eventlog(path: str, events: int, **kw)->str:
+    with open(path, 'wb') as f: f.write(generate_eventlog(events, **kw))
+    return path
+
+def write_efivars_tree(root: str, vendor_vars: int = 16, db_size: int = 4096, dbx_size: int = 16384, seed: int = 0)->str:
+    # efivarfs layout: <Name>-<guid> files holding a 4 byte attribute word then the data
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    g, sdb = str(EFI_GLOBAL), str(EFI_IMAGE_SECURITY_DB)
+    vars = [('SecureBoot', g, b'\x01'), ('PK', g, rng.randbytes(800)), ('KEK', g, rng.randbytes(1500)), ('db', sdb, rng.randbytes(db_size)),
+            ('dbx', sdb, rng.randbytes(dbx_size)), ('BootOrder', g, b'\x00\x00\x01\x00'), ('Boot0000', g, rng.randbytes(120)), ('Boot0001', g, rng.randbytes(120))]
+    vars += [(f'Vendor{i:03d}', str(uuid.UUID(int=rng.getrandbits(128))), rng.randbytes(rng.randint(8, 512))) for i in range(vendor_vars)]
+    for name, guid, data in vars:
+        with open(os.path.join(root, f'{name}-{guid}'), 'wb') as f: f.write(struct.pack('<I', 7) + data)
+    return root
@@ -1,8 +1,12 @@
 from __future__ import annotations
 import struct
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
 from .errors import AttestorError
+from .uefi import decode_variable_data
+
+# bump when a parser change alters what iter_tpm2_events yields; invalidates logcache entries
+PARSER_VERSION = 2
 
 ALG_SHA1    = 0x0004
 ALG_SHA256  = 0x000B
@@ -10,26 +14,81 @@ ALG_SHA384  = 0x000C
 ALG_SHA512  = 0x000D
 ALG_SM3_256 = 0x0012
 
+# TCG PC Client Platform Firmware Profile, section 10.4.1
 EV_PREBOOT_CERT = 0x00000000
 EV_POST_CODE = 0x00000001
 EV_NO_ACTION = 0x00000003
 EV_SEPARATOR = 0x00000004
+EV_ACTION = 0x00000005
+EV_EVENT_TAG = 0x00000006
+EV_S_CRTM_CONTENTS = 0x00000007
+EV_S_CRTM_VERSION = 0x00000008
+EV_CPU_MICROCODE = 0x00000009
+EV_PLATFORM_CONFIG_FLAGS = 0x0000000A
+EV_TABLE_OF_DEVICES = 0x0000000B
+EV_IPL = 0x0000000D
+EV_NONHOST_CODE = 0x0000000F
+EV_NONHOST_CONFIG = 0x00000010
+EV_NONHOST_INFO = 0x00000011
+EV_OMIT_BOOT_DEVICE_EVENTS = 0x00000012
 EV_EFI_VARIABLE_DRIVER_CONFIG = 0x80000001
 EV_EFI_VARIABLE_BOOT = 0x80000002
-EV_EFI_BOOT_SERVICES_APPLICATION = 0x80000006
-EV_EFI_BOOT_SERVICES_DRIVER = 0x80000007
-EV_EFI_RUNTIME_SERVICES_DRIVER = 0x80000008
-EV_EFI_GPT_EVENT = 0x80000009
-EV_EFI_ACTION = 0x8000000A
+EV_EFI_BOOT_SERVICES_APPLICATION = 0x80000003
+EV_EFI_BOOT_SERVICES_DRIVER = 0x80000004
+EV_EFI_RUNTIME_SERVICES_DRIVER = 0x80000005
+EV_EFI_GPT_EVENT = 0x80000006
+EV_EFI_ACTION = 0x80000007
+EV_EFI_PLATFORM_FIRMWARE_BLOB = 0x80000008
+EV_EFI_HANDOFF_TABLES = 0x80000009
+EV_EFI_PLATFORM_FIRMWARE_BLOB2 = 0x8000000A
+EV_EFI_HANDOFF_TABLES2 = 0x8000000B
+EV_EFI_VARIABLE_BOOT2 = 0x8000000C
+EV_EFI_HCRTM_EVENT = 0x80000010
+EV_EFI_VARIABLE_AUTHORITY = 0x800000E0
+EV_EFI_SPDM_FIRMWARE_BLOB = 0x800000E1
+EV_EFI_SPDM_FIRMWARE_CONFIG = 0x800000E2
+
+EVENT_TYPE_NAMES = {v: k for k, v in globals().items() if k.startswith('EV_')}
+
+def event_type_name(ev_type: int)->str:
+    return EVENT_TYPE_NAMES.get(ev_type, f'0x{ev_type:08X}')
+
+VARIABLE_EVENTS = frozenset((EV_EFI_VARIABLE_DRIVER_CONFIG, EV_EFI_VARIABLE_BOOT, EV_EFI_VARIABLE_BOOT2, EV_EFI_VARIABLE_AUTHORITY))
+
+def variable_name(data)->str | None:
+    var = decode_variable_data(data)
+    return var.name if var else None
+
+def describe_event(data, ev_type: int | None = None)->str:
+    # short printable rendering of an event body for findings; variable events show the variable
+    # name and other binary bodies collapse to their size
+    if ev_type in VARIABLE_EVENTS:
+        name = variable_name(data)
+        if name: return name[:64]
+    raw = bytes(data[:96])
+    for enc in ('ascii', 'utf-16-le'):
+        try:
+            s = raw.decode(enc).rstrip('\x00')
+        except UnicodeDecodeError:
+            continue
+        if s and s.isprintable(): return s[:64]
+    return f'{len(data)} bytes'
+
+NUM_PCRS = 24
 
 ALG_SIZES = {ALG_SHA1:20, ALG_SHA256:32, ALG_SHA384:48, ALG_SHA512:64, ALG_SM3_256:32}
 
-@dataclass
+_HDR = struct.Struct("<III")
+_U32 = struct.Struct("<I")
+_U16 = struct.Struct("<H")
+
+@dataclass(slots=True)
 class TcgEvent2:
     pcr_index: int
     event_type: int
-    digests: Dict[int, bytes]
-    data: bytes
+    digests: Dict[int, memoryview]
+    data: memoryview
+    end: int = 0
 
 def _require(cond: bool, msg: str)->None:
     if not cond:
@@ -58,46 +117,52 @@ def _parse_specid_struct(data: bytes)->Tuple[Dict[int,int], int]:
     off += 1 + vlen
     return algs, off
 
-def parse_tpm2_eventlog(blob: bytes)->Tuple[Dict[int,int], List[TcgEvent2]]:
+def parse_tpm2_header(buf)->Tuple[Dict[int,int], int]:
+    mv = memoryview(buf)
     off = 0
-    _require(len(blob) >= 16, "log too small")
-    pcr_index, ev_type, digest_count = struct.unpack_from("<III", blob, off)
+    _require(len(mv) >= 16, "log too small")
+    pcr_index, ev_type, digest_count = _HDR.unpack_from(mv, off)
     off += 12
     _require(ev_type == EV_NO_ACTION, "first event not EV_NO_ACTION/SpecID")
     _require(digest_count <= 16, "digestCount insane")
     for _ in range(digest_count):
-        _require(len(blob) >= off + 2, "truncated alg header in SpecID")
+        _require(len(mv) >= off + 2, "truncated alg header in SpecID")
         off += 2
-        _require(len(blob) >= off + 20, "truncated SpecID digest")
+        _require(len(mv) >= off + 20, "truncated SpecID digest")
         off += 20
-    _require(len(blob) >= off + 4, "SpecID event size missing")
-    (event_size,) = struct.unpack_from("<I", blob, off)
+    _require(len(mv) >= off + 4, "SpecID event size missing")
+    (event_size,) = _U32.unpack_from(mv, off)
     off += 4
-    _require(len(blob) >= off + event_size, "SpecID data truncated")
-    spec_data = blob[off:off+event_size]
-    off += event_size
-    algs, _ = _parse_specid_struct(spec_data)
-
-    events: List[TcgEvent2] = []
-    while off + 16 <= len(blob):
-        pcr_index, ev_type, digest_count = struct.unpack_from("<III", blob, off)
+    _require(len(mv) >= off + event_size, "SpecID data truncated")
+    algs, _ = _parse_specid_struct(bytes(mv[off:off+event_size]))
+    return algs, off + event_size
+
+def iter_tpm2_events(buf, algs: Dict[int,int], off: int)->Iterator[TcgEvent2]:
+    mv = memoryview(buf)
+    end = len(mv)
+    while off + 16 <= end:
+        pcr_index, ev_type, digest_count = _HDR.unpack_from(mv, off)
         off += 12
+        _require(pcr_index < NUM_PCRS, f"PCR index {pcr_index} out of range")
         _require(digest_count <= 16, "digestCount too large")
-        digests: Dict[int, bytes] = {}
+        digests: Dict[int, memoryview] = {}
         for _ in range(digest_count):
-            _require(len(blob) >= off + 2, "truncated alg header")
-            alg = struct.unpack_from("<H", blob, off)[0]
+            _require(end >= off + 2, "truncated alg header")
+            (alg,) = _U16.unpack_from(mv, off)
             off += 2
             dsz = algs.get(alg, ALG_SIZES.get(alg, 0))
             _require(dsz in (20,32,48,64), "unknown digest size")
-            _require(len(blob) >= off + dsz, "truncated digest body")
-            digests[alg] = blob[off:off+dsz]
+            _require(end >= off + dsz, "truncated digest body")
+            digests[alg] = mv[off:off+dsz]
             off += dsz
-        _require(len(blob) >= off + 4, "event size missing")
-        (event_size,) = struct.unpack_from("<I", blob, off)
+        _require(end >= off + 4, "event size missing")
+        (event_size,) = _U32.unpack_from(mv, off)
         off += 4
-        _require(len(blob) >= off + event_size, "event data truncated")
-        data = blob[off:off+event_size]
+        _require(end >= off + event_size, "event data truncated")
+        data = mv[off:off+event_size]
         off += event_size
-        events.append(TcgEvent2(pcr_index, ev_type, digests, data))
-    return algs, events
+        yield TcgEvent2(pcr_index, ev_type, digests, data, off)
+
+def parse_tpm2_eventlog(blob)->Tuple[Dict[int,int], List[TcgEvent2]]:
+    algs, off = parse_tpm2_header(blob)
+    return algs, list(iter_tpm2_events(blob, algs, off))
@@ -0,0 +1,69 @@
+from __future__ import annotations
+import time, json
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+# per-stage wall/CPU time and counters (bytes_read, events, hashes, ...).
+# Instrumented code calls stage()/count(); both are no-ops unless a Trace is active,
+# so embedders opt in with `with tracing(on_stage=cb) as t:`.
+
+class Trace:
+    def __init__(self, on_stage: Callable[[Dict[str, Any]], None] | None = None):
+        self.stages: List[Dict[str, Any]] = []
+        self.on_stage = on_stage
+        self._open: List[Dict[str, Any]] = []
+
+    def to_dict(self)->Dict[str, Any]:
+        totals: Dict[str, Dict[str, float]] = {}
+        for st in self.stages:
+            t = totals.setdefault(st['stage'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+            t['calls'] += 1; t['wall_s'] += st['wall_s']; t['cpu_s'] += st['cpu_s']
+            for k, v in st['counters'].items(): t[k] = t.get(k, 0) + v
+        return {'version': 1, 'stages': self.stages, 'totals': totals}
+
+    def summary(self)->str:
+        rows = [f'{"stage":28s} {"calls":>5s} {"wall ms":>10s} {"cpu ms":>10s}  counters']
+        for name, t in self.to_dict()['totals'].items():
+            extra = ' '.join(f'{k}={int(v)}' for k, v in t.items() if k not in ('calls', 'wall_s', 'cpu_s'))
+            rows.append(f'{name:28s} {int(t["calls"]):5d} {t["wall_s"]*1e3:10.2f} {t["cpu_s"]*1e3:10.2f}  {extra}')
+        return '\n'.join(rows)
+
+_current: Trace | None = None
+
+@contextmanager
+def tracing(on_stage: Callable[[Dict[str, Any]], None] | None = None)->Iterator[Trace]:
+    global _current
+    prev, _current = _current, Trace(on_stage)
+    try:
+        yield _current
+    finally:
+        _current = prev
+
+def active()->bool:
+    return _current is not None
+
+@contextmanager
+def stage(name: str)->Iterator[None]:
+    tr = _current
+    if tr is None:
+        yield; return
+    rec: Dict[str, Any] = {'stage': name, 'depth': len(tr._open), 'counters': {}}
+    tr._open.append(rec)
+    w0, c0 = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        rec['wall_s'] = time.perf_counter() - w0
+        rec['cpu_s'] = time.process_time() - c0
+        tr._open.pop()
+        tr.stages.append(rec)
+        if tr.on_stage: tr.on_stage(rec)
+
+def count(key: str, n: int = 1)->None:
+    tr = _current
+    if tr is None or not tr._open: return
+    c = tr._open[-1]['counters']
+    c[key] = c.get(key, 0) + n
+
+def write_trace(tr: Trace, path: str)->None:
+    with open(path, 'w', encoding='utf-8') as f: json.dump(tr.to_dict(), f, indent=2)
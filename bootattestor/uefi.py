@@ -0,0 +1,178 @@
+from __future__ import annotations
+import codecs, struct, uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterator, List, Tuple
+
+# structured decoders for the event bodies the PC Client spec defines as UEFI structures.
+# They read memoryviews in place (struct.unpack_from, codecs); only the 16 byte GUIDs and the
+# device path prefix, both memo keys, are copied.
+
+_IMAGE_LOAD = struct.Struct('<QQQQ')   # ImageLocationInMemory, ImageLengthInMemory, ImageLinkTimeAddress, LengthOfDevicePath
+_VAR_HDR = struct.Struct('<QQ')        # after the 16 byte VariableName GUID: UnicodeNameLength, VariableDataLength
+_NODE = struct.Struct('<BBH')          # device path node: Type, SubType, Length (header included)
+_GPT_HDR_SIZE = 92
+_GPT_ENTRY = struct.Struct('<16s16sQQQ')
+
+@dataclass(slots=True)
+class ImageLoad:
+    location: int
+    length: int
+    link_time_address: int
+    device_path: str
+    file_path: str
+
+@dataclass(slots=True)
+class VariableData:
+    guid: str
+    name: str
+    data: memoryview
+
+@dataclass(slots=True)
+class GptPartition:
+    type_guid: str
+    guid: str
+    first_lba: int
+    last_lba: int
+    attributes: int
+    name: str
+
+@dataclass(slots=True)
+class GptEvent:
+    disk_guid: str
+    partitions: List[GptPartition]
+
+@dataclass(slots=True)
+class FirmwareBlob:
+    base: int
+    length: int
+    description: str | None = None
+
+@lru_cache(maxsize=1024)
+def _guid_text(raw: bytes)->str:
+    return str(uuid.UUID(bytes_le=raw))
+
+def _guid(mv: memoryview, off: int)->str:
+    # the same few vendor GUIDs name nearly every variable in a log
+    return _guid_text(bytes(mv[off:off+16]))
+
+def _utf16z(mv: memoryview)->str:
+    return codecs.utf_16_le_decode(mv, 'replace')[0].partition('\x00')[0]
+
+def _node_text(t: int, s: int, body: memoryview)->str:
+    # the common nodes in UEFI DevicePathToText form; anything else as Path(type,subtype,hex)
+    n = len(body)
+    if t == 1 and s == 1 and n >= 2: return f'Pci(0x{body[1]:x},0x{body[0]:x})'
+    if t == 2 and s == 1 and n >= 8:
+        hid, uid = struct.unpack_from('<II', body)
+        if hid == 0x0A0341D0: return f'PciRoot(0x{uid:x})'
+        if hid == 0x0A0841D0: return f'PcieRoot(0x{uid:x})'
+        return f'Acpi(0x{hid:08X},0x{uid:x})'
+    if t == 3:
+        if s == 2 and n >= 4: return 'Scsi(0x{:x},0x{:x})'.format(*struct.unpack_from('<HH', body))
+        if s == 5 and n >= 2: return f'USB(0x{body[0]:x},0x{body[1]:x})'
+        if s == 18 and n >= 6: return 'Sata(0x{:x},0x{:x},0x{:x})'.format(*struct.unpack_from('<HHH', body))
+        if s == 23 and n >= 12: return f'NVMe(0x{struct.unpack_from("<I", body)[0]:x},{"-".join(f"{b:02X}" for b in body[4:12])})'
+        if s == 24: return f'Uri({str(body, "ascii", "replace")})'
+    if t == 4:
+        if s == 1 and n >= 38:
+            part, start, size = struct.unpack_from('<IQQ', body)
+            if body[37] == 2: sig, kind = _guid(body, 20), 'GPT'
+            else: sig, kind = f'0x{struct.unpack_from("<I", body, 20)[0]:08X}', 'MBR'
+            return f'HD({part},{kind},{sig},0x{start:x},0x{size:x})'
+        if s == 6 and n >= 16: return f'FvFile({_guid(body, 0)})'
+        if s == 7 and n >= 16: return f'Fv({_guid(body, 0)})'
+    return f'Path({t},{s},{bytes(body).hex()})'
+
+def _nodes(mv: memoryview)->Iterator[Tuple[int, int, int, int]]:
+    # (type, subtype, offset, length) of each node up to the end of the first instance
+    off = 0
+    while off + 4 <= len(mv):
+        t, s, ln = _NODE.unpack_from(mv, off)
+        if ln < 4 or off + ln > len(mv): raise ValueError('device path node overruns its buffer')
+        if t == 0x7F: return
+        yield t, s, off, ln
+        off += ln
+
+@lru_cache(maxsize=4096)
+def _prefix_text(raw: bytes)->str:
+    # everything before the file path is the same handful of disk or firmware volume nodes on
+    # every image load of a boot, so each distinct prefix is rendered once
+    mv = memoryview(raw)
+    return '/'.join(_node_text(t, s, mv[off+4:off+ln]) for t, s, off, ln in _nodes(mv))
+
+_last_prefix: Tuple[bytes, str] = (b'', '')
+
+def decode_device_path(mv)->Tuple[str, str]:
+    # (full text, file path); the file path is empty when the path names no file (e.g. firmware volumes)
+    global _last_prefix
+    mv = memoryview(mv)
+    raw, prefix = _last_prefix
+    split = len(raw)
+    # a boot loads image after image from the same disk, so try the last prefix before walking
+    if not (split and len(mv) >= split + 4 and mv[split] == 4 and mv[split+1] == 4 and mv[:split] == raw):
+        split = next((off for t, s, off, _ in _nodes(mv) if t == 4 and s == 4), len(mv))
+        prefix = ''
+        if split:
+            raw = bytes(mv[:split])
+            prefix = _prefix_text(raw)
+            _last_prefix = (raw, prefix)
+    path, off, n = '', split, len(mv)
+    while off + 4 <= n:
+        t, s, ln = _NODE.unpack_from(mv, off)
+        if ln < 4 or off + ln > n: raise ValueError('device path node overruns its buffer')
+        if t == 0x7F: break
+        if t == 4 and s == 4:
+            f = _utf16z(mv[off+4:off+ln])
+            path += f if not path or path.endswith('\\') or f.startswith('\\') else '\\' + f
+        off += ln
+    return (f'{prefix}/{path}' if prefix and path else prefix or path), path
+
+def decode_image_load(data)->ImageLoad | None:
+    # UEFI_IMAGE_LOAD_EVENT; None when the body is not one (some firmware logs a bare string)
+    mv = memoryview(data)
+    if len(mv) < _IMAGE_LOAD.size: return None
+    loc, length, link, dp_len = _IMAGE_LOAD.unpack_from(mv)
+    if _IMAGE_LOAD.size + dp_len > len(mv): return None
+    try:
+        text, path = decode_device_path(mv[_IMAGE_LOAD.size:_IMAGE_LOAD.size + dp_len])
+    except ValueError:
+        return None
+    return ImageLoad(loc, length, link, text, path)
+
+def decode_variable_data(data)->VariableData | None:
+    # UEFI_VARIABLE_DATA: GUID, name length in CHAR16s, data length, name, data
+    mv = memoryview(data)
+    if len(mv) < 32: return None
+    n, dlen = _VAR_HDR.unpack_from(mv, 16)
+    if 32 + 2*n + dlen > len(mv): return None
+    try:
+        name = str(mv[32:32+2*n], 'utf-16-le')
+    except UnicodeDecodeError:
+        return None
+    return VariableData(_guid(mv, 0), name.rstrip('\x00'), mv[32+2*n:32+2*n+dlen])
+
+def decode_gpt_event(data)->GptEvent | None:
+    # UEFI_GPT_DATA: the GPT header, UINT64 NumberOfPartitions, then the used partition entries
+    mv = memoryview(data)
+    if len(mv) < _GPT_HDR_SIZE + 8 or mv[:8] != b'EFI PART': return None
+    esize = struct.unpack_from('<I', mv, 84)[0]
+    (count,) = struct.unpack_from('<Q', mv, _GPT_HDR_SIZE)
+    if esize < _GPT_ENTRY.size + 72 or _GPT_HDR_SIZE + 8 + count*esize > len(mv): return None
+    parts: List[GptPartition] = []
+    for off in range(_GPT_HDR_SIZE + 8, _GPT_HDR_SIZE + 8 + count*esize, esize):
+        _, _, first, last, attrs = _GPT_ENTRY.unpack_from(mv, off)
+        parts.append(GptPartition(_guid(mv, off), _guid(mv, off + 16), first, last, attrs, _utf16z(mv[off+56:off+128])))
+    return GptEvent(_guid(mv, 56), parts)
+
+def decode_firmware_blob(data, v2: bool = False)->FirmwareBlob | None:
+    # UEFI_PLATFORM_FIRMWARE_BLOB(2): base and length, BLOB2 prefixed by a length-counted description
+    mv = memoryview(data)
+    off, desc = 0, None
+    if v2:
+        if not len(mv): return None
+        off = 1 + mv[0]
+        desc = str(mv[1:off], 'ascii', 'replace')
+    if off + 16 > len(mv): return None
+    base, length = struct.unpack_from('<QQ', mv, off)
+    return FirmwareBlob(base, length, desc)
@@ -0,0 +1,84 @@
+from __future__ import annotations
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from .tcg import (TcgEvent2, describe_event, parse_tpm2_header, iter_tpm2_events, EV_SEPARATOR, EV_ACTION, EV_EFI_ACTION, EV_EFI_GPT_EVENT,
+                  EV_EFI_VARIABLE_DRIVER_CONFIG, EV_EFI_VARIABLE_BOOT, EV_EFI_VARIABLE_BOOT2, EV_EFI_VARIABLE_AUTHORITY)
+from .pcr import _h
+from . import logcache
+from .trace import stage, count
+
+# recomputes event digests from the event data for the types where the PC Client spec defines
+# the digest over the data itself; image loads, firmware blobs and handoff tables hash things
+# that are not in the log and are skipped
+
+# (index in log, pcr, event type, alg, digest in log, digest of the data, description)
+DigestMismatch = Tuple[int, int, int, int, str, str, str]
+
+def _whole(data: memoryview)->Tuple[memoryview, ...]:
+    return (data,)
+
+def _variable_boot(data: memoryview)->Tuple[memoryview, ...]:
+    # the spec measures only VariableData for EV_EFI_VARIABLE_BOOT, but a lot of firmware
+    # hashes the whole UEFI_VARIABLE_DATA like the other variable events; accept either
+    if len(data) < 32: return (data,)
+    name_len = int.from_bytes(data[16:24], 'little'); data_len = int.from_bytes(data[24:32], 'little')
+    start = 32 + 2*name_len
+    if start + data_len != len(data): return (data,)
+    return (data[start:], data)
+
+MEASURED: Dict[int, Callable[[memoryview], Tuple[memoryview, ...]]] = {
+    EV_SEPARATOR: _whole, EV_ACTION: _whole, EV_EFI_ACTION: _whole, EV_EFI_GPT_EVENT: _whole,
+    EV_EFI_VARIABLE_DRIVER_CONFIG: _whole, EV_EFI_VARIABLE_BOOT2: _whole, EV_EFI_VARIABLE_AUTHORITY: _whole,
+    EV_EFI_VARIABLE_BOOT: _variable_boot,
+}
+
+def _check_batch(batch: List[Tuple[int, TcgEvent2]])->Tuple[List[DigestMismatch], int]:
+    # runs in a worker thread; hashlib drops the GIL while hashing buffers over 2 KiB
+    out: List[DigestMismatch] = []
+    hashes = 0
+    for i, ev in batch:
+        bufs = MEASURED[ev.event_type](ev.data)
+        for alg, dig in ev.digests.items():
+            hf = _h(alg)
+            if hf is None: continue
+            got = [hf(b).digest() for b in bufs]
+            hashes += len(got)
+            if dig not in got:
+                out.append((i, ev.pcr_index, ev.event_type, alg, dig.hex(), got[0].hex(), describe_event(ev.data, ev.event_type)))
+    return out, hashes
+
+def _batches(events: Iterable[TcgEvent2], size: int)->Iterator[List[Tuple[int, TcgEvent2]]]:
+    it = ((i, ev) for i, ev in enumerate(events) if ev.event_type in MEASURED)
+    while True:
+        b = list(islice(it, size))
+        if not b: return
+        yield b
+
+def verify_event_digests(buf, workers: int | None = None, batch_size: int = 512)->List[DigestMismatch]:
+    p = logcache.parsed(buf)
+    if p is not None:
+        events: Iterable[TcgEvent2] = p.events()
+    else:
+        algs, off = parse_tpm2_header(buf)
+        events = iter_tpm2_events(buf, algs, off)
+    out: List[DigestMismatch] = []
+    def collect(res: Tuple[List[DigestMismatch], int])->None:
+        out.extend(res[0]); count('hashes', res[1])
+    with stage('verify_digests'):
+        batches = _batches(events, batch_size)
+        workers = workers or min(8, os.cpu_count() or 1)
+        if workers == 1:
+            for b in batches: collect(_check_batch(b))
+            return out
+        # a bounded window of batches in flight keeps memory flat on very large logs
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            pending: deque = deque()
+            for b in batches:
+                pending.append(ex.submit(_check_batch, b))
+                if len(pending) >= 2*workers: collect(pending.popleft().result())
+            while pending: collect(pending.popleft().result())
+    return out
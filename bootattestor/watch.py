@@ -0,0 +1,177 @@
+from __future__ import annotations
+import os, sys, time, errno, ctypes, select, hashlib, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Tuple
+
+from .attestor import Baseline, Finding, _auto_eventlog_path, diff_attestation, load_event_log, load_baseline, load_policy, write_reports, exit_status
+from .efivars import LINUX_EFIVARS, _linux_efivar_paths
+from .pcr import ReplayCheckpoint, replay_incremental
+from .report import RANK
+from .errors import AttestorError
+from .policy import CompiledPolicy
+
+# inotify flags (linux/inotify.h)
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x2, 0x4, 0x8, 0x40, 0x80, 0x100, 0x200
+IN_NONBLOCK, IN_CLOEXEC = 0o4000, 0o2000000
+_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+Sig = Tuple[Any, ...]
+
+def _file_sig(path: str)->Sig | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if st.st_size:
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+    # securityfs reports size 0 and a fixed mtime; the content is the only change signal
+    with open(path, 'rb') as f: return (st.st_ino, hashlib.sha256(f.read()).hexdigest())
+
+class Inotify:
+    # wakeup source only: efivarfs and securityfs do not always emit events, so callers re-stat anyway
+    def __init__(self, paths: List[str]):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0: raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        for p in paths:
+            # a directory watch also sees the file being replaced by rename
+            if libc.inotify_add_watch(self.fd, os.fsencode(p), _WATCH_MASK) < 0:
+                err = ctypes.get_errno()
+                if err != errno.ENOENT: os.close(self.fd); raise OSError(err, f'inotify_add_watch {p} failed')
+
+    def wait(self, timeout: float)->bool:
+        if not select.select([self.fd], [], [], timeout)[0]: return False
+        time.sleep(0.05)  # coalesce a burst of writes into one check
+        try:
+            while os.read(self.fd, 65536): pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self)->None:
+        os.close(self.fd)
+
+def _inotify(paths: List[str])->Inotify | None:
+    if not sys.platform.startswith('linux'): return None
+    try:
+        return Inotify(paths)
+    except (OSError, AttributeError):
+        return None
+
+def _label(v: str)->str:
+    return v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Watcher:
+    # holds the baseline, policy and replay checkpoint across checks; a check only runs when the
+    # event log or one of the baseline's variables changed
+    def __init__(self, baseline: Baseline, policy: CompiledPolicy, event_log_path: str | None, efivars_dir: str | None, efivars_cache: str | None = None):
+        self.baseline, self.policy, self.efivars_cache = baseline, policy, efivars_cache
+        self.event_log_path = event_log_path or _auto_eventlog_path()
+        if not self.event_log_path: raise AttestorError('event log not found; pass --event-log')
+        self.efivars_dir = efivars_dir or (LINUX_EFIVARS if sys.platform.startswith('linux') else None)
+        self._checkpoint: ReplayCheckpoint | None = None
+        self._sig: Sig | None = None
+        self.findings: List[Finding] = []
+        self.ok = False
+        self.checks = self.errors = 0
+        self.last_latency = self.last_check = 0.0
+
+    def watch_paths(self)->List[str]:
+        paths = [os.path.dirname(os.path.abspath(self.event_log_path))]
+        if self.efivars_dir: paths.append(self.efivars_dir)
+        return paths
+
+    def signature(self)->Sig:
+        vars: Tuple[Any, ...] = ()
+        if self.efivars_dir:
+            vars = tuple((n, g, _file_sig(p)) for n, g, p in _linux_efivar_paths(self.efivars_dir, self.baseline.variables.keys()))
+        return (_file_sig(self.event_log_path), vars)
+
+    def check(self)->List[Finding]:
+        t0 = time.perf_counter()
+        blob = load_event_log(self.event_log_path)
+        # the log is append-only: replay resumes from the last check unless its prefix changed
+        pcrs, self._checkpoint = replay_incremental(blob, self._checkpoint)
+        self.findings = diff_attestation(self.baseline, blob, self.efivars_dir, self.policy, pcrs_now=pcrs, efivars_cache=self.efivars_cache)
+        self.last_latency, self.last_check = time.perf_counter() - t0, time.time()
+        self.checks += 1
+        self.ok = True
+        return self.findings
+
+    def poll(self)->bool:
+        sig = self.signature()
+        if sig == self._sig: return False
+        # recorded even if the check fails, so a log that stays broken is not re-parsed every tick
+        self._sig = sig
+        try:
+            self.check()
+        except AttestorError as e:
+            # the last good findings no longer describe this machine; report the failure in their place
+            self.findings, self.ok = [Finding('check-error', self.event_log_path, 'high', str(e))], False
+            self.errors += 1
+            raise
+        return True
+
+    def metrics(self)->str:
+        sev = {s: 0 for s in RANK}
+        for f in self.findings: sev[f.severity] = sev.get(f.severity, 0) + 1
+        out = ['# HELP bootattest_findings Current findings by severity.', '# TYPE bootattest_findings gauge']
+        out += [f'bootattest_findings{{severity="{s}"}} {n}' for s, n in sev.items()]
+        out += ['# HELP bootattest_finding One series per current finding.', '# TYPE bootattest_finding gauge']
+        out += [f'bootattest_finding{{kind="{_label(f.kind)}",id="{_label(f.id)}",severity="{_label(f.severity)}"}} 1' for f in self.findings]
+        out += ['# HELP bootattest_last_check_success Whether the last check completed; 0 means the findings are a check-error.',
+                '# TYPE bootattest_last_check_success gauge', f'bootattest_last_check_success {int(self.ok)}',
+                '# HELP bootattest_last_check_duration_seconds Wall time of the last parse/replay/diff.', '# TYPE bootattest_last_check_duration_seconds gauge',
+                f'bootattest_last_check_duration_seconds {self.last_latency:.6f}',
+                '# HELP bootattest_last_check_timestamp_seconds Unix time of the last completed check.', '# TYPE bootattest_last_check_timestamp_seconds gauge',
+                f'bootattest_last_check_timestamp_seconds {self.last_check:.3f}',
+                '# HELP bootattest_checks_total Completed checks.', '# TYPE bootattest_checks_total counter', f'bootattest_checks_total {self.checks}',
+                '# HELP bootattest_check_errors_total Checks that failed.', '# TYPE bootattest_check_errors_total counter', f'bootattest_check_errors_total {self.errors}']
+        return '\n'.join(out) + '\n'
+
+def write_textfile(text: str, path: str)->None:
+    # node_exporter's textfile collector may read at any time, so replace atomically
+    tmp = path + f'.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f: f.write(text)
+    os.replace(tmp, path)
+
+def start_metrics_server(w: Watcher, host: str, port: int)->ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self)->None:
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404); return
+            body = w.metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+        def log_message(self, *a: Any)->None:
+            pass
+    srv = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def run_watch(event_log_path: str | None, baseline_path: str, efivars_dir: str | None, outputs: List[Tuple[str, str | None]], fail_on: str, policy_path: str | None = None, efivars_cache: str | None = None, interval: float = 5.0, metrics_file: str | None = None, metrics_host: str = '127.0.0.1', metrics_port: int | None = None, use_inotify: bool = True, once: bool = False)->int:
+    w = Watcher(load_baseline(baseline_path), load_policy(policy_path), event_log_path, efivars_dir, efivars_cache)
+    srv = start_metrics_server(w, metrics_host, metrics_port) if metrics_port is not None and not once else None
+    ino = _inotify(w.watch_paths()) if use_inotify and not once else None
+    last: List[Tuple[str, str, str, str]] | None = None
+    try:
+        while True:
+            try:
+                ran = w.poll()
+            except AttestorError as e:
+                print(f'error: {e}', file=sys.stderr); ran = True
+            if ran:
+                if metrics_file: write_textfile(w.metrics(), metrics_file)
+                cur = [(f.kind, f.id, f.severity, f.message) for f in w.findings]
+                if cur != last:
+                    write_reports(w.findings, outputs, fail_on); last = cur
+            if once: return exit_status(w.findings, fail_on) if not w.errors else 2
+            if ino is not None: ino.wait(interval)
+            else: time.sleep(interval)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if ino: ino.close()
+        if srv: srv.shutdown()
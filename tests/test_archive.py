@@ -0,0 +1,71 @@
+import json, os
+import pytest
+from bootattestor.archive import Archive, add_hosts, extract_host
+from bootattestor.attestor import create_baseline, save_baseline
+from bootattestor.cli import main
+from bootattestor.errors import AttestorError
+from bootattestor.synth import event_record, generate_eventlog, write_efivars_tree
+from bootattestor.tcg import ALG_SHA1, ALG_SHA256, EV_EFI_ACTION
+
+def _fleet(root, n=4, events=300):
+    # same firmware everywhere; each host appends one event of its own, the last one also junk past the final record
+    for i in range(n):
+        d = root/f'h{i}'; d.mkdir(parents=True)
+        log = generate_eventlog(events) + event_record(14, EV_EFI_ACTION, (ALG_SHA1, ALG_SHA256), f'host {i}'.encode())
+        if i == n - 1: log += b'\xff' * 7
+        (d/'binary_bios_measurements').write_bytes(log)
+        write_efivars_tree(str(d/'efivars'), vendor_vars=2)
+    return root
+
+def test_roundtrip_is_byte_exact_and_deduplicated(tmp_path):
+    src = _fleet(tmp_path/'fleet')
+    arc = str(tmp_path/'a.db')
+    assert add_hosts(arc, str(src)) == ['h0', 'h1', 'h2', 'h3']
+    with Archive(arc) as a:
+        st = a.stats()
+        assert st['hosts'] == 4 and st['stored_bytes'] * 3 < st['input_bytes']
+        with pytest.raises(AttestorError): a.add('h0', b'', [])
+    for h in ('h0', 'h3'):
+        out = extract_host(arc, h, str(tmp_path/'x'/h))
+        assert open(os.path.join(out, 'binary_bios_measurements'), 'rb').read() == (src/h/'binary_bios_measurements').read_bytes()
+        for fn in os.listdir(src/h/'efivars'):
+            assert open(os.path.join(out, 'efivars', fn), 'rb').read() == (src/h/'efivars'/fn).read_bytes()
+    with Archive(arc) as a:
+        blobs = a.stats()['blobs']
+        a.remove('h3')
+        assert a.stats()['blobs'] == blobs - 2  # its own event and the trailing junk
+        assert a.read_log('h1') == (src/'h1'/'binary_bios_measurements').read_bytes()
+
+def test_attest_and_sbom_from_archive(tmp_path, capsys):
+    src = _fleet(tmp_path/'fleet', n=2)
+    arc = str(tmp_path/'a.db')
+    assert main(['archive', 'add', '--archive', arc, '--hosts', str(src)]) == 0
+    capsys.readouterr()
+    h0 = src/'h0'
+    save_baseline(create_baseline(str(h0/'binary_bios_measurements'), str(h0/'efivars')), str(tmp_path/'bl.json'))
+    (h0/'efivars'/os.listdir(h0/'efivars')[0]).write_bytes(b'\x07\x00\x00\x00changed')  # on disk only; the archive keeps the original
+    rc = main(['attest', '--archive', arc, '--host', 'h0', '--baseline', str(tmp_path/'bl.json'), '--format', 'json'])
+    out = capsys.readouterr().out
+    assert rc == 0 and json.loads(out)['findings'] == []
+    main(['attest', '--archive', arc, '--host', 'h1', '--baseline', str(tmp_path/'bl.json'), '--format', 'json'])
+    finds = json.loads(capsys.readouterr().out)['findings']
+    assert {f['kind'] for f in finds} == {'pcr-mismatch'} and all('PCR14' in f['id'] for f in finds)
+    assert main(['sbom', '--archive', arc, '--host', 'h1', '-o', str(tmp_path/'s.json')]) == 0
+    comps = json.load(open(tmp_path/'s.json'))['components']
+    assert any(c['type'] == 'uefi_variable' for c in comps) and any(c['type'] == 'efi_image' for c in comps)
+    assert main(['attest', '--archive', arc, '--host', 'nope', '--baseline', str(tmp_path/'bl.json')]) == 2
+
+def test_replace_frees_old_records(tmp_path):
+    src = _fleet(tmp_path/'fleet', n=2)
+    arc = str(tmp_path/'a.db')
+    add_hosts(arc, str(src))
+    with Archive(arc) as a:
+        before = a.stats()['blobs']
+        log = (src/'h1'/'binary_bios_measurements').read_bytes()
+        for i in range(3):
+            a.add('h1', log[:-5] + b'rep%02d' % i, [], replace=True)  # new tail record each time, variables dropped
+        after = a.stats()['blobs']
+        assert a.read_log('h1').endswith(b'rep02') and a.read_vars('h1') == []
+    # h1's variables are all shared with h0, so the only change is its last record: the one from the
+    # latest replace stands in for the original, and the records of earlier replaces are gone
+    assert after == before
@@ -0,0 +1,47 @@
+import hashlib, json, struct
+from bootattestor.attestor import export_sbom
+from bootattestor.authenticode import authenticode_digests, hash_esp_images, resolve_esp_path
+from bootattestor.synth import image_load_event, pe_image, specid_event
+from bootattestor.tcg import ALG_SHA1, ALG_SHA256, EV_EFI_BOOT_SERVICES_APPLICATION
+
+def _load_event(path, digests):
+    data = image_load_event(path, 0x1000)
+    return struct.pack('<III', 4, EV_EFI_BOOT_SERVICES_APPLICATION, 2) + b''.join(struct.pack('<H', a) + d for a, d in digests) + struct.pack('<I', len(data)) + data
+
+def test_authenticode_skips_checksum_and_signature(tmp_path):
+    img = pe_image(b'\xc3' * 100, cert=b'C' * 64)
+    f = tmp_path/'a.efi'; f.write_bytes(img)
+    got = authenticode_digests(str(f))
+    # headers without CheckSum (opt+64) and the certificate directory entry, then the section
+    opt = 0x40 + 24
+    want = hashlib.sha256(img[:opt+64] + img[opt+68:opt+144] + img[opt+152:0x200] + img[0x200:-64]).hexdigest()
+    assert got['sha256'] == want
+    f.write_bytes(img[:opt+64] + b'\xff\xff\xff\xff' + img[opt+68:-64] + b'D' * 64)
+    assert authenticode_digests(str(f)) == got
+
+def test_sbom_marks_esp_images(tmp_path):
+    esp = tmp_path/'esp'; (esp/'EFI'/'BOOT').mkdir(parents=True)
+    good, bad = pe_image(b'good'), pe_image(b'evil')
+    (esp/'EFI'/'BOOT'/'BOOTX64.EFI').write_bytes(bad)
+    (esp/'EFI'/'BOOT'/'grubx64.efi').write_bytes(good)
+    dg = authenticode_digests(str(esp/'EFI'/'BOOT'/'grubx64.efi'))
+    digs = [(ALG_SHA1, bytes.fromhex(dg['sha1'])), (ALG_SHA256, bytes.fromhex(dg['sha256']))]
+    log = tmp_path/'log.bin'
+    log.write_bytes(specid_event([ALG_SHA1, ALG_SHA256]) + _load_event('\\EFI\\BOOT\\BOOTX64.EFI', digs) + _load_event('\\EFI\\boot\\GRUBX64.efi', digs) + _load_event('\\EFI\\gone.efi', digs))
+    cache = tmp_path/'esp.json'
+    export_sbom(str(log), str(tmp_path), str(tmp_path/'sbom.json'), str(esp), str(cache))
+    imgs = [c for c in json.load(open(tmp_path/'sbom.json'))['components'] if c['type'] == 'efi_image']
+    assert [(c['match'], c['esp']['status']) for c in imgs] == [(False, 'mismatch'), (True, 'match'), (False, 'missing')]
+    assert imgs[1]['path'] == '\\EFI\\boot\\GRUBX64.efi' and imgs[1]['esp']['file'] == 'EFI/BOOT/grubx64.efi'
+    # unchanged files come from the cache
+    ent = json.load(open(cache)); p = str(esp/'EFI'/'BOOT'/'grubx64.efi'); ent[p][3]['sha256'] = 'cached'; json.dump(ent, open(cache, 'w'))
+    assert hash_esp_images([p], str(cache))[p]['sha256'] == 'cached'
+
+def test_esp_paths_stay_inside_the_esp(tmp_path):
+    esp = tmp_path/'esp'; (esp/'EFI'/'BOOT').mkdir(parents=True)
+    (esp/'EFI'/'BOOT'/'BOOTX64.EFI').write_bytes(b'x')
+    (tmp_path/'secret.efi').write_bytes(b'y')
+    (esp/'EFI'/'link.efi').symlink_to(tmp_path/'secret.efi')
+    assert resolve_esp_path(str(esp), '\\EFI\\.\\boot\\bootx64.efi') == str(esp/'EFI'/'BOOT'/'BOOTX64.EFI')
+    for bad in ('\\EFI\\..\\..\\secret.efi', '..\\secret.efi', '\\EFI\\BOOT\\..\\..\\..\\secret.efi', '\\EFI\\link.efi', '\\efi\\LINK.EFI'):
+        assert resolve_esp_path(str(esp), bad) is None
@@ -8,3 +8,9 @@ def test_truncated_log_raises():
 def test_bad_digest_count():
     bogus = (0).to_bytes(4,'little') + (3).to_bytes(4,'little') + (100).to_bytes(4,'little') + b'\x00'*100
     with pytest.raises(AttestorError): parse_tpm2_eventlog(bogus)
+
+def test_pcr_index_out_of_range():
+    from bootattestor.synth import event_record, specid_event
+    from bootattestor.tcg import ALG_SHA256, EV_EFI_ACTION
+    with pytest.raises(AttestorError, match='PCR index 30'):
+        parse_tpm2_eventlog(specid_event([ALG_SHA256]) + event_record(30, EV_EFI_ACTION, [ALG_SHA256], b'x'))
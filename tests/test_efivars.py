@@ -0,0 +1,25 @@
+import hashlib, json
+from bootattestor.efivars import hash_efivars, load_efivars
+
+G = '8be4df61-93ca-11d2-aa0d-00e098032b8c'
+
+def _var(root, name, data):
+    (root/f'{name}-{G}').write_bytes(b'\x07\x00\x00\x00' + data)
+
+def test_filters_and_stat_cache(tmp_path):
+    efi = tmp_path/'efi'; efi.mkdir()
+    _var(efi, 'SecureBoot', b'\x01'); _var(efi, 'db', b'certs'); _var(efi, 'Vendor-Thing', b'x')
+    assert set(load_efivars(str(efi))) == {('SecureBoot', G), ('db', G), ('Vendor-Thing', G)}
+    assert set(hash_efivars(str(efi), exclude=['db'])) == {f'SecureBoot-{G}', f'Vendor-Thing-{G}'}
+    cache = str(tmp_path/'c.json')
+    got = hash_efivars(str(efi), include=[f'db-{G}', f'PK-{G}'], cache_path=cache)
+    assert got == {f'db-{G}': hashlib.sha256(b'certs').hexdigest()}
+    ent = json.load(open(cache)); ent[f'db-{G}'][3] = 'cached'; json.dump(ent, open(cache, 'w'))
+    assert hash_efivars(str(efi), include=[f'db-{G}'], cache_path=cache)[f'db-{G}'] == 'cached'
+    # another run's leftover temp file is not ours to replace, and an unreadable cache is just empty
+    (tmp_path/'c.json.tmp').write_text('other run')
+    _var(efi, 'db', b'new certs')
+    assert hash_efivars(str(efi), include=[f'db-{G}'], cache_path=cache)[f'db-{G}'] == hashlib.sha256(b'new certs').hexdigest()
+    assert (tmp_path/'c.json.tmp').read_text() == 'other run' and sorted(p.name for p in tmp_path.iterdir()) == ['c.json', 'c.json.tmp', 'efi']
+    (tmp_path/'c.json').write_text('{')
+    assert hash_efivars(str(efi), include=[f'db-{G}'], cache_path=cache)[f'db-{G}'] == hashlib.sha256(b'new certs').hexdigest()
@@ -0,0 +1,30 @@
+import json
+from bootattestor.attestor import create_baseline, save_baseline, load_baseline, diff_attestation, load_policy
+from bootattestor.eventdiff import align_digests
+from bootattestor.synth import event_record, specid_event
+from bootattestor.tcg import ALG_SHA1, ALG_SHA256, EV_EFI_ACTION
+from bootattestor.report import render_json
+
+BANKS = (ALG_SHA1, ALG_SHA256)
+
+def _log(bodies):
+    return specid_event(BANKS) + b''.join(event_record(7, EV_EFI_ACTION, BANKS, b) for b in bodies)
+
+def test_align_is_minimal_on_edits():
+    a = [str(i) for i in range(1000)]
+    b = a[:10] + ['x'] + a[10:500] + a[501:900] + ['y'] + a[901:]
+    ops = [o for o in align_digests(a, b) if o[0] != 'equal']
+    assert ops == [('inserted', None, 10), ('removed', 500, None), ('changed', 900, 900)]
+
+def test_event_divergence_findings(tmp_path):
+    (tmp_path/'efi').mkdir()
+    (tmp_path/'good.bin').write_bytes(_log([b'one', b'two', b'three']))
+    (tmp_path/'bad.bin').write_bytes(_log([b'one', b'evil', b'three']))
+    save_baseline(create_baseline(str(tmp_path/'good.bin'), str(tmp_path/'efi'), with_events=True), str(tmp_path/'bl.json'))
+    bl = load_baseline(str(tmp_path/'bl.json'))
+    finds = diff_attestation(bl, (tmp_path/'bad.bin').read_bytes(), str(tmp_path/'efi'), load_policy(None))
+    kinds = [f.kind for f in finds]
+    assert kinds.count('pcr-mismatch') == 2 and 'event-divergence' in kinds
+    ch = [f for f in finds if f.kind == 'event-changed'][0]
+    assert ch.event == {'index':1,'type':'EV_EFI_ACTION','description':'evil'}
+    assert json.loads(render_json(finds))['findings'][-1]['event']['index'] == 1
@@ -0,0 +1,42 @@
+import json, shutil
+from bootattestor.attestor import create_baseline, save_baseline
+from bootattestor.fleet import run_attest_fleet
+
+def test_fleet_status_per_host(tmp_path):
+    for h in ('a','b'):
+        (tmp_path/'hosts'/h/'efivars').mkdir(parents=True)
+        shutil.copy('tests/fixtures_eventlog_tpm2.bin', tmp_path/'hosts'/h/'binary_bios_measurements')
+    (tmp_path/'hosts'/'b'/'binary_bios_measurements').write_bytes(b'junk')
+    save_baseline(create_baseline('tests/fixtures_eventlog_tpm2.bin', str(tmp_path/'hosts'/'a'/'efivars')), str(tmp_path/'bl.json'))
+    rc = run_attest_fleet(str(tmp_path/'hosts'), str(tmp_path/'bl.json'), 'json', str(tmp_path/'r.json'), 'medium', workers=1, status_file=str(tmp_path/'st.json'))
+    assert rc == 2 and json.load(open(tmp_path/'st.json')) == {'a':0,'b':2}
+    assert json.load(open(tmp_path/'r.json'))['findings'][0]['kind'] == 'host-error'
+
+def test_fleet_survives_unexpected_host_errors(tmp_path, monkeypatch):
+    from bootattestor import fleet
+    from bootattestor.synth import event_record, specid_event
+    from bootattestor.tcg import ALG_SHA1, EV_EFI_ACTION
+    for h in ('a','b','c'):
+        (tmp_path/'hosts'/h/'efivars').mkdir(parents=True)
+        shutil.copy('tests/fixtures_eventlog_tpm2.bin', tmp_path/'hosts'/h/'binary_bios_measurements')
+    (tmp_path/'hosts'/'b'/'binary_bios_measurements').write_bytes(specid_event([ALG_SHA1]) + event_record(30, EV_EFI_ACTION, [ALG_SHA1], b'x'))
+    save_baseline(create_baseline('tests/fixtures_eventlog_tpm2.bin', str(tmp_path/'hosts'/'a'/'efivars')), str(tmp_path/'bl.json'))
+    real = fleet.diff_attestation
+    def flaky(bl, blob, efi, *a, **kw):
+        if efi.endswith('c/efivars'): raise PermissionError(13, 'Permission denied', efi)
+        return real(bl, blob, efi, *a, **kw)
+    monkeypatch.setattr(fleet, 'diff_attestation', flaky)
+    rc = run_attest_fleet(str(tmp_path/'hosts'), str(tmp_path/'bl.json'), 'json', str(tmp_path/'r.json'), 'medium', workers=1, status_file=str(tmp_path/'st.json'))
+    assert rc == 2 and json.load(open(tmp_path/'st.json')) == {'a':0,'b':2,'c':2}
+    errs = {f['id']: f['message'] for f in json.load(open(tmp_path/'r.json'))['findings']}
+    assert 'PCR index 30' in errs['b'] and errs['c'].startswith('PermissionError')
+
+def test_malformed_manifest_is_an_error(tmp_path, capsys):
+    from bootattestor.cli import main
+    save_baseline(create_baseline('tests/fixtures_eventlog_tpm2.bin', str(tmp_path)), str(tmp_path/'bl.json'))
+    bad = {'junk.json': '[{"host": "a",', 'obj.json': '{"host": "a"}', 'str.json': '["a"]', 'nolog.json': '[{"host": "a"}]',
+           'numlog.json': '[{"host": "a", "event_log": 7}]', 'efi.json': '[{"host": "a", "event_log": "a.bin", "efivars": [1]}]'}
+    for name, text in bad.items(): (tmp_path/name).write_text(text)
+    for name in bad:
+        assert main(['attest-fleet', '--hosts', str(tmp_path/name), '--baseline', str(tmp_path/'bl.json'), '--jobs', '1']) == 2
+        assert capsys.readouterr().err.startswith('error: ')
@@ -0,0 +1,57 @@
+import json
+from bootattestor.attestor import create_baseline, diff_attestation, export_sbom, load_policy, map_event_log
+from bootattestor.cli import main
+from bootattestor.logcache import LogCache, use_cache
+from bootattestor.synth import write_eventlog, write_efivars_tree
+from bootattestor.trace import tracing
+from bootattestor.verify import verify_event_digests
+
+def test_cache_hit_matches_fresh_parse(tmp_path):
+    log = write_eventlog(str(tmp_path/'log.bin'), 500)
+    efi = write_efivars_tree(str(tmp_path/'efivars'), vendor_vars=0)
+    fresh = create_baseline(log, efi, with_events=True)
+    export_sbom(log, efi, str(tmp_path/'fresh.json'))
+    with use_cache(str(tmp_path/'c')) as c:
+        create_baseline(log, efi)
+        with tracing() as tr:
+            bl = create_baseline(log, efi, with_events=True)
+            export_sbom(log, efi, str(tmp_path/'cached.json'))
+        assert verify_event_digests(map_event_log(log)) == []
+        assert c.stats()['entries'] == 1 and c.stats()['hits'] == 3
+    tot = tr.to_dict()['totals']
+    assert tot['log_cache']['hits'] == 2 and 'parse_tpm2_eventlog' not in tot and 'compute_pcrs' not in tot
+    assert bl.digests == fresh.digests and bl.events == fresh.events
+    a, b = json.load(open(tmp_path/'fresh.json')), json.load(open(tmp_path/'cached.json'))
+    assert a['components'] == b['components']
+    # the tampered copy hashes differently, so it misses and is parsed on its own
+    bad = bytearray(open(log, 'rb').read()); bad[-9] ^= 1  # last separator's sha256 digest
+    with use_cache(str(tmp_path/'c')):
+        assert diff_attestation(fresh, bytes(bad), efi, load_policy(None))[0].kind == 'pcr-mismatch'
+
+def test_lru_eviction_and_cli(tmp_path, capsys):
+    d = str(tmp_path/'c')
+    logs = [write_eventlog(str(tmp_path/f'l{i}.bin'), 300, seed=i) for i in range(3)]
+    for lg in logs: main(['sbom', '--event-log', lg, '--efivars', str(tmp_path), '-o', str(tmp_path/'s.json'), '--cache-dir', d])
+    size = LogCache(d).stats()['bytes'] // 3
+    with use_cache(d, max_bytes=2*size + size//2) as c:
+        c.get(map_event_log(logs[0]))        # touch: l1 is now least recently used
+        c.evict()
+        assert c.get(map_event_log(logs[1])) is None and c.get(map_event_log(logs[0])) is not None
+    capsys.readouterr()
+    assert main(['cache', 'stats', '--cache-dir', d]) == 0 and '2 entries' in capsys.readouterr().out
+    assert main(['cache', 'clear', '--cache-dir', d]) == 0 and LogCache(d).stats()['entries'] == 0
+
+def test_refuses_shared_cache_dir(tmp_path, capsys):
+    import os, pytest
+    from bootattestor.errors import AttestorError
+    d = tmp_path/'c'
+    LogCache(str(d))
+    assert d.stat().st_mode & 0o777 == 0o700
+    d.chmod(0o777)
+    with pytest.raises(AttestorError, match='world writable'): LogCache(str(d))
+    log = write_eventlog(str(tmp_path/'l.bin'), 20)
+    assert main(['sbom', '--event-log', log, '--efivars', str(tmp_path), '-o', str(tmp_path/'s.json'), '--cache-dir', str(d)]) == 2
+    assert 'refusing cache dir' in capsys.readouterr().err
+    if os.geteuid() == 0:
+        d.chmod(0o700); os.chown(d, 4242, -1)
+        with pytest.raises(AttestorError, match='owned by uid 4242'): LogCache(str(d))
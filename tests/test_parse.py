@@ -1,5 +1,5 @@
-from bootattestor.tcg import parse_tpm2_eventlog
-from bootattestor.pcr import compute_pcrs
+from bootattestor.tcg import parse_tpm2_eventlog, parse_tpm2_header, iter_tpm2_events
+from bootattestor.pcr import compute_pcrs, replay_incremental
 
 def test_parse_and_compute():
     blob = open('tests/fixtures_eventlog_tpm2.bin','rb').read()
@@ -8,3 +8,31 @@ def test_parse_and_compute():
     assert any(e.pcr_index == 7 for e in events)
     pcrs = compute_pcrs(algs, events)
     assert 'sha256' in pcrs and 7 in pcrs['sha256']
+
+def test_iter_events_are_views():
+    blob = open('tests/fixtures_eventlog_tpm2.bin','rb').read()
+    algs, off = parse_tpm2_header(blob)
+    evs = list(iter_tpm2_events(memoryview(blob), algs, off))
+    assert len(evs) == 1 and isinstance(evs[0].data, memoryview)
+    assert bytes(evs[0].data).startswith(b'\\EFI\\')
+    assert compute_pcrs(algs, evs) == compute_pcrs(*parse_tpm2_eventlog(blob))
+
+def test_incremental_replay_checkpoint():
+    blob = open('tests/fixtures_eventlog_tpm2.bin','rb').read()
+    algs, off = parse_tpm2_header(blob)
+    ev = blob[off:]
+    full = compute_pcrs(*parse_tpm2_eventlog(blob + ev + ev))
+    pcrs, cp = replay_incremental(blob)
+    assert cp.events == 1 and cp.offset == len(blob)
+    pcrs, cp = replay_incremental(blob + ev + ev, cp)
+    assert cp.events == 3 and pcrs == full
+    tampered = bytearray(blob + ev + ev); tampered[len(blob)-5] ^= 1
+    pcrs, cp2 = replay_incremental(bytes(tampered), cp)
+    assert cp2.events == 3 and cp2.prefix_sha256 != cp.prefix_sha256
+
+def test_synthetic_log_roundtrip():
+    from bootattestor.synth import generate_eventlog
+    blob = generate_eventlog(500, banks=(0x0004, 0x000B, 0x000C), seed=3)
+    algs, events = parse_tpm2_eventlog(blob)
+    assert set(algs) == {0x0004, 0x000B, 0x000C} and len(events) == 500
+    assert set(compute_pcrs(algs, events)) == {'sha1', 'sha256', 'sha384'}
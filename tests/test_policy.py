@@ -0,0 +1,70 @@
+import hashlib, json, os
+from bootattestor.attestor import create_baseline, diff_attestation, load_policy
+from bootattestor.logcache import use_cache
+from bootattestor.policy import compile_policy
+from bootattestor.synth import event_record, specid_event, variable_data_event
+from bootattestor.efivars import EFI_GLOBAL
+from bootattestor.tcg import ALG_SHA1, ALG_SHA256, EV_EFI_ACTION, EV_EFI_VARIABLE_DRIVER_CONFIG
+
+BANKS = (ALG_SHA1, ALG_SHA256)
+
+def _log(path, dbx, app):
+    path.write_bytes(specid_event(BANKS) + event_record(7, EV_EFI_VARIABLE_DRIVER_CONFIG, BANKS, variable_data_event(EFI_GLOBAL, 'dbx', dbx)) + event_record(4, EV_EFI_ACTION, BANKS, app))
+    return path.read_bytes()
+
+def test_policy_rules(tmp_path):
+    (tmp_path/'efi').mkdir()
+    _log(tmp_path/'a.bin', b'old', b'grub')
+    bl = create_baseline(str(tmp_path/'a.bin'), str(tmp_path/'efi'), with_events=True)
+    bad = _log(tmp_path/'b.bin', b'new', b'shim')
+    legacy = {f.id: f.severity for f in diff_attestation(bl, bad, None, {'critical': [4]})}
+    assert legacy['PCR4.sha256'] == 'critical' and legacy['PCR7.sha256'] == 'low'
+    pol = compile_policy({'version': 2, 'pcrs': {'high': [4, 7]}, 'event_types': {'EV_EFI_ACTION': 'medium'},
+                          'variables': [{'name': 'dbx', 'pcr': 7, 'severity': 'critical'}],
+                          'suppress': [{'kind': 'event-divergence'}, {'kind': 'pcr-mismatch', 'pcr': 4}]})
+    got = {(f.kind, f.id): (f.severity, (f.event or {}).get('description')) for f in diff_attestation(bl, bad, None, pol)}
+    assert got[('event-changed', 'PCR7.sha256#0')] == ('critical', 'dbx')
+    assert got[('event-changed', 'PCR4.sha256#1')] == ('medium', 'shim')
+    assert got[('pcr-mismatch', 'PCR7.sha1')][0] == 'high' and ('pcr-mismatch', 'PCR4.sha1') not in got
+    assert not any(k == 'event-divergence' for k, _ in got)
+    # an allowed new event digest is an expected update; an allowed PCR value is no mismatch at all
+    shim = hashlib.sha256(b'shim').hexdigest()
+    pcr7 = [f.message.split('got ')[1] for f in diff_attestation(bl, bad, None, {}) if f.kind == 'pcr-mismatch' and f.id.startswith('PCR7.')]
+    allow = compile_policy({'allowed_event_digests': {'4': [shim]}, 'allowed_pcr_values': {'7': pcr7}})
+    assert sorted((f.kind, f.id) for f in diff_attestation(bl, bad, None, allow)) == [('pcr-mismatch', 'PCR4.sha1'), ('pcr-mismatch', 'PCR4.sha256')]
+
+def test_compiled_policy_is_cached(tmp_path):
+    p = tmp_path/'policy.json'; p.write_text(json.dumps({'critical': [0, 7], 'suppress': [{'id': 'x'}]}))
+    with use_cache(str(tmp_path/'c')):
+        first = load_policy(str(p))
+        assert len([n for n in os.listdir(tmp_path/'c') if n.startswith('policy-')]) == 1
+        again = load_policy(str(p))
+    assert again.to_dict() == first.to_dict() and again.suppressed('any', 'x') and again.sev_for_pcr(0) == 'critical'
+
+def test_pcr_scoped_variable_rules_apply_to_var_mismatch(tmp_path):
+    (tmp_path/'efi').mkdir()
+    g = 'd719b2cb-3d3a-4596-a3bc-dad00e67656f'
+    for name in ('dbx', 'Boot0001', 'Vendor'): (tmp_path/'efi'/f'{name}-{g}').write_bytes(b'\x07\x00\x00\x00old')
+    bl = create_baseline('tests/fixtures_eventlog_tpm2.bin', str(tmp_path/'efi'))
+    for name in ('dbx', 'Boot0001', 'Vendor'): (tmp_path/'efi'/f'{name}-{g}').write_bytes(b'\x07\x00\x00\x00new')
+    pol = compile_policy({'variables': [{'name': 'dbx', 'pcr': 7, 'severity': 'critical'}, {'name': 'Boot0001', 'pcr': 7, 'severity': 'critical'},
+                                        {'name': 'Vendor', 'severity': 'low'}],
+                          'suppress': [{'kind': 'var-mismatch', 'pcr': 1}]})
+    assert pol.sev_for_variable('dbx', 'high') == 'critical'
+    got = {f.id.split('-')[0]: f.severity for f in diff_attestation(bl, open('tests/fixtures_eventlog_tpm2.bin', 'rb').read(), str(tmp_path/'efi'), pol)}
+    # Boot0001 is measured into PCR1, so its PCR7 rule does not apply and the PCR1 suppression does
+    assert got == {'dbx': 'critical', 'Vendor': 'low'}
+
+def test_malformed_policy_is_an_error(tmp_path, capsys):
+    import pytest
+    from bootattestor.cli import main
+    from bootattestor.errors import AttestorError
+    for bad in ({'event_types': ['EV_EFI_ACTION']}, {'pcrs': {'high': 7}}, {'critical': 'x'}, {'variables': {'name': 'dbx'}},
+                {'allowed_pcr_values': {'7': 'abc'}}, {'suppress': {'kind': 'x'}}, {'default': ['low']}, {'event_types': {'EV_EFI_ACTION': {}}}):
+        with pytest.raises(AttestorError): compile_policy(bad)
+    p = tmp_path/'p.json'; p.write_text(json.dumps({'event_types': []}))
+    bl = tmp_path/'bl.json'
+    assert main(['baseline', 'create', '--event-log', 'tests/fixtures_eventlog_tpm2.bin', '--efivars', str(tmp_path), '-o', str(bl)]) == 0
+    for pol in (str(p), str(tmp_path/'missing.json')):
+        assert main(['attest', '--event-log', 'tests/fixtures_eventlog_tpm2.bin', '--baseline', str(bl), '--policy', pol]) == 2
+        assert capsys.readouterr().err.startswith('error: ')
@@ -6,3 +6,16 @@ def test_reports_and_threshold():
     assert '2.1.0' in render_sarif(f)
     j = render_junit(f, 'critical'); assert '<failure' in j
     js = render_json([]); assert '"total": 0' in js
+
+def test_write_reports_multi_format_one_pass(tmp_path):
+    import json
+    from bootattestor.attestor import write_reports
+    seen = []
+    def gen():
+        for i in range(3):
+            seen.append(i); yield Finding('pcr-mismatch', f'PCR{i}.sha256', 'high' if i else 'low', 'x')
+    rc = write_reports(gen(), [('json', str(tmp_path/'r.json')), ('sarif', str(tmp_path/'r.sarif')), ('junit', str(tmp_path/'r.xml'))], 'high')
+    assert rc == 1 and seen == [0, 1, 2]
+    assert json.load(open(tmp_path/'r.json'))['summary']['total'] == 3
+    assert len(json.load(open(tmp_path/'r.sarif'))['runs'][0]['results']) == 3
+    assert open(tmp_path/'r.xml').read().count('<failure') == 2
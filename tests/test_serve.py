@@ -0,0 +1,72 @@
+import asyncio, io, tarfile
+from bootattestor.attestor import create_baseline, load_policy
+from bootattestor.serve import make_pool, start_server
+
+def _bundle(log, vars):
+    bio = io.BytesIO()
+    with tarfile.open(fileobj=bio, mode='w:gz') as tf:
+        for name, data in [('host/binary_bios_measurements', log)] + [(f'host/efivars/{n}', d) for n, d in vars]:
+            ti = tarfile.TarInfo(name); ti.size = len(data); tf.addfile(ti, io.BytesIO(data))
+    return bio.getvalue()
+
+async def _post(port, path, body):
+    r, w = await asyncio.open_connection('127.0.0.1', port)
+    w.write(b'POST %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % (path, len(body)) + body)
+    resp = await r.read(); w.close()
+    return resp
+
+def test_serve_attest_roundtrip(tmp_path):
+    var = 'SecureBoot-8be4df61-93ca-11d2-aa0d-00e098032b8c'
+    (tmp_path/'efi').mkdir(); (tmp_path/'efi'/var).write_bytes(b'\x06\x00\x00\x00\x01')
+    bl = create_baseline('tests/fixtures_eventlog_tpm2.bin', str(tmp_path/'efi'))
+    log = open('tests/fixtures_eventlog_tpm2.bin','rb').read()
+    async def go():
+        with make_pool(bl, None, load_policy(None), 1) as pool:
+            srv = await start_server(pool)
+            port = srv.sockets[0].getsockname()[1]
+            ok, drift = await asyncio.gather(_post(port, b'/attest?format=text', _bundle(log, [(var, b'\x06\x00\x00\x00\x01')])), _post(port, b'/attest?format=json', _bundle(log, [(var, b'\x06\x00\x00\x00\x00')])))
+            bad = await _post(port, b'/attest', b'junk')
+            srv.close(); await srv.wait_closed()
+            return ok, drift, bad
+    ok, drift, bad = asyncio.run(go())
+    assert ok.startswith(b'HTTP/1.1 200') and b'X-Bootattest-Status: 0' in ok and b'OK: no mismatches' in ok
+    assert b'X-Bootattest-Status: 1' in drift and b'var-mismatch' in drift
+    assert bad.startswith(b'HTTP/1.1 400')
+
+def test_serve_answers_on_internal_errors(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from bootattestor import serve
+    from bootattestor.synth import event_record, specid_event
+    from bootattestor.tcg import ALG_SHA1, EV_EFI_ACTION
+    monkeypatch.setattr(serve, '_W', {})  # no initializer ran: every request fails inside _handle
+    log = open('tests/fixtures_eventlog_tpm2.bin','rb').read()
+    bad_pcr = specid_event([ALG_SHA1]) + event_record(30, EV_EFI_ACTION, [ALG_SHA1], b'x')
+    async def go():
+        with ThreadPoolExecutor(1) as pool:
+            srv = await start_server(pool)
+            port = srv.sockets[0].getsockname()[1]
+            crash = await _post(port, b'/attest', _bundle(log, []))
+            pool.shutdown()
+            gone = await _post(port, b'/attest', _bundle(log, []))
+            srv.close(); await srv.wait_closed()
+        serve._W.update(baseline=create_baseline('tests/fixtures_eventlog_tpm2.bin', str(tmp_path)), policy=load_policy(None), store=None)
+        return crash, gone, serve._handle(_bundle(bad_pcr, []), 'json', 'medium')
+    crash, gone, bad = asyncio.run(go())
+    assert crash.startswith(b'HTTP/1.1 500') and b'KeyError' in crash
+    assert gone.startswith(b'HTTP/1.1 500') and b'RuntimeError' in gone
+    assert bad[0] == 400 and 'PCR index 30' in bad[1]
+
+def test_serve_rejects_bundles_that_unpack_too_large(monkeypatch):
+    import pytest
+    from bootattestor import serve
+    bomb = _bundle(bytes(8 << 20), [])
+    assert len(bomb) < 64 << 10
+    monkeypatch.setattr(tarfile.TarFile, 'extractfile', lambda *a: pytest.fail('member read before its size was checked'))
+    with pytest.raises(serve.BundleTooLarge):
+        serve.read_bundle(bomb, 1 << 20)
+    monkeypatch.undo()
+    two = _bundle(bytes(600 << 10), [('v', bytes(600 << 10))])
+    with pytest.raises(serve.BundleTooLarge):
+        serve.read_bundle(two, 1 << 20)
+    code, body, status = serve._handle(bomb, 'json', 'medium', 1 << 20)
+    assert code == 413 and status == 2 and 'more than 1048576 bytes' in body
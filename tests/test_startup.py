@@ -0,0 +1,57 @@
+import copy, json, hashlib, subprocess, sys
+import pytest
+from jsonschema import Draft202012Validator
+from bootattestor.attestor import _BASELINE_SCHEMA_SHA256, _baseline_ok, _schema_validator, _validate_baseline_dict, baseline_to_dict, create_baseline, save_baseline
+from bootattestor.errors import AttestorError
+from bootattestor.synth import write_eventlog, write_efivars_tree
+
+def _modules_after(args):
+    code = ('import json, sys; from bootattestor.cli import main; main(%r); '
+            'print(json.dumps(sorted(m for m in sys.modules if m.split(".")[0] in ("bootattestor", "jsonschema", "ctypes"))))' % (args,))
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def test_light_commands_import_little(tmp_path):
+    assert _modules_after(['version']) == ['bootattestor', 'bootattestor.cli', 'bootattestor.errors', 'bootattestor.version']
+    log = write_eventlog(str(tmp_path/'l.bin'), 50)
+    efi = write_efivars_tree(str(tmp_path/'efivars'), vendor_vars=1)
+    save_baseline(create_baseline(log, efi, with_events=True), str(tmp_path/'b.json'))
+    mods = _modules_after(['attest', '--event-log', log, '--efivars', efi, '--baseline', str(tmp_path/'b.json'), '--format', 'junit'])
+    assert 'bootattestor.attestor' in mods and not any(m.split('.')[0] in ('jsonschema', 'ctypes') for m in mods)
+
+def _variants(good):
+    yield good
+    for key in list(good):
+        bad = dict(good); del bad[key]; yield bad
+    for key, val in (('schema_version', 2), ('schema_version', True), ('schema_version', 1.0), ('platform', 'mac'), ('created_at', -1),
+                     ('digests', {}), ('variables', {'x': 'ABC'}), ('extra', 1), ('events', None), ('events', {'a': {}, 'b': {}}), ('$schema', 3)):
+        bad = dict(good); bad[key] = val; yield bad
+    for path, val in ((('digests', 'sha256', '7'), 'zz'), (('digests', 'sha256', '7'), 'a'*64 + '\n'), (('digests', 'sha256', 'x'), 5),
+                      (('events', 'sha256', '7', 0, 2), 'nothex'), (('events', 'sha256', '7', 0, 0), -1), (('events', 'sha256', '7', 0), [1, 2, 'a'*64])):
+        bad = copy.deepcopy(good)
+        cur = bad
+        for k in path[:-1]: cur = cur[k]
+        cur[path[-1]] = val
+        yield bad
+
+def test_fast_path_agrees_with_schema(tmp_path):
+    log = write_eventlog(str(tmp_path/'l.bin'), 50)
+    good = json.loads(json.dumps(baseline_to_dict(create_baseline(log, str(tmp_path), with_events=True))))
+    v = _schema_validator('baseline.schema.json')
+    assert isinstance(v, Draft202012Validator) and _schema_validator('baseline.schema.json') is v
+    n = 0
+    for obj in _variants(good):
+        ok = v.is_valid(obj)
+        # the fast path may defer to jsonschema but must never accept what the schema rejects
+        assert not _baseline_ok(obj) or ok
+        if ok:
+            _validate_baseline_dict(obj)
+        else:
+            with pytest.raises(AttestorError): _validate_baseline_dict(obj)
+        n += not ok
+    assert _baseline_ok(good) and n >= 15
+
+def test_fast_path_pins_schema():
+    from importlib.resources import files
+    raw = files('bootattestor.schemas').joinpath('baseline.schema.json').read_bytes()
+    assert hashlib.sha256(raw).hexdigest() == _BASELINE_SCHEMA_SHA256, 'baseline.schema.json changed: update attestor._baseline_ok to match, then _BASELINE_SCHEMA_SHA256'
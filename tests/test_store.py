@@ -0,0 +1,15 @@
+from dataclasses import replace
+from bootattestor.attestor import create_baseline
+from bootattestor.store import BaselineStore
+
+def test_store_exact_and_closest(tmp_path):
+    (tmp_path/'efi').mkdir()
+    good = create_baseline('tests/fixtures_eventlog_tpm2.bin', str(tmp_path/'efi'))
+    other = replace(good, digests={**good.digests, 'sha256':{**good.digests['sha256'], 7:'ab'*32}})
+    with BaselineStore(str(tmp_path/'s.db')) as st:
+        st.add('other', other); st.add('good', good)
+        assert [r[0] for r in st.list()] == ['good', 'other']
+        assert st.match(good.digests)[0::2] == ('good', True)
+        st.remove('good')
+        name, bl, exact = st.match(good.digests)
+        assert (name, exact) == ('other', False) and bl.digests == other.digests
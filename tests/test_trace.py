@@ -0,0 +1,27 @@
+import json
+from bootattestor.attestor import create_baseline, diff_attestation, load_policy
+from bootattestor.cli import main
+from bootattestor.synth import write_eventlog, write_efivars_tree
+from bootattestor.trace import tracing
+
+def test_stage_timings_and_counters(tmp_path):
+    log = write_eventlog(str(tmp_path/'log.bin'), 200)
+    efi = write_efivars_tree(str(tmp_path/'efivars'), vendor_vars=2)
+    seen = []
+    with tracing(on_stage=lambda r: seen.append(r['stage'])) as tr:
+        bl = create_baseline(log, efi)
+        diff_attestation(bl, open(log, 'rb').read(), efi, load_policy(None))
+    tot = tr.to_dict()['totals']
+    assert {'load_event_log', 'parse_tpm2_eventlog', 'compute_pcrs', 'load_efivars'} <= set(tot)
+    assert tot['parse_tpm2_eventlog']['events'] == 2 * 200 and tot['compute_pcrs']['hashes'] == 2 * 2 * 200
+    assert tot['load_efivars']['hashes'] == 2 * 10 and seen.count('compute_pcrs') == 2
+    # instrumentation is inert outside tracing()
+    assert create_baseline(log, efi).digests == bl.digests
+
+def test_cli_profile_out(tmp_path, capsys):
+    log = write_eventlog(str(tmp_path/'log.bin'), 50)
+    efi = write_efivars_tree(str(tmp_path/'efivars'), vendor_vars=0)
+    prof = tmp_path/'prof.json'
+    assert main(['sbom', '--event-log', log, '--efivars', efi, '-o', str(tmp_path/'s.json'), '--timings', '--profile-out', str(prof)]) == 0
+    assert 'sbom_events' in capsys.readouterr().err
+    assert json.load(open(prof))['totals']['sbom_events']['events'] == 50
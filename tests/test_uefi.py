@@ -0,0 +1,49 @@
+import json, uuid
+from bootattestor.attestor import export_sbom
+from bootattestor.efivars import EFI_GLOBAL
+from bootattestor.synth import (ESP_PARTITION, esp_device_path, event_record, gpt_event, image_load_event, specid_event,
+                                variable_data_event, write_eventlog)
+from bootattestor.tcg import ALG_SHA1, ALG_SHA256, EV_EFI_BOOT_SERVICES_APPLICATION, EV_EFI_GPT_EVENT, EV_EFI_VARIABLE_BOOT
+from bootattestor import uefi
+from bootattestor.uefi import _prefix_text, decode_gpt_event, decode_image_load, decode_variable_data
+
+ESP = f'PciRoot(0x0)/Pci(0x1d,0x0)/NVMe(0x1,00-01-02-03-04-05-06-07)/HD(1,GPT,{ESP_PARTITION},0x800,0x100000)'
+
+def test_image_load_device_path(monkeypatch):
+    monkeypatch.setattr(uefi, '_last_prefix', (b'', ''))
+    _prefix_text.cache_clear()
+    other = esp_device_path(uuid.UUID(int=3))
+    for name, prefix in (('shimx64.efi', esp_device_path()), ('grubx64.efi', esp_device_path()), ('x.efi', other), ('mmx64.efi', esp_device_path())):
+        img = decode_image_load(memoryview(image_load_event(f'\\EFI\\ubuntu\\{name}', 0x2a000, prefix)))
+        assert img.file_path == f'\\EFI\\ubuntu\\{name}' and img.length == 0x2a000
+        assert img.device_path == (ESP if prefix != other else ESP.replace(str(ESP_PARTITION), str(uuid.UUID(int=3)))) + f'/\\EFI\\ubuntu\\{name}'
+    assert _prefix_text.cache_info()[:2] == (1, 2)  # each prefix rendered once; the repeat of the last one skips even the lookup
+    assert decode_image_load(image_load_event('\\EFI\\BOOT\\BOOTX64.EFI', 1)).device_path == '\\EFI\\BOOT\\BOOTX64.EFI'
+    bad = bytearray(image_load_event('\\EFI\\x.efi', 1)); bad[34] = 0xff  # file node length past the buffer
+    assert decode_image_load(bytes(bad)) is None and decode_image_load(b'\\EFI\\x.efi') is None
+
+def test_variable_and_gpt():
+    var = decode_variable_data(memoryview(variable_data_event(EFI_GLOBAL, 'Boot0001', b'\x01\x02')))
+    assert (var.guid, var.name, bytes(var.data)) == (str(EFI_GLOBAL), 'Boot0001', b'\x01\x02')
+    assert decode_variable_data(variable_data_event(EFI_GLOBAL, 'Boot0001', b'\x01\x02')[:-1]) is None
+    disk = uuid.UUID(int=7)
+    gpt = decode_gpt_event(gpt_event(disk, [('EFI System', ESP_PARTITION, 2048, 1050623), ('root', uuid.UUID(int=9), 1050624, 9999999)]))
+    assert gpt.disk_guid == str(disk) and [p.name for p in gpt.partitions] == ['EFI System', 'root']
+    assert gpt.partitions[1].first_lba == 1050624 and decode_gpt_event(b'EFI PART' + b'\x00'*20) is None
+
+def test_sbom_components(tmp_path):
+    banks = (ALG_SHA1, ALG_SHA256)
+    log = tmp_path/'log.bin'
+    log.write_bytes(specid_event(banks)
+                    + event_record(5, EV_EFI_GPT_EVENT, banks, gpt_event(uuid.UUID(int=7), [('EFI System', ESP_PARTITION, 2048, 4095)]))
+                    + event_record(1, EV_EFI_VARIABLE_BOOT, banks, variable_data_event(EFI_GLOBAL, 'BootOrder', b'\x01\x00'), b'\x01\x00')
+                    + event_record(4, EV_EFI_BOOT_SERVICES_APPLICATION, banks, image_load_event('\\EFI\\BOOT\\BOOTX64.EFI', 4096, esp_device_path()), b'img'))
+    export_sbom(str(log), str(tmp_path), str(tmp_path/'s.json'))
+    gpt, var, img = json.load(open(tmp_path/'s.json'))['components']
+    assert gpt['type'] == 'gpt' and gpt['partitions'][0]['name'] == 'EFI System'
+    assert (var['type'], var['name'], var['event_type']) == ('measured_variable', 'BootOrder', 'EV_EFI_VARIABLE_BOOT')
+    assert img['path'] == '\\EFI\\BOOT\\BOOTX64.EFI' and img['device_path'] == ESP + '/\\EFI\\BOOT\\BOOTX64.EFI' and img['image_size'] == 4096
+    big = write_eventlog(str(tmp_path/'big.bin'), 2000)
+    export_sbom(big, str(tmp_path), str(tmp_path/'big.json'))
+    comps = json.load(open(tmp_path/'big.json'))['components']
+    assert all(c['device_path'].startswith(ESP + '/\\EFI\\Vendor\\') for c in comps if c['type'] == 'efi_image')
@@ -0,0 +1,21 @@
+from bootattestor.attestor import create_baseline, diff_attestation, load_policy
+from bootattestor.synth import generate_eventlog, write_efivars_tree
+from bootattestor.verify import verify_event_digests
+
+def test_digest_verification_flags_tampered_data(tmp_path):
+    blob = generate_eventlog(3000)
+    assert verify_event_digests(blob, workers=1) == [] and verify_event_digests(blob, workers=4, batch_size=64) == []
+    # same-length edit: replay stays self-consistent, only the data no longer matches its digests
+    at = blob.index(b'Calling EFI Application')
+    bad = blob[:at] + b'K' + blob[at+1:]
+    got = verify_event_digests(bad, workers=4, batch_size=64)
+    assert len(got) == 2 and {m[3] for m in got} == {0x4, 0xB} and got[0][6].startswith('Kalling')
+    log = tmp_path/'log.bin'; log.write_bytes(bad)
+    efi = write_efivars_tree(str(tmp_path/'efivars'), vendor_vars=0)
+    bl = create_baseline(str(log), efi)
+    assert diff_attestation(bl, bad, efi, load_policy(None)) == []
+    finds = diff_attestation(bl, bad, efi, load_policy(None), verify_digests=True)
+    assert [f.kind for f in finds] == ['event-digest-mismatch']*2 and finds[0].severity == 'critical'
+    assert finds[0].event['type'] == 'EV_EFI_ACTION' and finds[0].id.startswith('PCR4.sha1#')
+    from bootattestor.policy import compile_policy
+    assert diff_attestation(bl, bad, efi, compile_policy({'suppress': [{'kind': 'event-digest-mismatch', 'pcr': 4}]}), verify_digests=True) == []
@@ -0,0 +1,45 @@
+import pytest, urllib.request
+from bootattestor.attestor import create_baseline, load_policy
+from bootattestor.cli import main
+from bootattestor.errors import AttestorError
+from bootattestor.synth import event_record, generate_eventlog, write_efivars_tree
+from bootattestor.tcg import ALG_SHA1, ALG_SHA256, EV_EFI_ACTION
+from bootattestor.watch import Watcher, start_metrics_server
+
+def test_watch_rechecks_only_on_change(tmp_path):
+    log = tmp_path/'log.bin'; log.write_bytes(generate_eventlog(100))
+    efi = write_efivars_tree(str(tmp_path/'efivars'), vendor_vars=1)
+    w = Watcher(create_baseline(str(log), efi), load_policy(None), str(log), efi)
+    assert w.poll() and w.findings == [] and not w.poll() and w.checks == 1
+    sb = next((tmp_path/'efivars').glob('SecureBoot-*')); sb.write_bytes(b'\x07\x00\x00\x00\x00')
+    assert w.poll() and [f.kind for f in w.findings] == ['var-mismatch']
+    with open(log, 'ab') as f: f.write(event_record(4, EV_EFI_ACTION, (ALG_SHA1, ALG_SHA256), b'late'))
+    assert w.poll() and w._checkpoint.events == 101 and {f.id for f in w.findings} >= {'PCR4.sha256'}
+    m = w.metrics()
+    assert 'bootattest_findings{severity="high"} 3' in m and 'bootattest_checks_total 3' in m
+    srv = start_metrics_server(w, '127.0.0.1', 0)
+    try:
+        assert urllib.request.urlopen(f'http://127.0.0.1:{srv.server_address[1]}/metrics').read().decode() == m
+    finally:
+        srv.shutdown()
+
+def test_watch_once_writes_textfile(tmp_path):
+    log = tmp_path/'log.bin'; log.write_bytes(generate_eventlog(20))
+    efi = write_efivars_tree(str(tmp_path/'efivars'), vendor_vars=0)
+    main(['baseline', 'create', '--event-log', str(log), '--efivars', efi, '-o', str(tmp_path/'bl.json')])
+    prom = tmp_path/'bootattest.prom'
+    assert main(['watch', '--once', '--event-log', str(log), '--efivars', efi, '--baseline', str(tmp_path/'bl.json'), '--metrics-file', str(prom), '--output', str(tmp_path/'r.txt')]) == 0
+    assert 'bootattest_findings{severity="critical"} 0' in prom.read_text() and (tmp_path/'r.txt').read_text() == 'OK: no mismatches\n'
+
+def test_watch_failed_check_replaces_findings(tmp_path):
+    log = tmp_path/'log.bin'; good = generate_eventlog(20); log.write_bytes(good)
+    efi = write_efivars_tree(str(tmp_path/'efivars'), vendor_vars=0)
+    w = Watcher(create_baseline(str(log), efi), load_policy(None), str(log), efi)
+    assert w.poll() and w.findings == [] and 'bootattest_last_check_success 1' in w.metrics()
+    log.write_bytes(b'junk')
+    with pytest.raises(AttestorError): w.poll()
+    m = w.metrics()
+    assert [(f.kind, f.severity) for f in w.findings] == [('check-error', 'high')]
+    assert 'bootattest_last_check_success 0' in m and 'bootattest_findings{severity="high"} 1' in m and 'bootattest_check_errors_total 1' in m
+    log.write_bytes(good)
+    assert w.poll() and w.findings == [] and 'bootattest_last_check_success 1' in w.metrics()